@@ -0,0 +1,124 @@
+"""CPU cost of live vote broadcasts against vote rate, with and without coalescing
+
+Votes for one event arrive at a steady rate and are broadcast to its
+viewers through the fan-out, either one message per vote (window 0) or
+coalesced per window. Viewers are in-process stand-ins that do the
+per-frame work of a real connection (UTF-8 encoding and framing) and
+finish their writes immediately.
+
+Usage: python benchmarks/bench_broadcast.py [--seconds 2] [--viewers 200]
+           [--rates 10,100,1000] [--windows 50,100] [--max-delay 250]
+"""
+import argparse
+import asyncio
+import os
+import struct
+import sys
+import time
+
+sys.path.insert(0, os.path.join(os.path.dirname(__file__), '..'))
+
+import tornado.escape
+
+from handlers.fanout import Debouncer, FanOut
+from handlers.websocket import vote_messages
+
+
+class Viewer:
+    """Connection stand-in: frames each message like a server-side WebSocket"""
+
+    def __init__(self):
+        self.frames = 0
+        self.bytes = 0
+
+    def write_message(self, message):
+        payload = tornado.escape.utf8(message)
+        length = len(payload)
+        if length < 126:
+            header = struct.pack("BB", 0x81, length)
+        elif length <= 0xFFFF:
+            header = struct.pack("!BBH", 0x81, 126, length)
+        else:
+            header = struct.pack("!BBQ", 0x81, 127, length)
+        frame = header + payload
+        self.frames += 1
+        self.bytes += len(frame)
+        future = asyncio.get_running_loop().create_future()
+        future.set_result(None)
+        return future
+
+
+async def drive(rate, window_ms, max_delay_ms, seconds, viewers):
+    fanout = FanOut(max_frames=1024, high_water=1024)
+    connections = [Viewer() for _ in range(viewers)]
+    for connection in connections:
+        fanout.add("bench", connection)
+
+    delays = []
+
+    def flush(event_id, deltas):
+        now = time.perf_counter()
+        delays.extend(now - delta.pop("queued_at") for delta in deltas)
+        for message in vote_messages(deltas):
+            fanout.broadcast(event_id, message)
+
+    debouncer = Debouncer(flush, window=window_ms / 1000, max_delay=max_delay_ms / 1000)
+    votes = int(rate * seconds)
+    started = time.perf_counter()
+    cpu_started = time.process_time()
+    for seq in range(1, votes + 1):
+        # Keep to the schedule; votes that are due go out back to back
+        wait = started + seq / rate - time.perf_counter()
+        if wait > 0:
+            await asyncio.sleep(wait)
+        user_id = seq % 500
+        debouncer.add("bench", {
+            "type": "vote_delta",
+            "seq": seq,
+            "slot_id": seq % 10,
+            "op": "vote" if (seq // 500) % 2 == 0 else "unvote",
+            "user": {"id": user_id, "username": f"user{user_id}",
+                     "avatar_url": f"https://avatars.githubusercontent.com/u/{user_id}"},
+            "vote_count": seq % 37,
+            "queued_at": time.perf_counter(),
+        })
+    # Let the last window flush and the writes finish
+    await asyncio.sleep(max_delay_ms / 1000 + 0.05)
+    cpu = time.process_time() - cpu_started
+    elapsed = time.perf_counter() - started
+
+    delays.sort()
+    return {
+        "cpu": cpu / elapsed * 100,
+        "cpu_per_vote": cpu / votes * 1e6,
+        "frames": connections[0].frames,
+        "bytes": connections[0].bytes,
+        "p50": delays[len(delays) // 2] * 1000,
+        "max": delays[-1] * 1000,
+    }
+
+
+def main():
+    parser = argparse.ArgumentParser(description=__doc__.splitlines()[0])
+    parser.add_argument("--seconds", type=float, default=2)
+    parser.add_argument("--viewers", type=int, default=200)
+    parser.add_argument("--rates", default="10,100,1000", help="votes per second")
+    parser.add_argument("--windows", default="50,100", help="coalescing windows in ms")
+    parser.add_argument("--max-delay", type=float, default=250, help="in ms")
+    args = parser.parse_args()
+
+    windows = [0] + [float(w) for w in args.windows.split(",")]
+    print(f"{args.viewers} viewers, {args.seconds:g}s per run")
+    print(f"{'votes/s':>8} {'mode':<12} {'cpu %':>7} {'us/vote':>8} "
+          f"{'frames':>7} {'KB/viewer':>10} {'p50 ms':>7} {'max ms':>7}")
+    for rate in [float(r) for r in args.rates.split(",")]:
+        for window_ms in windows:
+            mode = f"window {window_ms:g}ms" if window_ms else "per-vote"
+            result = asyncio.run(drive(rate, window_ms, args.max_delay, args.seconds, args.viewers))
+            print(f"{rate:>8.0f} {mode:<12} {result['cpu']:>7.1f} {result['cpu_per_vote']:>8.0f} "
+                  f"{result['frames']:>7} {result['bytes'] / 1024:>10.1f} "
+                  f"{result['p50']:>7.1f} {result['max']:>7.1f}")
+
+
+if __name__ == "__main__":
+    main()
@@ -0,0 +1,90 @@
+"""Vote throughput and latency: one commit per vote vs group commit
+
+Usage: python benchmarks/bench_group_commit.py [--seconds 5] [--clients 64]
+           [--windows 2,5] [--profiles wal,wal-durable]
+"""
+import argparse
+import asyncio
+import logging
+import os
+import sys
+import tempfile
+import time
+
+sys.path.insert(0, os.path.join(os.path.dirname(__file__), '..'))
+
+from models import async_db, db, group_commit
+
+
+def seed(slots=10, voters=500):
+    users = [db.create_user(1000 + i, f"user{i}", None, "") for i in range(voters)]
+    db.create_event("bench", "Benchmark", "", "", users[0]["id"])
+    for i in range(slots):
+        db.add_time_slot("bench", f"2030-01-{i + 1:02d}T10:00")
+    slot_ids = [slot["id"] for slot in db.get_time_slots_by_event("bench")]
+    return users, slot_ids
+
+
+async def drive(users, slot_ids, seconds, clients):
+    latencies = []
+    deadline = time.perf_counter() + seconds
+
+    async def client(n):
+        i = n
+        while time.perf_counter() < deadline:
+            user = users[i % len(users)]
+            slot_id = slot_ids[(i * 7) % len(slot_ids)]
+            started = time.perf_counter()
+            await async_db.vote_for_slot("bench", slot_id, user["id"], is_vote=(i // len(users)) % 2 == 0)
+            latencies.append(time.perf_counter() - started)
+            i += clients
+
+    await asyncio.gather(*(client(n) for n in range(clients)))
+    return latencies
+
+
+def run(profile, window_ms, seconds, clients):
+    os.environ['DATABASE_PRAGMA_PROFILE'] = profile
+    os.environ['DATABASE_PATH'] = os.path.join(tempfile.mkdtemp(), 'bench.db')
+    os.environ['DB_GROUP_COMMIT_WINDOW_MS'] = str(window_ms)
+    db.close_pool()
+    db.init_db()
+    users, slot_ids = seed()
+
+    latencies = asyncio.run(drive(users, slot_ids, seconds, clients))
+    stats = group_commit.get_writer_stats()
+    group_commit.close_writer()
+    db.close_pool()
+
+    latencies.sort()
+    return {
+        "votes": len(latencies) / seconds,
+        "p50": latencies[len(latencies) // 2] * 1000,
+        "p99": latencies[int(len(latencies) * 0.99)] * 1000,
+        "batch": stats["batch_size_avg"] if stats else 1.0,
+    }
+
+
+def main():
+    parser = argparse.ArgumentParser(description=__doc__.splitlines()[0])
+    parser.add_argument("--seconds", type=float, default=5)
+    parser.add_argument("--clients", type=int, default=64)
+    parser.add_argument("--windows", default="2,5", help="group commit windows in ms")
+    parser.add_argument("--profiles", default="wal,wal-durable")
+    args = parser.parse_args()
+
+    # Queueing behind the single SQLite writer trips the slow-call warning
+    logging.getLogger("tornado.application").setLevel(logging.ERROR)
+
+    windows = [0] + [float(w) for w in args.windows.split(",")]
+    print(f"{'profile':<12} {'mode':<14} {'votes/s':>9} {'p50 ms':>8} {'p99 ms':>8} {'batch':>6}")
+    for profile in args.profiles.split(","):
+        for window_ms in windows:
+            mode = f"group {window_ms:g}ms" if window_ms else "per-vote"
+            result = run(profile, window_ms, args.seconds, args.clients)
+            print(f"{profile:<12} {mode:<14} {result['votes']:>9.0f} {result['p50']:>8.2f} "
+                  f"{result['p99']:>8.2f} {result['batch']:>6.1f}")
+
+
+if __name__ == "__main__":
+    main()
@@ -0,0 +1,88 @@
+"""Read throughput while votes are being written, for each PRAGMA profile
+
+Usage: python benchmarks/bench_pragma_profiles.py [--seconds 5] [--readers 4]
+"""
+import argparse
+import os
+import sys
+import tempfile
+import threading
+import time
+
+sys.path.insert(0, os.path.join(os.path.dirname(__file__), '..'))
+
+from models import db
+
+
+def seed(slots=10, voters=200):
+    users = [db.create_user(1000 + i, f"user{i}", None, "") for i in range(voters)]
+    db.create_event("bench", "Benchmark", "", "", users[0]["id"])
+    for i in range(slots):
+        db.add_time_slot("bench", f"2030-01-{i + 1:02d}T10:00")
+    slot_ids = [slot["id"] for slot in db.get_time_slots_by_event("bench")]
+    for i, user in enumerate(users):
+        db.vote_for_slot("bench", slot_ids[i % slots], user["id"])
+    return users, slot_ids
+
+
+def run_profile(profile, seconds, readers):
+    os.environ['DATABASE_PRAGMA_PROFILE'] = profile
+    os.environ['DATABASE_PATH'] = os.path.join(tempfile.mkdtemp(), 'bench.db')
+    os.environ['DATABASE_POOL_SIZE'] = str(readers + 1)
+    db.close_pool()
+    db.init_db()
+    users, slot_ids = seed()
+
+    stop = threading.Event()
+    reads = [0] * readers
+    writes = [0]
+    errors = [0]
+
+    def reader(n):
+        while not stop.is_set():
+            try:
+                db.get_event_by_id("bench")
+                db.get_votes_by_event("bench")
+                reads[n] += 1
+            except Exception:
+                errors[0] += 1
+
+    def writer():
+        i = 0
+        while not stop.is_set():
+            user = users[i % len(users)]
+            slot_id = slot_ids[(i * 7) % len(slot_ids)]
+            try:
+                db.vote_for_slot("bench", slot_id, user["id"], is_vote=(i // len(users)) % 2 == 0)
+                writes[0] += 1
+            except Exception:
+                errors[0] += 1
+            i += 1
+
+    threads = [threading.Thread(target=reader, args=(n,)) for n in range(readers)]
+    threads.append(threading.Thread(target=writer))
+    for thread in threads:
+        thread.start()
+    time.sleep(seconds)
+    stop.set()
+    for thread in threads:
+        thread.join()
+    db.close_pool()
+
+    return sum(reads) / seconds, writes[0] / seconds, errors[0]
+
+
+def main():
+    parser = argparse.ArgumentParser(description=__doc__.splitlines()[0])
+    parser.add_argument("--seconds", type=float, default=5)
+    parser.add_argument("--readers", type=int, default=4)
+    args = parser.parse_args()
+
+    print(f"{'profile':<12} {'reads/s':>10} {'writes/s':>10} {'errors':>7}")
+    for profile in db.PRAGMA_PROFILES:
+        reads, writes, errors = run_profile(profile, args.seconds, args.readers)
+        print(f"{profile:<12} {reads:>10.0f} {writes:>10.0f} {errors:>7}")
+
+
+if __name__ == "__main__":
+    main()
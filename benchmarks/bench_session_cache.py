@@ -0,0 +1,80 @@
+"""Per-request cost of resolving the current user from the signed cookie
+
+Compares the old path (an @authenticated handler verifying and parsing
+the cookie twice) with the per-request memoized, cross-request cached one.
+
+Usage: python benchmarks/bench_session_cache.py [--requests 20000]
+"""
+import argparse
+import json
+import os
+import sys
+import time
+from unittest import mock
+
+sys.path.insert(0, os.path.join(os.path.dirname(__file__), '..'))
+
+import tornado.httputil
+import tornado.web
+
+from handlers.events import BaseAuthHandler
+from handlers.session import get_session_cache
+
+
+class UncachedHandler(tornado.web.RequestHandler):
+    # get_current_user as it was before the session cache
+    def get_current_user(self):
+        user_cookie = self.get_secure_cookie("user")
+        if user_cookie:
+            return json.loads(user_cookie)
+        return None
+
+
+def make_handler(app, handler_class, cookie):
+    request = tornado.httputil.HTTPServerRequest(
+        "GET", "/dashboard",
+        headers=tornado.httputil.HTTPHeaders({"Cookie": f"user={cookie}"}),
+        connection=mock.Mock(),
+    )
+    return handler_class(app, request)
+
+
+def bench(app, handler_class, cookie, requests, lookups):
+    handlers = [make_handler(app, handler_class, cookie) for _ in range(requests)]
+    started = time.perf_counter()
+    for handler in handlers:
+        if handler_class is UncachedHandler:
+            # The decorator and the handler body each called get_current_user()
+            for _ in range(lookups):
+                handler.get_current_user()
+        else:
+            for _ in range(lookups):
+                handler.current_user
+    return (time.perf_counter() - started) / requests * 1e6
+
+
+def main():
+    parser = argparse.ArgumentParser(description=__doc__.splitlines()[0])
+    parser.add_argument("--requests", type=int, default=20000)
+    parser.add_argument("--lookups", type=int, default=2,
+                        help="current user lookups per request")
+    args = parser.parse_args()
+
+    app = tornado.web.Application(cookie_secret="bench-secret")
+    user = {"id": 1, "github_id": 1, "username": "octocat",
+            "avatar_url": "https://avatars.githubusercontent.com/u/1"}
+    cookie = tornado.web.create_signed_value(
+        "bench-secret", "user", json.dumps(user)).decode()
+
+    uncached = bench(app, UncachedHandler, cookie, args.requests, args.lookups)
+    get_session_cache().clear()
+    cached = bench(app, BaseAuthHandler, cookie, args.requests, args.lookups)
+
+    print(f"{'path':<28} {'us/request':>10}")
+    print(f"{'verify + parse every call':<28} {uncached:>10.2f}")
+    print(f"{'memoized + session cache':<28} {cached:>10.2f}")
+    print(f"saved {uncached - cached:.2f} us/request ({1 - cached / uncached:.0%})")
+
+
+if __name__ == "__main__":
+    main()
@@ -1,9 +1,11 @@
 import tornado.web
 import tornado.auth
-import requests
+import tornado.httpclient
 import json
 import os
-from models.db import get_db_connection, create_user, get_user_by_github_id
+import urllib.parse
+from handlers.session import decode_user_cookie, forget_user_cookie
+from models.async_db import create_user
 
 # Try to import and load dotenv, but continue without it if not available
 try:
@@ -14,20 +16,15 @@ except ImportError:
 
 class LoginHandler(tornado.web.RequestHandler):
     def get(self):
-        user_cookie = self.get_secure_cookie("user")
-        user = None
-        if user_cookie:
-            try:
-                user = json.loads(user_cookie)
-                self.redirect("/dashboard")
-                return
-            except:
-                pass
+        user = decode_user_cookie(self)
+        if user:
+            self.redirect("/dashboard")
+            return
         
         self.render("login.html", user=user)
 
 class GitHubAuthHandler(tornado.web.RequestHandler):
-    def get(self):
+    async def get(self):
         code = self.get_argument("code", None)
         if not code:
             # Redirect to GitHub OAuth
@@ -38,9 +35,9 @@ class GitHubAuthHandler(tornado.web.RequestHandler):
             self.redirect(github_url)
         else:
             # Handle callback
-            self.exchange_code_for_token(code)
+            await self.exchange_code_for_token(code)
     
-    def exchange_code_for_token(self, code):
+    async def exchange_code_for_token(self, code):
         client_id = os.getenv("GITHUB_CLIENT_ID", "")
         client_secret = os.getenv("GITHUB_CLIENT_SECRET", "")
         # Use the callback URL from environment variable
@@ -56,31 +53,35 @@ class GitHubAuthHandler(tornado.web.RequestHandler):
         }
         
         headers = {"Accept": "application/json"}
-        response = requests.post(token_url, data=token_data, headers=headers)
+        # Non-blocking, so other requests are served during the round trip
+        response = await tornado.httpclient.AsyncHTTPClient().fetch(
+            token_url, method="POST", body=urllib.parse.urlencode(token_data),
+            headers=headers, raise_error=False)
         
-        if response.status_code == 200:
-            token_info = response.json()
+        if response.code == 200:
+            token_info = json.loads(response.body)
             access_token = token_info.get("access_token")
             
             if access_token:
-                self.get_user_info(access_token)
+                await self.get_user_info(access_token)
             else:
                 self.redirect("/login?error=token_failed")
         else:
             self.redirect("/login?error=auth_failed")
     
-    def get_user_info(self, access_token):
+    async def get_user_info(self, access_token):
         # Get user info from GitHub API
         user_url = "https://api.github.com/user"
-        headers = {"Authorization": f"token {access_token}"}
+        headers = {"Authorization": f"token {access_token}", "Accept": "application/json"}
         
-        response = requests.get(user_url, headers=headers)
+        response = await tornado.httpclient.AsyncHTTPClient().fetch(
+            user_url, headers=headers, raise_error=False)
         
-        if response.status_code == 200:
-            user_data = response.json()
+        if response.code == 200:
+            user_data = json.loads(response.body)
             
             # Create or update user in database
-            user = create_user(
+            user = await create_user(
                 github_id=user_data["id"],
                 username=user_data["login"],
                 email=user_data.get("email", ""),
@@ -104,5 +105,6 @@ class GitHubAuthHandler(tornado.web.RequestHandler):
 
 class LogoutHandler(tornado.web.RequestHandler):
     def get(self):
+        forget_user_cookie(self)
         self.clear_cookie("user")
         self.redirect("/")
\ No newline at end of file
@@ -1,54 +1,110 @@
 
 # events.py (updated with upcoming events for dashboard)
+import tornado.ioloop
 import tornado.web
+import base64
 import json
 import uuid
 from datetime import datetime, timedelta
-from models.db import (
-    create_event, get_event_by_id, get_events_by_user, 
-    add_time_slot, get_time_slots_by_event, vote_for_slot,
-    get_votes_by_event, add_comment, get_comments_by_event,
-    finalize_event, update_event, get_upcoming_events
+from handlers.page_cache import (
+    ConditionalEventMixin, fill_viewer_parts, get_page_cache, viewer_role
+)
+from handlers.session import decode_user_cookie
+from handlers.websocket import VoteWebSocketHandler
+from models.async_db import (
+    create_event_with_slots, get_event_by_id, get_events_by_user, get_user_stats,
+    get_event_bundle, get_event_changes, get_event_with_version, get_user_votes, vote_for_slot,
+    add_comment, finalize_event, update_event, get_upcoming_events
 )
 
 class BaseAuthHandler(tornado.web.RequestHandler):
+    # Tornado memoizes this per request behind self.current_user
     def get_current_user(self):
-        user_cookie = self.get_secure_cookie("user")
-        if user_cookie:
-            return json.loads(user_cookie)
-        return None
+        return decode_user_cookie(self)
+
+    def get_template_namespace(self):
+        namespace = super().get_template_namespace()
+        # base.html shows upcoming events in the nav when a page passes them
+        namespace["upcoming_events"] = []
+        return namespace
+
+# Events per dashboard list page
+DASHBOARD_PAGE_SIZE = 20
+
+def encode_page_cursor(event):
+    """Opaque cursor for the page after event: its (created_at, id) key"""
+    key = json.dumps([str(event["created_at"]), event["id"]])
+    return base64.urlsafe_b64encode(key.encode()).decode()
+
+def decode_page_cursor(cursor):
+    try:
+        created_at, event_id = json.loads(base64.urlsafe_b64decode(cursor.encode()))
+    except (ValueError, TypeError):
+        raise tornado.web.HTTPError(400, "Invalid cursor")
+    return created_at, event_id
+
+async def get_event_page(user_id, created_by, cursor=None):
+    """Get one dashboard page and the cursor for the next one (None if last)"""
+    before = decode_page_cursor(cursor) if cursor else None
+    events = await get_events_by_user(user_id, created_by=created_by,
+                                      limit=DASHBOARD_PAGE_SIZE + 1, before=before)
+    next_cursor = None
+    if len(events) > DASHBOARD_PAGE_SIZE:
+        events = events[:DASHBOARD_PAGE_SIZE]
+        next_cursor = encode_page_cursor(events[-1])
+    return events, next_cursor
 
 class DashboardHandler(BaseAuthHandler):
     @tornado.web.authenticated
-    def get(self):
-        user = self.get_current_user()
-        created_events = get_events_by_user(user["id"], created_by=True)
-        participated_events = get_events_by_user(user["id"], created_by=False)
+    async def get(self):
+        user = self.current_user
+        created_events, created_cursor = await get_event_page(user["id"], created_by=True)
+        participated_events, participated_cursor = await get_event_page(user["id"], created_by=False)
+        counts = await get_user_stats(user["id"])
 
         now = datetime.utcnow()
         next_24h = now + timedelta(hours=24)
-        upcoming_events = get_upcoming_events(user["id"], now, next_24h)
+        upcoming_events = await get_upcoming_events(user["id"], now, next_24h)
 
         self.render("dashboard.html", 
                    user=user,
                    created_events=created_events,
+                   created_cursor=created_cursor,
                    participated_events=participated_events,
+                   participated_cursor=participated_cursor,
+                   counts=counts,
                    upcoming_events=upcoming_events)
 
+class DashboardEventsHandler(BaseAuthHandler):
+    """Next page of a dashboard list, for the "Load more" buttons"""
+
+    @tornado.web.authenticated
+    async def get(self, list_name):
+        user = self.current_user
+        created_by = list_name == "created"
+        events, next_cursor = await get_event_page(
+            user["id"], created_by, self.get_argument("cursor", None)
+        )
+
+        html = self.render_string("dashboard_events.html", events=events,
+                                  show_creator=not created_by)
+        self.set_header("Content-Type", "application/json")
+        self.write(json.dumps({"html": html.decode(), "next_cursor": next_cursor}))
+
 class EventCreateHandler(BaseAuthHandler):
     @tornado.web.authenticated
     def get(self):
-        user = self.get_current_user()
+        user = self.current_user
         self.render("create_event.html", user=user)
     
     @tornado.web.authenticated
-    def post(self):
-        user = self.get_current_user()
+    async def post(self):
+        user = self.current_user
         
         title = self.get_argument("title")
         description = self.get_argument("description", "")
         location = self.get_argument("location", "")
-        time_slots = self.get_arguments("time_slots")
+        time_slots = [slot for slot in self.get_arguments("time_slots") if slot.strip()]
         
         if not title or not time_slots:
             self.render("create_event.html", 
@@ -61,97 +117,204 @@ class EventCreateHandler(BaseAuthHandler):
         max_applicants = None if unlimited else int(max_applicants_str)
 
         event_id = str(uuid.uuid4())
-        event = create_event(
+        event = await create_event_with_slots(
             event_id=event_id,
             title=title,
             description=description,
             location=location,
             created_by=user["id"],
+            slot_datetimes=time_slots,
             max_applicants=max_applicants
         )
         
-        for slot_datetime in time_slots:
-            if slot_datetime.strip():
-                add_time_slot(event_id, slot_datetime)
-        
         self.redirect(f"/event/{event_id}")
 
-class EventViewHandler(BaseAuthHandler):
-    def get(self, event_id):
-        user = self.get_current_user()
-        event = get_event_by_id(event_id)
-        
+class EventViewHandler(ConditionalEventMixin, BaseAuthHandler):
+    async def get(self, event_id):
+        # At most two database calls per view: the event with its version,
+        # then either the bundle (which brings the viewer's votes along) or,
+        # on a page cache hit, just the viewer's votes
+        user = self.current_user
+        event, stamp = await get_event_with_version(event_id)
         if not event:
             raise tornado.web.HTTPError(404, "Event not found")
-        
-        time_slots = get_time_slots_by_event(event_id)
-        votes = get_votes_by_event(event_id)
-        comments = get_comments_by_event(event_id)
-        
-        votes_by_slot = {}
-        user_votes = {}
-        for vote in votes:
-            slot_id = vote["time_slot_id"]
-            if slot_id not in votes_by_slot:
-                votes_by_slot[slot_id] = []
-            votes_by_slot[slot_id].append(vote)
-            
-            if user and vote["user_id"] == user["id"]:
-                user_votes[slot_id] = True
-        
-        self.render("event.html",
-                   event=event,
-                   time_slots=time_slots,
-                   votes_by_slot=votes_by_slot,
-                   user_votes=user_votes,
-                   comments=comments,
-                   user=user)
+
+        role = viewer_role(event, user)
+        # The nav and vote buttons differ per viewer, so the user id is part
+        # of the validator; the viewer's own votes all bump the version
+        if self.not_modified(event, stamp, f"{role}-{user['id'] if user else 0}"):
+            return
+
+        cache = get_page_cache()
+        html = cache.get((event_id, stamp["version"], role))
+        user_votes = None
+        if html is None:
+            html, user_votes = await self.render_shared(event_id, role, user)
+
+        if role == "anonymous":
+            # Anonymous viewers all see the same page
+            self.write(html)
+            return
+
+        if user_votes is None:
+            user_votes = await get_user_votes(event_id, user["id"])
+
+        def render_part(name):
+            if name == "xsrf":
+                return self.xsrf_form_html()
+            if name == "comment-form":
+                return self.render_string("event_comment_form.html", user=user).decode()
+            slot_id = int(name.split(":", 1)[1])
+            return self.render_string("event_vote_button.html", slot_id=slot_id,
+                                      voted=slot_id in user_votes).decode()
+
+        self.render("event.html", event=event, user=user,
+                    content=fill_viewer_parts(html, render_part))
+
+    async def render_shared(self, event_id, role, user):
+        """Render and cache the viewer-independent HTML for role
+
+        For anonymous viewers that is the whole page, otherwise the page
+        content with <!--viewer:...--> markers. Returns the HTML and the
+        slot ids user has voted for, read in the same snapshot.
+        """
+        bundle = await get_event_bundle(event_id, viewer_id=user["id"] if user else None)
+        if not bundle:
+            raise tornado.web.HTTPError(404, "Event not found")
+
+        html = self.render_string("event_content.html",
+                                  event=bundle["event"],
+                                  time_slots=bundle["time_slots"],
+                                  votes_by_slot=bundle["votes_by_slot"],
+                                  comments=bundle["comments"],
+                                  tallies=bundle["tallies"],
+                                  version=bundle["version"],
+                                  role=role).decode()
+        if role == "anonymous":
+            html = self.render_string("event.html", event=bundle["event"],
+                                      user=None, content=html).decode()
+
+        get_page_cache().put((event_id, bundle["version"], role), html)
+        return html, bundle["user_votes"]
     
     @tornado.web.authenticated
-    def post(self, event_id):
-        user = self.get_current_user()
+    async def post(self, event_id):
+        user = self.current_user
         action = self.get_argument("action", "")
         
         if action == "comment":
             comment_text = self.get_argument("comment", "")
             if comment_text.strip():
-                add_comment(event_id, user["id"], comment_text)
+                await add_comment(event_id, user["id"], comment_text)
         
         elif action == "finalize":
-            event = get_event_by_id(event_id)
+            event = await get_event_by_id(event_id)
             if event and event["created_by"] == user["id"]:
                 slot_id = self.get_argument("slot_id", "")
                 if slot_id:
-                    finalize_event(event_id, slot_id)
+                    await finalize_event(event_id, slot_id)
         
         self.redirect(f"/event/{event_id}")
 
+class EventJSONHandler(ConditionalEventMixin, BaseAuthHandler):
+    """The viewer-independent state of an event as JSON"""
+
+    async def get(self, event_id):
+        event, stamp = await get_event_with_version(event_id)
+        if not event:
+            raise tornado.web.HTTPError(404, "Event not found")
+
+        self.set_header("Content-Type", "application/json")
+        if self.not_modified(event, stamp, "json", vary_cookie=False):
+            return
+
+        cache = get_page_cache()
+        body = cache.get((event_id, stamp["version"], "json"))
+        if body is None:
+            bundle = await get_event_bundle(event_id)
+            if not bundle:
+                raise tornado.web.HTTPError(404, "Event not found")
+            body = json.dumps({
+                "event": bundle["event"],
+                "version": bundle["version"],
+                "time_slots": bundle["time_slots"],
+                "votes_by_slot": {
+                    slot_id: [{"username": vote["username"], "avatar_url": vote["avatar_url"]}
+                              for vote in votes]
+                    for slot_id, votes in bundle["votes_by_slot"].items()
+                },
+                "tallies": bundle["tallies"],
+                "comments": bundle["comments"],
+            }, default=str)
+            cache.put((event_id, bundle["version"], "json"), body)
+        self.write(body)
+
+class EventChangesHandler(BaseAuthHandler):
+    """Changes to an event after ?since=<version>, for clients catching up"""
+
+    async def get(self, event_id):
+        try:
+            since = int(self.get_argument("since", "0"))
+        except ValueError:
+            raise tornado.web.HTTPError(400, "Invalid since")
+        if since < 0:
+            raise tornado.web.HTTPError(400, "Invalid since")
+
+        event = await get_event_by_id(event_id)
+        if not event:
+            raise tornado.web.HTTPError(404, "Event not found")
+
+        changes = await get_event_changes(event_id, since)
+        self.set_header("Content-Type", "application/json")
+        self.set_header("Cache-Control", "no-cache")
+        self.write(json.dumps(changes, default=str))
+
 class EventVoteHandler(BaseAuthHandler):
     @tornado.web.authenticated
-    def post(self):
-        user = self.get_current_user()
+    async def post(self):
+        user = self.current_user
         event_id = self.get_argument("event_id")
-        slot_id = self.get_argument("slot_id")
+        try:
+            slot_id = int(self.get_argument("slot_id"))
+        except ValueError:
+            raise tornado.web.HTTPError(400, "Invalid slot_id")
         action = self.get_argument("action", "vote")
-        
-        result = vote_for_slot(event_id, slot_id, user["id"], action == "vote")
+
+        try:
+            result = await vote_for_slot(event_id, slot_id, user["id"], action == "vote")
+        except LookupError:
+            raise tornado.web.HTTPError(404, "Event not found")
+        except ValueError:
+            raise tornado.web.HTTPError(400, "Time slot is not part of this event")
+
+        # Push the vote to other viewers; repeated clicks that change
+        # nothing aren't broadcast
+        if result["changed"]:
+            VoteWebSocketHandler.broadcast_vote_delta(
+                event_id, result["version"], slot_id,
+                "vote" if action == "vote" else "unvote", user, result["vote_count"]
+            )
         
         self.set_header("Content-Type", "application/json")
-        self.write(json.dumps({"success": result}))
+        self.write(json.dumps({
+            "success": True,
+            "changed": result["changed"],
+            "vote_count": result["vote_count"]
+        }))
 
 class EventEditHandler(BaseAuthHandler):
     @tornado.web.authenticated
-    def get(self, event_id):
-        user = self.get_current_user()
-        event = get_event_by_id(event_id)
+    async def get(self, event_id):
+        user = self.current_user
+        event = await get_event_by_id(event_id)
         if not event or event["created_by"] != user["id"]:
             raise tornado.web.HTTPError(403, "Not authorized")
         self.render("edit_event.html", user=user, event=event)
 
     @tornado.web.authenticated
-    def post(self, event_id):
-        user = self.get_current_user()
-        event = get_event_by_id(event_id)
+    async def post(self, event_id):
+        user = self.current_user
+        event = await get_event_by_id(event_id)
         if not event or event["created_by"] != user["id"]:
             raise tornado.web.HTTPError(403, "Not authorized")
 
@@ -162,7 +325,7 @@ class EventEditHandler(BaseAuthHandler):
         max_applicants_str = self.get_argument("max_applicants", "50")
         max_applicants = None if unlimited else int(max_applicants_str)
 
-        updated_event = update_event(
+        updated_event = await update_event(
             event_id=event_id,
             title=title,
             description=description,
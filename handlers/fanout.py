@@ -0,0 +1,281 @@
+"""Fan-out of WebSocket messages to the viewers of an event
+
+A broadcast is encoded once and queued on every viewer's connection.
+Each connection has its own bounded queue and writes one frame at a
+time, waiting for the previous one to reach the socket, so a slow
+viewer can't hold more than max_frames messages in memory:
+
+    get_fanout().broadcast(event_id, {"type": "vote_delta", ...})
+
+When a queue is full the oldest frame is dropped (viewers notice the gap
+in seq and catch up from the change log). A frame sent with a key
+replaces a still-queued frame with the same key instead. A connection
+that stays at or above high_water queued frames for high_water_seconds
+is closed; the client reconnects and catches up.
+
+Counters are kept per event while it has viewers, and in total.
+
+Debouncer collects what is to be broadcast for an event during a burst
+and hands it over in one go, so a burst costs one message per viewer.
+"""
+import collections
+import json
+import os
+import time
+
+import tornado.ioloop
+import tornado.websocket
+from tornado.log import app_log
+
+COUNTERS = ("broadcasts", "frames", "sent", "dropped", "coalesced", "disconnected")
+
+
+class ClientQueue:
+    """Bounded outbound queue of one WebSocket connection"""
+
+    def __init__(self, fanout, event_id, connection):
+        self.fanout = fanout
+        self.event_id = event_id
+        self.connection = connection
+        self.frames = collections.deque()  # [key, frame] entries
+        self.keyed = {}                    # key -> its queued entry
+        self.writing = False
+        self.closed = False
+        self.over_since = None
+
+    def put(self, frame, key=None):
+        if self.closed:
+            return
+        fanout = self.fanout
+        if key is not None and key in self.keyed:
+            self.keyed[key][1] = frame
+            fanout._count(self.event_id, "coalesced")
+            return
+
+        if len(self.frames) >= fanout.max_frames:
+            dropped_key, _ = self.frames.popleft()
+            if dropped_key is not None:
+                del self.keyed[dropped_key]
+            fanout._count(self.event_id, "dropped")
+        entry = [key, frame]
+        self.frames.append(entry)
+        if key is not None:
+            self.keyed[key] = entry
+        fanout._count(self.event_id, "frames")
+
+        if len(self.frames) >= fanout.high_water:
+            now = time.monotonic()
+            if self.over_since is None:
+                self.over_since = now
+            elif now - self.over_since >= fanout.high_water_seconds:
+                self.disconnect()
+                return
+        if not self.writing:
+            self._write_next()
+
+    def _write_next(self):
+        if self.closed or not self.frames:
+            self.writing = False
+            return
+        key, frame = self.frames.popleft()
+        if key is not None:
+            del self.keyed[key]
+        if len(self.frames) < self.fanout.high_water:
+            self.over_since = None
+        try:
+            future = self.connection.write_message(frame)
+        except tornado.websocket.WebSocketClosedError:
+            self.close()
+            return
+        self.writing = True
+        future.add_done_callback(self._written)
+
+    def _written(self, future):
+        if future.cancelled() or future.exception() is not None:
+            self.close()
+            return
+        self.fanout._count(self.event_id, "sent")
+        self._write_next()
+
+    def disconnect(self):
+        """Close a connection that isn't keeping up with its messages"""
+        self.fanout._count(self.event_id, "disconnected")
+        self.close()
+        self.connection.close(1013, "Too far behind")
+
+    def close(self):
+        self.closed = True
+        self.writing = False
+        self.frames.clear()
+        self.keyed.clear()
+
+
+class FanOut:
+    """Per-event sets of viewer connections, each with a bounded send queue"""
+
+    def __init__(self, max_frames=64, high_water=48, high_water_seconds=5.0):
+        self.max_frames = max(1, int(max_frames))
+        self.high_water = max(1, min(int(high_water), self.max_frames))
+        self.high_water_seconds = high_water_seconds
+        self.clients = {}  # event_id -> {connection: ClientQueue}
+        self.event_counters = {}
+        self.totals = dict.fromkeys(COUNTERS, 0)
+
+    def add(self, event_id, connection):
+        if event_id not in self.clients:
+            self.clients[event_id] = {}
+            self.event_counters[event_id] = dict.fromkeys(COUNTERS, 0)
+        self.clients[event_id][connection] = ClientQueue(self, event_id, connection)
+
+    def remove(self, event_id, connection):
+        viewers = self.clients.get(event_id)
+        if viewers is None:
+            return
+        queue = viewers.pop(connection, None)
+        if queue is not None:
+            queue.close()
+        if not viewers:
+            del self.clients[event_id]
+            del self.event_counters[event_id]
+
+    def viewers(self, event_id):
+        return len(self.clients.get(event_id, ()))
+
+    def broadcast(self, event_id, message, key=None):
+        """Queue message (a dict, encoded here once) for every viewer of the event
+
+        Returns the number of viewers it was queued for.
+        """
+        viewers = self.clients.get(event_id)
+        if not viewers:
+            return 0
+        self._count(event_id, "broadcasts")
+        frame = json.dumps(message)
+        for queue in list(viewers.values()):
+            queue.put(frame, key)
+        return len(viewers)
+
+    def send(self, event_id, connection, message, key=None):
+        """Queue message for one viewer, behind what is already queued for it"""
+        queue = self.clients.get(event_id, {}).get(connection)
+        if queue is not None:
+            queue.put(json.dumps(message), key)
+
+    def _count(self, event_id, counter):
+        self.totals[counter] += 1
+        counters = self.event_counters.get(event_id)
+        if counters is not None:
+            counters[counter] += 1
+
+    def stats(self):
+        """Totals plus counters and queued frames for each event with viewers"""
+        events = {}
+        for event_id, viewers in self.clients.items():
+            events[event_id] = dict(
+                self.event_counters[event_id],
+                viewers=len(viewers),
+                queued=sum(len(queue.frames) for queue in viewers.values()),
+            )
+        return {
+            "max_frames": self.max_frames,
+            "high_water": self.high_water,
+            "high_water_seconds": self.high_water_seconds,
+            "totals": dict(self.totals),
+            "events": events,
+        }
+
+
+class Debouncer:
+    """Collect items per key and flush them together once the key goes quiet
+
+    flush(key, items) runs window seconds after the last item for a key
+    arrived, and never later than max_delay seconds after the first one,
+    however long the burst lasts. A window of 0 flushes every item as
+    soon as it is added.
+    """
+
+    def __init__(self, flush, window=0.05, max_delay=0.25):
+        self.flush = flush
+        self.window = window
+        self.max_delay = max(window, max_delay)
+        self._pending = {}  # key -> [items, last added at, deadline]
+
+        # Stats
+        self.items = 0
+        self.flushes = 0
+        self.flushed_items = 0
+        self.items_max = 0
+
+    def add(self, key, item):
+        self.items += 1
+        if self.window <= 0:
+            self._run(key, [item])
+            return
+        io_loop = tornado.ioloop.IOLoop.current()
+        now = io_loop.time()
+        pending = self._pending.get(key)
+        if pending is None:
+            self._pending[key] = [[item], now, now + self.max_delay]
+            io_loop.call_at(now + self.window, self._due, key)
+        else:
+            # The timer already set re-arms itself from here, rather than
+            # being cancelled and replaced for every item
+            pending[0].append(item)
+            pending[1] = now
+
+    def _due(self, key):
+        pending = self._pending.get(key)
+        if pending is None:
+            return
+        items, last_added, deadline = pending
+        io_loop = tornado.ioloop.IOLoop.current()
+        due = min(last_added + self.window, deadline)
+        if due > io_loop.time():
+            io_loop.call_at(due, self._due, key)
+            return
+        del self._pending[key]
+        self._run(key, items)
+
+    def _run(self, key, items):
+        self.flushes += 1
+        self.flushed_items += len(items)
+        self.items_max = max(self.items_max, len(items))
+        try:
+            self.flush(key, items)
+        except Exception:
+            app_log.exception("Broadcast of %d item(s) for %s failed", len(items), key)
+
+    def flush_all(self):
+        """Flush every key now (e.g. on shutdown or in tests)"""
+        pending, self._pending = self._pending, {}
+        for key, (items, _, _) in pending.items():
+            self._run(key, items)
+
+    def stats(self):
+        """Items added, flushes made and how many items a flush carried"""
+        return {
+            "window": self.window,
+            "max_delay": self.max_delay,
+            "pending": sum(len(items) for items, _, _ in self._pending.values()),
+            "items": self.items,
+            "flushes": self.flushes,
+            "items_per_flush": self.flushed_items / (self.flushes or 1),
+            "items_max": self.items_max,
+        }
+
+
+_fanout = None
+
+def get_fanout():
+    """Get the process-wide fan-out, creating it on first use"""
+    global _fanout
+    if _fanout is None:
+        _fanout = FanOut(
+            max_frames=int(os.environ.get('WS_SEND_QUEUE_FRAMES', 64)),
+            high_water=int(os.environ.get('WS_SEND_HIGH_WATER', 48)),
+            high_water_seconds=float(os.environ.get('WS_SEND_HIGH_WATER_SECONDS', 5)),
+        )
+    return _fanout
+
+def get_fanout_stats():
+    return get_fanout().stats()
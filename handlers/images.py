@@ -0,0 +1,235 @@
+"""Resized and WebP variants of static/images, and markup that uses them
+
+`python -m handlers.images` (needs Pillow, a build-time only dependency)
+writes the variants of every image a template shows through Picture under
+static/images/variants/ along with a manifest, and reports the bytes each
+page saves. Commit the output: the server
+only reads the manifest.
+
+Templates show an image with
+    {% module Picture('images/logo.png', alt='...', width=80) %}
+where width is the displayed CSS width; images missing from the manifest
+fall back to a plain <img>.
+"""
+import argparse
+import hashlib
+import json
+import os
+import re
+import sys
+from urllib.parse import quote
+
+import tornado.web
+from tornado.escape import xhtml_escape
+
+VARIANT_DIR = "images/variants"
+MANIFEST = VARIANT_DIR + "/manifest.json"
+WIDTHS = (80, 160, 320, 640, 1280)
+SOURCE_EXTENSIONS = (".png", ".jpg", ".jpeg")
+MIN_SOURCE_BYTES = 4096  # favicons and the like aren't worth it
+
+_manifests = {}
+
+def get_image_manifest(static_path):
+    """Get the variant manifest, re-read whenever the file changes"""
+    path = os.path.join(static_path, MANIFEST)
+    try:
+        mtime = os.stat(path).st_mtime
+    except OSError:
+        return {}
+    cached = _manifests.get(path)
+    if cached is None or cached[0] != mtime:
+        with open(path) as f:
+            cached = (mtime, json.load(f))
+        _manifests[path] = cached
+    return cached[1]
+
+def _variant_path(source, width, ext):
+    stem = os.path.splitext(os.path.basename(source))[0]
+    slug = re.sub(r"[^A-Za-z0-9_-]+", "-", stem).strip("-").lower()
+    return f"{VARIANT_DIR}/{slug}-{width}.{ext}"
+
+def build_images(static_path, sources, widths=WIDTHS):
+    """Write WebP and resized variants of the given images
+
+    Images whose content hasn't changed since the last build are skipped,
+    and variants of images no longer in sources are deleted. Returns the
+    new manifest.
+    """
+    try:
+        from PIL import Image
+    except ImportError:
+        raise RuntimeError("Building image variants needs Pillow: pip install Pillow")
+
+    previous = get_image_manifest(static_path)
+    manifest = {}
+    os.makedirs(os.path.join(static_path, VARIANT_DIR), exist_ok=True)
+
+    for source in sorted(sources):
+        source_file = os.path.join(static_path, source)
+        if not source.lower().endswith(SOURCE_EXTENSIONS) or not os.path.isfile(source_file):
+            continue
+        with open(source_file, "rb") as f:
+            content = f.read()
+        if len(content) < MIN_SOURCE_BYTES:
+            continue
+
+        digest = hashlib.sha1(content).hexdigest()
+        entry = previous.get(source)
+        if entry and entry["sha1"] == digest and all(
+                os.path.exists(os.path.join(static_path, v["path"])) for v in entry["variants"]):
+            manifest[source] = entry
+            continue
+
+        with Image.open(source_file) as image:
+            image.load()
+            width, height = image.size
+            variants = []
+            for target in [w for w in widths if w < width] + [width]:
+                resized = image if target == width else image.resize(
+                    (target, max(1, round(height * target / width))), Image.LANCZOS)
+                for ext, kwargs in (("webp", {"quality": 80, "method": 6}),
+                                    ("png", {"optimize": True})):
+                    if ext == "png" and target == width:
+                        continue  # the source itself
+                    path = _variant_path(source, target, ext)
+                    resized.save(os.path.join(static_path, path), **kwargs)
+                    variants.append({
+                        "path": path,
+                        "width": target,
+                        "type": f"image/{ext}",
+                        "bytes": os.path.getsize(os.path.join(static_path, path)),
+                    })
+        manifest[source] = {
+            "sha1": digest,
+            "width": width,
+            "height": height,
+            "bytes": len(content),
+            "variants": variants,
+        }
+
+    kept = {v["path"] for entry in manifest.values() for v in entry["variants"]}
+    for entry in previous.values():
+        for variant in entry["variants"]:
+            if variant["path"] not in kept and os.path.exists(os.path.join(static_path, variant["path"])):
+                os.remove(os.path.join(static_path, variant["path"]))
+
+    with open(os.path.join(static_path, MANIFEST), "w") as f:
+        json.dump(manifest, f, indent=1, sort_keys=True)
+        f.write("\n")
+    return manifest
+
+def pick_variant(entry, width, density=2):
+    """The WebP variant a browser picks for a display width, or None"""
+    webp = sorted((v for v in entry["variants"] if v["type"] == "image/webp"),
+                  key=lambda v: v["width"])
+    for variant in webp:
+        if variant["width"] >= width * density:
+            return variant
+    return webp[-1] if webp else None
+
+PICTURE_CALL = re.compile(r"\{% module Picture\(\s*'([^']+)'[^%]*?width=(\d+)")
+STATIC_IMAGE = re.compile(r"static_url\('(images/[^']+)'\)")
+EXTENDS = re.compile(r'\{% extends "([^"]+)" %\}')
+
+def referenced_images(template_path):
+    """Static paths of the images the templates show through Picture"""
+    paths = set()
+    for name in sorted(os.listdir(template_path)):
+        with open(os.path.join(template_path, name)) as f:
+            paths.update(path for path, _ in PICTURE_CALL.findall(f.read()))
+    return paths
+
+def page_report(template_path, static_path, density=2):
+    """Bytes of images each page downloads, before and after the variants
+
+    Assumes a density-x screen and a browser that takes WebP. Returns
+    (page, original_bytes, variant_bytes) for every page with images.
+    """
+    manifest = get_image_manifest(static_path)
+
+    def read(name):
+        with open(os.path.join(template_path, name)) as f:
+            return f.read()
+
+    names = sorted(os.listdir(template_path))
+    layouts = {parent for name in names for parent in EXTENDS.findall(read(name))}
+    report = []
+    for name in names:
+        source = read(name)
+        if name in layouts or ("{% extends" not in source and "<html" not in source):
+            continue  # layouts and partials are counted in the pages using them
+        original = optimized = 0
+        while source:
+            for path, width in PICTURE_CALL.findall(source):
+                size = os.path.getsize(os.path.join(static_path, path))
+                original += size
+                variant = pick_variant(manifest[path], int(width), density) if path in manifest else None
+                optimized += variant["bytes"] if variant else size
+            for path in STATIC_IMAGE.findall(source):
+                if path.endswith(".png") and "favicon" not in path:
+                    size = os.path.getsize(os.path.join(static_path, path))
+                    original += size
+                    optimized += size
+            parent = EXTENDS.search(source)
+            source = read(parent.group(1)) if parent else None
+        if original:
+            report.append((name, original, optimized))
+    return report
+
+
+class Picture(tornado.web.UIModule):
+    """<picture> with WebP and resized variants of a static image"""
+
+    def render(self, path, alt="", width=None, css_class="", loading=None):
+        handler = self.handler
+        entry = get_image_manifest(handler.settings["static_path"]).get(path)
+        attrs = f'alt="{xhtml_escape(alt)}"'
+        if css_class:
+            attrs += f' class="{xhtml_escape(css_class)}"'
+        if loading:
+            attrs += f' loading="{xhtml_escape(loading)}"'
+        src = xhtml_escape(handler.static_url(path))
+        if entry is None:
+            return f'<img src="{src}" {attrs}>'
+
+        def srcset(kind, extra=()):
+            candidates = [(v["path"], v["width"]) for v in entry["variants"] if v["type"] == kind]
+            # Spaces separate srcset candidates, so file names need quoting
+            return xhtml_escape(", ".join(
+                f"{quote(handler.static_url(p), safe='/?=&')} {w}w"
+                for p, w in candidates + list(extra)))
+
+        sizes = f"{width}px" if width else "100vw"
+        return (
+            f'<picture>'
+            f'<source type="image/webp" srcset="{srcset("image/webp")}" sizes="{sizes}">'
+            f'<img src="{src}" srcset="{srcset("image/png", [(path, entry["width"])])}" '
+            f'sizes="{sizes}" width="{entry["width"]}" height="{entry["height"]}" '
+            f'decoding="async" {attrs}>'
+            f'</picture>'
+        )
+
+
+def main(argv=None):
+    root = os.path.join(os.path.dirname(__file__), "..")
+    parser = argparse.ArgumentParser(prog="python -m handlers.images",
+                                     description="Build responsive image variants")
+    parser.add_argument("--static-path", default=os.path.join(root, "static"))
+    parser.add_argument("--template-path", default=os.path.join(root, "templates"))
+    args = parser.parse_args(argv)
+
+    manifest = build_images(args.static_path, referenced_images(args.template_path))
+    for source, entry in manifest.items():
+        print(f"{source}: {entry['width']}x{entry['height']}, {entry['bytes']} bytes, "
+              f"{len(entry['variants'])} variant(s)")
+
+    print(f"\n{'page':<22} {'before':>9} {'after':>9} {'saved':>9}")
+    for page, original, optimized in page_report(args.template_path, args.static_path):
+        print(f"{page:<22} {original:>9} {optimized:>9} {original - optimized:>9} "
+              f"({1 - optimized / original:.0%})")
+    return 0
+
+
+if __name__ == "__main__":
+    sys.exit(main())
@@ -0,0 +1,114 @@
+"""Cache of rendered event page HTML
+
+Entries are keyed by (event_id, version, role). Every change to an event
+bumps its version in the database, so entries for an older version are
+never served again (in any process) and simply age out of the LRU.
+
+Logged-in viewers get the shared page content from the cache with their
+own parts (vote buttons, comment form, XSRF fields) filled in at the
+<!--viewer:NAME--> markers; anonymous viewers get the whole page as is.
+
+The same version stamp answers conditional GETs (ETag / Last-Modified)
+before any of the page's data is loaded.
+"""
+import email.utils
+import functools
+import hashlib
+import os
+import re
+from datetime import datetime, timedelta, timezone
+
+from models.cache import LRUCache
+
+VIEWER_MARKER = re.compile(r"<!--viewer:([\w:-]+)-->")
+
+_pages = None
+
+def get_page_cache():
+    """Get the process-wide rendered page cache, creating it on first use"""
+    global _pages
+    if _pages is None:
+        _pages = LRUCache(
+            max_bytes=int(os.environ.get('PAGE_CACHE_BYTES', 16 * 1024 * 1024)),
+            ttl=float(os.environ.get('PAGE_CACHE_TTL', 300)),
+            sizeof=len,
+        )
+    return _pages
+
+def get_page_cache_stats():
+    return get_page_cache().stats()
+
+def viewer_role(event, user):
+    """The part of the viewer's identity the shared content depends on"""
+    if not user:
+        return "anonymous"
+    if user["id"] == event["created_by"]:
+        return "creator"
+    return "member"
+
+def fill_viewer_parts(html, render_part):
+    """Replace each <!--viewer:NAME--> marker with render_part(NAME)"""
+    return VIEWER_MARKER.sub(lambda match: render_part(match.group(1)), html)
+
+@functools.lru_cache(maxsize=None)
+def template_fingerprint(template_path):
+    """Short hash of the templates, so a deploy that changes them changes ETags"""
+    digest = hashlib.sha1()
+    for root, _, files in sorted(os.walk(template_path)):
+        for name in sorted(files):
+            with open(os.path.join(root, name), "rb") as f:
+                digest.update(f.read())
+    return digest.hexdigest()[:8]
+
+def _as_utc(value):
+    if value is None:
+        return None
+    if not isinstance(value, datetime):
+        value = datetime.fromisoformat(str(value))
+    if value.tzinfo is None:
+        value = value.replace(tzinfo=timezone.utc)
+    return value.astimezone(timezone.utc).replace(microsecond=0)
+
+
+class ConditionalEventMixin:
+    """Answer conditional GETs for an event from its version stamp"""
+
+    def not_modified(self, event, stamp, variant, vary_cookie=True):
+        """Set ETag/Last-Modified for the event; True if a 304 was sent
+
+        variant names everything besides the event version the response
+        depends on (viewer role and id, or the representation).
+        """
+        fingerprint = template_fingerprint(self.settings.get("template_path", ""))
+        self.set_header("Etag", f'W/"{stamp["version"]}-{variant}-{fingerprint}"')
+        # Let browsers keep the page but revalidate it on every load
+        self.set_header("Cache-Control", "no-cache")
+        if vary_cookie:
+            self.add_header("Vary", "Cookie")
+
+        last_modified = _as_utc(stamp["updated_at"] or event["created_at"])
+        if last_modified is not None:
+            self.set_header("Last-Modified", last_modified)
+
+        if "If-None-Match" in self.request.headers:
+            fresh = self.check_etag_header()
+        else:
+            fresh = self._unmodified_since(last_modified)
+        if fresh:
+            self.set_status(304)
+        return fresh
+
+    def _unmodified_since(self, last_modified):
+        header = self.request.headers.get("If-Modified-Since")
+        if not header or last_modified is None:
+            return False
+        try:
+            since = email.utils.parsedate_to_datetime(header)
+        except (TypeError, ValueError):
+            return False
+        if since.tzinfo is None:
+            since = since.replace(tzinfo=timezone.utc)
+        # Last-Modified has one-second resolution; a change in the current
+        # second could still be followed by another one within it
+        settled = last_modified < datetime.now(timezone.utc) - timedelta(seconds=1)
+        return settled and since >= last_modified
@@ -0,0 +1,66 @@
+"""Signed "user" cookie decoding with a cache of recently verified sessions
+
+Checking the cookie's HMAC and parsing its JSON payload on every request
+adds up; sessions seen recently are looked up by the raw signed cookie
+value instead. The signature covers the whole value, so any tampered or
+re-signed cookie is a different key and gets verified from scratch.
+An entry never outlives the cookie's own max age, so a cache hit can't
+accept a cookie that get_secure_cookie would reject as expired.
+"""
+import json
+import os
+import time
+
+from models.cache import LRUCache, approx_size
+
+MAX_AGE_DAYS = 31  # get_secure_cookie's default
+
+_sessions = None
+
+def get_session_cache():
+    """Get the process-wide verified-session cache, creating it on first use"""
+    global _sessions
+    if _sessions is None:
+        _sessions = LRUCache(
+            max_bytes=int(os.environ.get('SESSION_CACHE_BYTES', 1024 * 1024)),
+            ttl=float(os.environ.get('SESSION_CACHE_TTL', 300)),
+            sizeof=lambda user: approx_size(user) + 200,  # plus the cookie key
+        )
+    return _sessions
+
+def get_session_cache_stats():
+    return get_session_cache().stats()
+
+def decode_user_cookie(handler):
+    """Get the user dict from the request's signed cookie, or None"""
+    raw = handler.get_cookie("user")
+    if not raw:
+        return None
+
+    cache = get_session_cache()
+    user = cache.get(raw)
+    if user is None:
+        user_cookie = handler.get_secure_cookie("user", value=raw, max_age_days=MAX_AGE_DAYS)
+        if not user_cookie:
+            return None
+        try:
+            user = json.loads(user_cookie)
+        except ValueError:
+            return None
+        remaining = _signed_at(raw) + MAX_AGE_DAYS * 86400 - time.time()
+        cache.put(raw, user, ttl=remaining)
+    return dict(user)
+
+def _signed_at(raw):
+    """Get the timestamp of a signed value that has already been verified"""
+    fields = raw.split("|")
+    if fields[0] == "2":
+        # 2|<key version>|<timestamp>|<name>|<value>|<signature>, length-prefixed
+        return int(fields[2].split(":", 1)[1])
+    return int(fields[-2])  # version 1: <value>|<timestamp>|<signature>
+
+def forget_user_cookie(handler):
+    """Drop the request's session from the cache (e.g. on logout)"""
+    raw = handler.get_cookie("user")
+    if raw:
+        get_session_cache().invalidate(raw)
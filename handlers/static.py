@@ -0,0 +1,152 @@
+"""Static files: gzip variants built ahead of time, served by content hash
+
+build_static() writes a .gz next to every compressible file under
+static/ (at startup in production, or with `python -m handlers.static`).
+PrecompressedStaticFileHandler serves that variant to clients that
+accept gzip, and marks URLs carrying the file's current content hash
+(static_url()'s ?v=) as immutable.
+"""
+import argparse
+import gzip
+import mimetypes
+import os
+import sys
+
+import tornado.web
+
+COMPRESSIBLE = (".css", ".js", ".svg", ".json", ".txt", ".html", ".map")
+
+def _is_compressible(path):
+    return path.endswith(COMPRESSIBLE)
+
+def build_static(static_path):
+    """Write (or refresh) the .gz variant of every compressible static file
+
+    Variants that would not be smaller are removed instead. Returns
+    counts and byte totals for a report.
+    """
+    report = {"files": 0, "compressed": 0, "bytes": 0, "gzip_bytes": 0}
+    for dirpath, _, filenames in os.walk(static_path):
+        for filename in sorted(filenames):
+            path = os.path.join(dirpath, filename)
+            if not _is_compressible(path):
+                continue
+            report["files"] += 1
+            compressed_path = path + ".gz"
+            with open(path, "rb") as f:
+                content = f.read()
+            report["bytes"] += len(content)
+
+            # mtime=0 keeps the output (and its ETag) identical across builds
+            compressed = gzip.compress(content, compresslevel=9, mtime=0)
+            if len(compressed) >= len(content):
+                if os.path.exists(compressed_path):
+                    os.remove(compressed_path)
+                report["gzip_bytes"] += len(content)
+                continue
+
+            try:
+                with open(compressed_path, "rb") as f:
+                    unchanged = f.read() == compressed
+            except OSError:
+                unchanged = False
+            if not unchanged:
+                # Write then rename, so a request never sees a partial file
+                with open(compressed_path + ".tmp", "wb") as f:
+                    f.write(compressed)
+                os.replace(compressed_path + ".tmp", compressed_path)
+            else:
+                # Keep it newer than its source, or the handler ignores it
+                os.utime(compressed_path)
+            report["compressed"] += 1
+            report["gzip_bytes"] += len(compressed)
+    return report
+
+def static_files(static_path):
+    """Paths of the static files (not their .gz variants), relative to static_path"""
+    for dirpath, _, filenames in os.walk(static_path):
+        for filename in sorted(filenames):
+            if filename.endswith(".gz"):
+                continue
+            path = os.path.join(dirpath, filename)
+            yield os.path.relpath(path, static_path).replace(os.sep, "/")
+
+
+class PrecompressedStaticFileHandler(tornado.web.StaticFileHandler):
+    """StaticFileHandler that serves prebuilt .gz variants and immutable hashed URLs"""
+
+    source_path = None
+    content_encoding = None
+    immutable = False
+
+    def validate_absolute_path(self, root, absolute_path):
+        absolute_path = super().validate_absolute_path(root, absolute_path)
+        self.source_path = absolute_path
+        self.content_encoding = None
+        if absolute_path is None or not _is_compressible(absolute_path):
+            return absolute_path
+        if not self._accepts_gzip():
+            return absolute_path
+
+        try:
+            compressed_stat = os.stat(absolute_path + ".gz")
+        except OSError:
+            return absolute_path
+        # A variant older than its source is left over from before an edit
+        if compressed_stat.st_mtime < os.stat(absolute_path).st_mtime:
+            return absolute_path
+
+        self._stat_result = compressed_stat
+        self.content_encoding = "gzip"
+        return absolute_path + ".gz"
+
+    def _accepts_gzip(self):
+        for coding in self.request.headers.get("Accept-Encoding", "").split(","):
+            name, _, params = coding.partition(";")
+            if name.strip().lower() not in ("gzip", "*"):
+                continue
+            params = params.strip().replace(" ", "")
+            if params.startswith("q="):
+                try:
+                    return float(params[2:]) > 0
+                except ValueError:
+                    return False
+            return True
+        return False
+
+    def get_content_type(self):
+        # The type of the file itself, not of its .gz variant
+        mime_type, _ = mimetypes.guess_type(self.source_path)
+        return mime_type or "application/octet-stream"
+
+    def get_cache_time(self, path, modified, mime_type):
+        # Only a URL naming the current content can be cached forever;
+        # pages still linking an older ?v= get the new file, uncached
+        version = self.get_argument("v", None)
+        self.immutable = version is not None and version == self.get_version(self.settings, path)
+        return self.CACHE_MAX_AGE if self.immutable else 0
+
+    def set_extra_headers(self, path):
+        if self.content_encoding:
+            self.set_header("Content-Encoding", self.content_encoding)
+        if _is_compressible(self.source_path):
+            self.add_header("Vary", "Accept-Encoding")
+        if self.immutable:
+            self.set_header("Cache-Control", f"public, max-age={self.CACHE_MAX_AGE}, immutable")
+
+
+def main(argv=None):
+    parser = argparse.ArgumentParser(prog="python -m handlers.static",
+                                     description="Build gzip variants of static files")
+    parser.add_argument("--static-path",
+                        default=os.path.join(os.path.dirname(__file__), "..", "static"))
+    args = parser.parse_args(argv)
+
+    report = build_static(args.static_path)
+    print(f"Compressed {report['compressed']} of {report['files']} file(s): "
+          f"{report['bytes']} -> {report['gzip_bytes']} bytes")
+    return 0
+
+
+if __name__ == "__main__":
+    sys.exit(main())
@@ -1,59 +1,136 @@
 import tornado.websocket
 import json
-from models.db import get_votes_by_event
+import os
+from handlers.fanout import Debouncer, get_fanout
+from models.async_db import get_vote_snapshot
+
+_vote_debouncer = None
+
+def get_vote_debouncer():
+    """Get the process-wide debouncer of vote broadcasts, creating it on first use"""
+    global _vote_debouncer
+    if _vote_debouncer is None:
+        _vote_debouncer = Debouncer(
+            _broadcast_votes,
+            window=float(os.environ.get('WS_BROADCAST_WINDOW_MS', 50)) / 1000,
+            max_delay=float(os.environ.get('WS_BROADCAST_MAX_DELAY_MS', 250)) / 1000,
+        )
+    return _vote_debouncer
+
+def get_vote_debouncer_stats():
+    return get_vote_debouncer().stats()
+
+def vote_messages(deltas):
+    """Merge vote deltas into one message per run of consecutive seqs
+
+    A run of one vote stays a vote_delta. A longer run becomes a
+    vote_batch covering from_seq..to_seq, with each voter's last change
+    per slot and every changed slot's latest vote count. Runs are split
+    where a seq is missing (a comment, or a vote made in another
+    process), so clients still see the gap.
+    """
+    runs = []
+    for delta in sorted(deltas, key=lambda delta: delta["seq"]):
+        if runs and delta["seq"] == runs[-1][-1]["seq"] + 1:
+            runs[-1].append(delta)
+        else:
+            runs.append([delta])
+
+    messages = []
+    for run in runs:
+        if len(run) == 1:
+            messages.append(run[0])
+            continue
+        latest = {}
+        counts = {}
+        for delta in run:
+            key = (str(delta["slot_id"]), delta["user"]["id"])
+            # Re-inserted, so voters keep the order of their last change
+            latest.pop(key, None)
+            latest[key] = {"slot_id": delta["slot_id"], "op": delta["op"], "user": delta["user"]}
+            counts[str(delta["slot_id"])] = delta["vote_count"]
+        messages.append({
+            "type": "vote_batch",
+            "from_seq": run[0]["seq"],
+            "to_seq": run[-1]["seq"],
+            "votes": list(latest.values()),
+            "counts": counts,
+        })
+    return messages
+
+def _broadcast_votes(event_id, deltas):
+    fanout = get_fanout()
+    for message in vote_messages(deltas):
+        fanout.broadcast(event_id, message)
 
 class VoteWebSocketHandler(tornado.websocket.WebSocketHandler):
-    clients = {}  # event_id -> set of websocket connections
-    
+    """Live vote changes for the viewers of an event
+
+    Each vote is pushed as a vote_delta carrying its event version as
+    seq, or, when votes come in a burst, as part of a vote_batch covering
+    a range of seqs. A client that sees a gap in seq catches up from
+    /event/<id>/changes, or sends {"type": "snapshot"} to get the whole
+    vote state back as a vote_snapshot. Messages go out through the
+    fan-out's bounded per-connection queues (see handlers.fanout).
+    """
+
     def open(self, event_id):
         self.event_id = event_id
-        if event_id not in self.clients:
-            self.clients[event_id] = set()
-        self.clients[event_id].add(self)
+        get_fanout().add(event_id, self)
         print(f"WebSocket opened for event {event_id}")
-    
+
     def on_close(self):
-        if self.event_id in self.clients:
-            self.clients[self.event_id].discard(self)
-            if not self.clients[self.event_id]:
-                del self.clients[self.event_id]
+        get_fanout().remove(self.event_id, self)
         print(f"WebSocket closed for event {self.event_id}")
-    
-    def on_message(self, message):
-        # Handle incoming messages if needed
-        pass
-    
+
+    async def on_message(self, message):
+        # Tornado waits for this to finish before reading the next message,
+        # so a client can't have more than one snapshot loading at a time
+        try:
+            request = json.loads(message)
+        except ValueError:
+            return
+        if isinstance(request, dict) and request.get("type") == "snapshot":
+            await self.send_snapshot()
+
+    async def send_snapshot(self):
+        """Send this client the event's current votes, tallies and version"""
+        snapshot = await get_vote_snapshot(self.event_id)
+        tallies = snapshot["tallies"]
+        # Queued behind the deltas already on their way to this client; a
+        # newer snapshot replaces one that is still waiting
+        get_fanout().send(self.event_id, self, {
+            "type": "vote_snapshot",
+            "version": snapshot["version"],
+            "counts": tallies["counts"],
+            "leading_slot_id": tallies["leading_slot_id"],
+            "participant_count": tallies["participant_count"],
+            "voters_by_slot": snapshot["voters_by_slot"],
+        }, key="snapshot")
+
     @classmethod
-    def broadcast_vote_update(cls, event_id):
-        """Broadcast vote updates to all clients watching this event"""
-        if event_id not in cls.clients:
+    def broadcast_vote_delta(cls, event_id, seq, slot_id, op, user, vote_count):
+        """Broadcast one vote ("vote") or unvote ("unvote") to the event's viewers
+
+        seq is the event version the vote produced. Everything in the
+        message comes from the vote itself, so nothing is queried and its
+        size doesn't grow with the number of voters. Votes arriving in a
+        burst are sent together (see vote_messages).
+        """
+        if not get_fanout().viewers(event_id):
             return
-        
-        # Get current vote counts
-        votes = get_votes_by_event(event_id)
-        votes_by_slot = {}
-        
-        for vote in votes:
-            slot_id = vote["time_slot_id"]
-            if slot_id not in votes_by_slot:
-                votes_by_slot[slot_id] = []
-            votes_by_slot[slot_id].append({
-                "username": vote["username"],
-                "avatar_url": vote["avatar_url"]
-            })
-        
-        message = {
-            "type": "vote_update",
-            "votes_by_slot": votes_by_slot
-        }
-        
-        # Send to all connected clients for this event
-        for client in cls.clients[event_id].copy():
-            try:
-                client.write_message(json.dumps(message))
-            except Exception as e:
-                print(f"Error sending message to client: {e}")
-                cls.clients[event_id].discard(client)
-    
+        get_vote_debouncer().add(event_id, {
+            "type": "vote_delta",
+            "seq": seq,
+            "slot_id": slot_id,
+            "op": op,
+            "user": {
+                "id": user["id"],
+                "username": user["username"],
+                "avatar_url": user["avatar_url"],
+            },
+            "vote_count": vote_count,
+        })
+
     def check_origin(self, origin):
         return True  # Allow all origins for now
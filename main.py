@@ -1,16 +1,46 @@
 
 import os
+import time
 import tornado.ioloop
 import tornado.web
 import tornado.httpserver
 import tornado.log
-from auth import LoginHandler, GitHubAuthHandler, LogoutHandler
-from events import (
-    DashboardHandler, EventCreateHandler, EventViewHandler,
-    EventVoteHandler, EventEditHandler, ContactHandler
+import tornado.template
+from handlers.auth import LoginHandler, GitHubAuthHandler, LogoutHandler
+from handlers.events import (
+    DashboardHandler, DashboardEventsHandler, EventCreateHandler, EventViewHandler,
+    EventJSONHandler, EventChangesHandler, EventVoteHandler, EventEditHandler
 )
-from info import AboutHandler, PrivacyHandler, SupportHandler
-from websocket import VoteWebSocketHandler
+from handlers.images import Picture
+from handlers.static import PrecompressedStaticFileHandler, build_static, static_files
+from handlers.info import AboutHandler, PrivacyHandler, SupportHandler, ContactHandler
+from handlers.websocket import VoteWebSocketHandler
+from models import db
+
+SETTINGS_PROFILES = {
+    # Autoreload, templates re-read on every render, tracebacks in error pages
+    "development": {
+        "debug": True,
+    },
+    # Templates compiled and static file hashes computed once, at startup
+    "production": {
+        "debug": False,
+        "autoreload": False,
+        "serve_traceback": False,
+        "compiled_template_cache": True,
+        "static_hash_cache": True,
+    },
+}
+
+def get_settings_profile():
+    """Get the Tornado settings for the EVENTSTACK_ENV profile"""
+    name = os.environ.get("EVENTSTACK_ENV", "development")
+    if name not in SETTINGS_PROFILES:
+        raise ValueError(
+            f"Unknown EVENTSTACK_ENV {name!r}, "
+            f"expected one of {', '.join(SETTINGS_PROFILES)}"
+        )
+    return dict(SETTINGS_PROFILES[name])
 
 def make_app():
     settings = {
@@ -18,9 +48,15 @@ def make_app():
         "login_url": "/login",
         "template_path": os.path.join(os.path.dirname(__file__), "templates"),
         "static_path": os.path.join(os.path.dirname(__file__), "static"),
+        "static_handler_class": PrecompressedStaticFileHandler,
+        "ui_modules": {"Picture": Picture},
         "xsrf_cookies": True,
-        "debug": True,
     }
+    settings.update(get_settings_profile())
+    if settings.get("compiled_template_cache", not settings.get("debug")):
+        # One shared loader, so templates compiled by warm_up() are the
+        # ones handlers render
+        settings["template_loader"] = tornado.template.Loader(settings["template_path"])
 
     return tornado.web.Application([
         (r"/", LoginHandler),
@@ -28,8 +64,11 @@ def make_app():
         (r"/logout", LogoutHandler),
         (r"/complete/github", GitHubAuthHandler),
         (r"/dashboard", DashboardHandler),
+        (r"/dashboard/(created|participated)", DashboardEventsHandler),
         (r"/create", EventCreateHandler),
         (r"/event/([a-zA-Z0-9\-]+)", EventViewHandler),
+        (r"/event/([a-zA-Z0-9\-]+)\.json", EventJSONHandler),
+        (r"/event/([a-zA-Z0-9\-]+)/changes", EventChangesHandler),
         (r"/vote", EventVoteHandler),
         (r"/event/([a-zA-Z0-9\-]+)/edit", EventEditHandler),
 
@@ -45,9 +84,67 @@ def make_app():
         (r"/ws/vote/([a-zA-Z0-9\-]+)", VoteWebSocketHandler),
     ], **settings)
 
+def _files(root):
+    for dirpath, _, filenames in os.walk(root):
+        for filename in sorted(filenames):
+            yield os.path.relpath(os.path.join(dirpath, filename), root).replace(os.sep, "/")
+
+def warm_up(app):
+    """Do the work first requests would otherwise pay for
+
+    Creates/migrates the schema, opens the database pool and, when the
+    app caches them, compiles every template and hashes every static
+    file (building its gzip variant first). Returns a list of
+    (step, seconds, detail) for the report.
+    """
+    report = []
+
+    def step(name, fn):
+        started = time.perf_counter()
+        detail = fn()
+        report.append((name, time.perf_counter() - started, detail))
+
+    step("database schema", lambda: db.init_db() or "ready")
+    step("connection pool", lambda: f"{db.get_pool().warm()} opened")
+
+    loader = app.settings.get("template_loader")
+    if loader is not None:
+        # A template that doesn't compile fails the startup, not a request
+        def compile_templates():
+            names = list(_files(app.settings["template_path"]))
+            for name in names:
+                loader.load(name)
+            return f"{len(names)} compiled"
+        step("templates", compile_templates)
+
+    if app.settings.get("static_hash_cache", True) and not app.settings.get("debug"):
+        def compress_static_files():
+            built = build_static(app.settings["static_path"])
+            return (f"{built['compressed']} gzipped, "
+                    f"{built['bytes']} -> {built['gzip_bytes']} bytes")
+        step("static gzip", compress_static_files)
+
+        def hash_static_files():
+            paths = list(static_files(app.settings["static_path"]))
+            for path in paths:
+                PrecompressedStaticFileHandler.get_version(app.settings, path)
+            return f"{len(paths)} hashed"
+        step("static hashes", hash_static_files)
+
+    return report
+
 if __name__ == "__main__":
     port = int(os.environ.get("PORT", 8888))
+    started = time.perf_counter()
     app = make_app()
+    report = warm_up(app)
+
+    print(f"Startup ({os.environ.get('EVENTSTACK_ENV', 'development')}):")
+    for name, seconds, detail in report:
+        print(f"  {name:<16} {seconds * 1000:8.1f} ms  {detail}")
+    print(f"  {'total':<16} {(time.perf_counter() - started) * 1000:8.1f} ms")
+
+    # Only listen once warm-up is done, so no request waits on it
     server = tornado.httpserver.HTTPServer(app)
     server.listen(port)
     print(f"Server running at http://localhost:{port}")
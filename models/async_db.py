@@ -0,0 +1,161 @@
+"""Async facade over models.db
+
+Every public function of models.db is available here as a coroutine that
+runs the blocking call on a bounded thread pool, so a slow query or fsync
+never stalls the IOLoop:
+
+    from models.async_db import get_event_by_id
+    event = await get_event_by_id(event_id)
+
+vote_for_slot goes through the group-commit writer instead when that is
+enabled (see models.group_commit).
+"""
+import asyncio
+import functools
+import os
+import threading
+import time
+from concurrent.futures import ThreadPoolExecutor
+
+import tornado.ioloop
+import tornado.locks
+from tornado.log import app_log
+
+from models import db, group_commit
+
+
+class DBExecutor:
+    """Thread pool with a bounded number of admitted calls and usage stats"""
+
+    def __init__(self, workers=4, max_pending=64, slow_seconds=0.5):
+        self.workers = workers
+        self.max_pending = max_pending
+        self.slow_seconds = slow_seconds
+        self._executor = ThreadPoolExecutor(max_workers=workers, thread_name_prefix="db")
+        self._admission = tornado.locks.Semaphore(max_pending)
+        self._lock = threading.Lock()
+
+        # Stats
+        self.waiting = 0      # blocked on admission (more than max_pending in flight)
+        self.queued = 0       # admitted, waiting for a worker thread
+        self.running = 0
+        self.completed = 0
+        self.failed = 0
+        self.queue_time = 0.0
+        self.queue_time_max = 0.0
+        self.run_time = 0.0
+        self.run_time_max = 0.0
+
+    async def run(self, fn, *args, **kwargs):
+        """Run fn(*args, **kwargs) on a worker thread and return its result"""
+        enqueued = time.perf_counter()
+        with self._lock:
+            self.waiting += 1
+        await self._admission.acquire()
+        try:
+            with self._lock:
+                self.waiting -= 1
+                self.queued += 1
+            call = functools.partial(self._call, enqueued, fn, args, kwargs)
+            return await tornado.ioloop.IOLoop.current().run_in_executor(self._executor, call)
+        finally:
+            self._admission.release()
+
+    def _call(self, enqueued, fn, args, kwargs):
+        started = time.perf_counter()
+        queue_time = started - enqueued
+        with self._lock:
+            self.queued -= 1
+            self.running += 1
+            self.queue_time += queue_time
+            self.queue_time_max = max(self.queue_time_max, queue_time)
+
+        failed = False
+        try:
+            return fn(*args, **kwargs)
+        except Exception:
+            failed = True
+            raise
+        finally:
+            run_time = time.perf_counter() - started
+            with self._lock:
+                self.running -= 1
+                self.completed += 1
+                self.failed += failed
+                self.run_time += run_time
+                self.run_time_max = max(self.run_time_max, run_time)
+            if queue_time + run_time > self.slow_seconds:
+                app_log.warning(
+                    "Slow database call %s: queued %.1fms, ran %.1fms",
+                    getattr(fn, "__name__", fn), queue_time * 1000, run_time * 1000,
+                )
+
+    def stats(self):
+        """Snapshot of queue depth and latency counters"""
+        with self._lock:
+            completed = self.completed or 1
+            return {
+                "workers": self.workers,
+                "max_pending": self.max_pending,
+                "queue_depth": self.waiting + self.queued,
+                "waiting": self.waiting,
+                "queued": self.queued,
+                "running": self.running,
+                "completed": self.completed,
+                "failed": self.failed,
+                "queue_time_avg": self.queue_time / completed,
+                "queue_time_max": self.queue_time_max,
+                "run_time_avg": self.run_time / completed,
+                "run_time_max": self.run_time_max,
+            }
+
+    def shutdown(self, wait=True):
+        self._executor.shutdown(wait=wait)
+
+
+_executor = None
+_executor_lock = threading.Lock()
+_wrappers = {}
+
+def get_executor():
+    """Get the process-wide database executor, creating it on first use"""
+    global _executor
+    if _executor is None:
+        with _executor_lock:
+            if _executor is None:
+                _executor = DBExecutor(
+                    workers=int(os.environ.get('DB_EXECUTOR_WORKERS', 4)),
+                    max_pending=int(os.environ.get('DB_EXECUTOR_MAX_PENDING', 64)),
+                    slow_seconds=float(os.environ.get('DB_EXECUTOR_SLOW_SECONDS', 0.5)),
+                )
+    return _executor
+
+def get_executor_stats():
+    return get_executor().stats()
+
+async def run(fn, *args, **kwargs):
+    """Run any blocking database callable on the executor"""
+    return await get_executor().run(fn, *args, **kwargs)
+
+async def vote_for_slot(event_id, slot_id, user_id, is_vote=True):
+    """Vote for or unvote a time slot, batched with other votes if enabled"""
+    writer = group_commit.get_writer()
+    if writer is None:
+        return await get_executor().run(db.vote_for_slot, event_id, slot_id, user_id, is_vote)
+    return await asyncio.wrap_future(writer.submit(event_id, slot_id, user_id, is_vote))
+
+def __getattr__(name):
+    # Lazily wrap models.db functions, e.g. async_db.get_event_by_id
+    if name.startswith("_"):
+        raise AttributeError(name)
+    if name not in _wrappers:
+        fn = getattr(db, name, None)
+        if not callable(fn) or getattr(fn, "__module__", None) != db.__name__:
+            raise AttributeError(f"module {__name__!r} has no attribute {name!r}")
+
+        @functools.wraps(fn)
+        async def wrapper(*args, **kwargs):
+            return await get_executor().run(fn, *args, **kwargs)
+
+        _wrappers[name] = wrapper
+    return _wrappers[name]
@@ -0,0 +1,136 @@
+import sys
+import threading
+import time
+from collections import OrderedDict
+
+
+def approx_size(value):
+    """Rough memory footprint of a row dict (or any flat value) in bytes"""
+    size = sys.getsizeof(value)
+    if isinstance(value, dict):
+        for key, item in value.items():
+            size += sys.getsizeof(key) + sys.getsizeof(item)
+    return size
+
+
+class LRUCache:
+    """Thread-safe LRU cache with a memory budget and a per-entry TTL
+
+    Entries are evicted least recently used first once their approximate
+    total size exceeds ``max_bytes``, and are treated as missing ``ttl``
+    seconds after being stored.
+
+    get_or_load() fills the cache from a loader. A load that was running
+    while the cache was invalidated is returned to its caller but not
+    stored, so a fill can never put back a row older than a write that
+    already finished invalidating it.
+    """
+
+    def __init__(self, max_bytes=4 * 1024 * 1024, ttl=60.0, sizeof=approx_size):
+        self.max_bytes = max_bytes
+        self.ttl = ttl
+        self._sizeof = sizeof
+        self._entries = OrderedDict()  # key -> (value, size, expires)
+        self._bytes = 0
+        self._generation = 0
+        self._lock = threading.Lock()
+
+        # Stats
+        self.hits = 0
+        self.misses = 0
+        self.evictions = 0
+        self.expirations = 0
+        self.invalidations = 0
+
+    def get(self, key, default=None):
+        with self._lock:
+            entry = self._entries.get(key)
+            if entry is None:
+                self.misses += 1
+                return default
+            value, size, expires = entry
+            if expires < time.monotonic():
+                self._remove(key)
+                self.expirations += 1
+                self.misses += 1
+                return default
+            self._entries.move_to_end(key)
+            self.hits += 1
+            return value
+
+    def get_or_load(self, key, loader):
+        """Get key, calling loader() on a miss; None results aren't cached"""
+        value = self.get(key)
+        if value is not None:
+            return value
+
+        with self._lock:
+            generation = self._generation
+        value = loader()
+        if value is not None:
+            self._put(key, value, generation)
+        return value
+
+    def put(self, key, value, ttl=None):
+        """Store key; ttl, if given, shortens the entry's lifetime below self.ttl"""
+        self._put(key, value, None, ttl)
+
+    def _put(self, key, value, generation, ttl=None):
+        size = self._sizeof(value)
+        ttl = self.ttl if ttl is None else min(ttl, self.ttl)
+        with self._lock:
+            if generation is not None and generation != self._generation:
+                return
+            if size > self.max_bytes:
+                return
+            if key in self._entries:
+                self._remove(key)
+            self._entries[key] = (value, size, time.monotonic() + ttl)
+            self._bytes += size
+            while self._bytes > self.max_bytes:
+                oldest = next(iter(self._entries))
+                self._remove(oldest)
+                self.evictions += 1
+
+    def _remove(self, key):
+        _, size, _ = self._entries.pop(key)
+        self._bytes -= size
+
+    def invalidate(self, key):
+        """Drop key and discard any fill that is loading concurrently"""
+        with self._lock:
+            self._generation += 1
+            self.invalidations += 1
+            if key in self._entries:
+                self._remove(key)
+
+    def invalidate_matching(self, predicate):
+        """Drop every entry whose value matches predicate(value)"""
+        with self._lock:
+            self._generation += 1
+            self.invalidations += 1
+            for key in [k for k, (v, _, _) in self._entries.items() if predicate(v)]:
+                self._remove(key)
+
+    def clear(self):
+        with self._lock:
+            self._generation += 1
+            self._entries.clear()
+            self._bytes = 0
+
+    def stats(self):
+        """Snapshot of size and hit/miss/eviction counters"""
+        with self._lock:
+            lookups = self.hits + self.misses
+            return {
+                "entries": len(self._entries),
+                "bytes": self._bytes,
+                "max_bytes": self.max_bytes,
+                "ttl": self.ttl,
+                "hits": self.hits,
+                "misses": self.misses,
+                "hit_rate": self.hits / lookups if lookups else 0.0,
+                "evictions": self.evictions,
+                "expirations": self.expirations,
+                "invalidations": self.invalidations,
+            }
@@ -1,6 +1,12 @@
+import json
 import sqlite3
 import os
-from datetime import datetime
+import threading
+from datetime import datetime, timezone
+
+from models.cache import LRUCache
+from models.locations import location_json, parse_location
+from models.pool import ConnectionPool
 
 # Try to import and load dotenv, but continue without it if not available
 try:
@@ -9,266 +15,1241 @@ try:
 except ImportError:
     print("Warning: python-dotenv not available, using default environment variables")
 
+# PRAGMA profiles, selected with DATABASE_PRAGMA_PROFILE. journal_mode is
+# persistent and applied by init_db; the rest are per-connection and applied
+# once when a pooled connection is opened. Any single value can be overridden
+# with DATABASE_PRAGMA_<NAME>, e.g. DATABASE_PRAGMA_SYNCHRONOUS=FULL.
+PRAGMA_PROFILES = {
+    # SQLite's defaults: readers block behind writers
+    "rollback": {
+        "journal_mode": "DELETE",
+        "synchronous": "FULL",
+        "busy_timeout": 5000,
+        "cache_size": -2000,
+        "mmap_size": 0,
+        "temp_store": "DEFAULT",
+    },
+    # Readers never block on the writer; commits fsync only at checkpoints
+    "wal": {
+        "journal_mode": "WAL",
+        "synchronous": "NORMAL",
+        "busy_timeout": 5000,
+        "cache_size": -16000,
+        "mmap_size": 134217728,
+        "temp_store": "MEMORY",
+    },
+    # WAL concurrency, but every commit is fsynced
+    "wal-durable": {
+        "journal_mode": "WAL",
+        "synchronous": "FULL",
+        "busy_timeout": 5000,
+        "cache_size": -16000,
+        "mmap_size": 134217728,
+        "temp_store": "MEMORY",
+    },
+}
+
+DATABASE_PRAGMAS = ("journal_mode",)
+
+_pool = None
+_pool_url = None
+_pool_lock = threading.Lock()
+_event_cache = None
+_user_stats_cache = None
+
+def get_database_url():
+    """Get DATABASE_URL, falling back to a sqlite:/// URL for DATABASE_PATH"""
+    url = os.environ.get('DATABASE_URL')
+    if url:
+        return url
+    return 'sqlite:///' + os.environ.get('DATABASE_PATH', 'quickmeet.db')
+
+def is_postgres():
+    return get_database_url().startswith(('postgres://', 'postgresql://'))
+
+def get_db_path():
+    url = get_database_url()
+    if not url.startswith('sqlite:///'):
+        raise ValueError(f"Not a SQLite DATABASE_URL: {url!r}")
+    return url[len('sqlite:///'):]
+
+def get_pragma_profile():
+    """Get the PRAGMA settings for the configured profile"""
+    name = os.environ.get('DATABASE_PRAGMA_PROFILE', 'wal')
+    if name not in PRAGMA_PROFILES:
+        raise ValueError(
+            f"Unknown DATABASE_PRAGMA_PROFILE {name!r}, "
+            f"expected one of {', '.join(PRAGMA_PROFILES)}"
+        )
+    pragmas = dict(PRAGMA_PROFILES[name])
+    for pragma in pragmas:
+        override = os.environ.get(f'DATABASE_PRAGMA_{pragma.upper()}')
+        if override:
+            pragmas[pragma] = override
+    return pragmas
+
+def apply_pragmas(conn, pragmas):
+    for name, value in pragmas.items():
+        conn.execute(f"PRAGMA {name} = {value}")
+
 def get_db_connection():
-    db_path = os.environ.get('DATABASE_PATH', 'quickmeet.db')
-    conn = sqlite3.connect(db_path)
+    """Open a new connection with the per-connection setup applied"""
+    if is_postgres():
+        from models.postgres import PostgresConnection
+        import psycopg2
+        return PostgresConnection(psycopg2.connect(get_database_url()))
+
+    conn = sqlite3.connect(
+        get_db_path(),
+        check_same_thread=False,
+        cached_statements=int(os.environ.get('DATABASE_STATEMENT_CACHE', 128)),
+    )
     conn.row_factory = sqlite3.Row
+    pragmas = get_pragma_profile()
+    apply_pragmas(conn, {
+        name: value for name, value in pragmas.items()
+        if name not in DATABASE_PRAGMAS
+    })
     return conn
 
-def init_db():
-    """Initialize the database with required tables"""
-    conn = get_db_connection()
+def get_pool():
+    """Get the process-wide connection pool, creating it on first use"""
+    global _pool, _pool_url
+    url = get_database_url()
+    if _pool is None or _pool_url != url:
+        with _pool_lock:
+            if _pool is None or _pool_url != url:
+                if _pool is not None:
+                    _pool.close()
+                size = int(os.environ.get('DATABASE_POOL_SIZE', 5))
+                timeout = float(os.environ.get('DATABASE_POOL_TIMEOUT', 30))
+                if is_postgres():
+                    from models.postgres import PostgresPool
+                    _pool = PostgresPool(url, size=size, timeout=timeout)
+                else:
+                    _pool = ConnectionPool(get_db_connection, size=size, timeout=timeout)
+                _pool_url = url
+    return _pool
+
+def close_pool():
+    """Close all pooled connections (e.g. on shutdown or in tests)"""
+    global _pool, _pool_url
+    with _pool_lock:
+        if _pool is not None:
+            _pool.close()
+        _pool = None
+        _pool_url = None
+
+def get_pool_stats():
+    """Get checkout/wait counters for the connection pool"""
+    return get_pool().stats()
+
+def get_event_cache():
+    """Get the process-wide event row cache, creating it on first use"""
+    global _event_cache
+    if _event_cache is None:
+        with _pool_lock:
+            if _event_cache is None:
+                _event_cache = LRUCache(
+                    max_bytes=int(os.environ.get('EVENT_CACHE_BYTES', 4 * 1024 * 1024)),
+                    ttl=float(os.environ.get('EVENT_CACHE_TTL', 60)),
+                )
+    return _event_cache
+
+def get_event_cache_stats():
+    return get_event_cache().stats()
+
+def get_user_stats_cache():
+    """Get the process-wide per-user dashboard counter cache"""
+    global _user_stats_cache
+    if _user_stats_cache is None:
+        with _pool_lock:
+            if _user_stats_cache is None:
+                _user_stats_cache = LRUCache(
+                    max_bytes=int(os.environ.get('USER_STATS_CACHE_BYTES', 1024 * 1024)),
+                    ttl=float(os.environ.get('USER_STATS_CACHE_TTL', 60)),
+                )
+    return _user_stats_cache
+
+def get_user_stats_cache_stats():
+    return get_user_stats_cache().stats()
+
+def db_connection():
+    """Borrow a pooled connection for the duration of a with block"""
+    return get_pool().connection()
+
+def _begin_write(cursor):
+    """Start a write transaction, taking SQLite's write lock up front"""
+    if not is_postgres():
+        # psycopg2 opens the transaction implicitly
+        cursor.execute("BEGIN IMMEDIATE")
+
+def _begin_read(cursor):
+    """Start a read transaction that sees one consistent snapshot"""
+    if is_postgres():
+        # psycopg2 opens the transaction implicitly; this must come first in it
+        cursor.execute("SET TRANSACTION ISOLATION LEVEL REPEATABLE READ, READ ONLY")
+    else:
+        cursor.execute("BEGIN")
+
+def slot_timestamp(slot_datetime):
+    """Convert a slot's datetime text to a UTC epoch, or None if unparseable
+
+    Slots come from datetime-local inputs ("2025-07-01T14:30") and carry no
+    timezone, so naive values are taken as UTC.
+    """
+    if isinstance(slot_datetime, datetime):
+        value = slot_datetime
+    else:
+        try:
+            value = datetime.fromisoformat(str(slot_datetime).strip())
+        except ValueError:
+            return None
+    if value.tzinfo is None:
+        value = value.replace(tzinfo=timezone.utc)
+    return int(value.timestamp())
+
+def _backfill_slot_timestamps(conn):
+    """Fill slot_ts for time slots created before the column existed"""
+    cursor = conn.cursor()
+    cursor.execute("SELECT id, slot_datetime FROM time_slots WHERE slot_ts IS NULL")
+    updates = []
+    for slot in cursor.fetchall():
+        ts = slot_timestamp(slot["slot_datetime"])
+        if ts is not None:
+            updates.append((ts, slot["id"]))
+    if updates:
+        cursor.executemany("UPDATE time_slots SET slot_ts = ? WHERE id = ?", updates)
+    conn.commit()
+    cursor.close()
+
+def _backfill_tallies(conn):
+    """Build tallies for databases that had votes before the tally tables"""
+    cursor = conn.cursor()
+    cursor.execute("SELECT 1 AS found FROM event_tallies LIMIT 1")
+    has_tallies = cursor.fetchone() is not None
+    cursor.execute("SELECT 1 AS found FROM votes LIMIT 1")
+    has_votes = cursor.fetchone() is not None
+    conn.commit()
+    cursor.close()
+    if has_votes and not has_tallies:
+        rebuild_tallies()
+
+def _backfill_locations(conn):
+    """Parse locations of events stored before the location_data column"""
     cursor = conn.cursor()
-    
-    # Read schema from file
-    with open(os.path.join(os.path.dirname(__file__), 'schema.sql'), 'r') as f:
-        schema = f.read()
-    
-    # Execute schema script
-    conn.executescript(schema)
-    
-    # Migration for max_applicants
-    cursor.execute("PRAGMA table_info(events)")
-    columns = [col[1] for col in cursor.fetchall()]
-    if 'max_applicants' not in columns:
-        cursor.execute("ALTER TABLE events ADD COLUMN max_applicants INTEGER DEFAULT NULL")
+    cursor.execute("""
+        SELECT id, location FROM events
+        WHERE location_data IS NULL AND location IS NOT NULL
+    """)
+    # Blank locations legitimately stay NULL
+    event_ids = [row["id"] for row in cursor.fetchall() if parse_location(row["location"])]
     conn.commit()
-    
+    cursor.close()
+    if event_ids:
+        reparse_locations(event_ids)
+
+def reparse_locations(event_ids=None):
+    """Recompute location_data from location (given events, or all)
+
+    Returns the number of events updated.
+    """
+    with db_connection() as conn:
+        cursor = conn.cursor()
+        if event_ids is None:
+            event_ids = _all_event_ids(cursor)
+            conn.commit()
+        for start in range(0, len(event_ids), 500):
+            _begin_write(cursor)
+            for event_id in event_ids[start:start + 500]:
+                cursor.execute("SELECT location FROM events WHERE id = ?", (event_id,))
+                row = cursor.fetchone()
+                if row is None:
+                    continue
+                cursor.execute("""
+                    UPDATE events SET location_data = ? WHERE id = ?
+                """, (location_json(row["location"]), event_id))
+            conn.commit()
+        cursor.close()
+    get_event_cache().clear()
+    return len(event_ids)
+
+def _backfill_user_stats(conn):
+    """Build user_stats for databases that had events before the table"""
+    cursor = conn.cursor()
+    cursor.execute("SELECT 1 AS found FROM user_stats LIMIT 1")
+    has_stats = cursor.fetchone() is not None
+    cursor.execute("SELECT 1 AS found FROM events LIMIT 1")
+    has_events = cursor.fetchone() is not None
     conn.commit()
     cursor.close()
-    conn.close()
+    if has_events and not has_stats:
+        rebuild_user_stats()
+
+def init_db():
+    """Initialize the database with required tables"""
+    if is_postgres():
+        with db_connection() as conn:
+            with open(os.path.join(os.path.dirname(__file__), 'schema_postgres.sql'), 'r') as f:
+                conn.executescript(f.read())
+            _backfill_slot_timestamps(conn)
+            _backfill_tallies(conn)
+            _backfill_user_stats(conn)
+            _backfill_locations(conn)
+        return
+
+    with db_connection() as conn:
+        cursor = conn.cursor()
+
+        # Database-wide settings (e.g. WAL) persist in the file itself
+        pragmas = get_pragma_profile()
+        apply_pragmas(conn, {
+            name: value for name, value in pragmas.items()
+            if name in DATABASE_PRAGMAS
+        })
+
+        # Read schema from file
+        with open(os.path.join(os.path.dirname(__file__), 'schema.sql'), 'r') as f:
+            schema = f.read()
+
+        # Execute schema script
+        conn.executescript(schema)
+
+        # Migration for max_applicants
+        cursor.execute("PRAGMA table_info(events)")
+        columns = [col[1] for col in cursor.fetchall()]
+        if 'max_applicants' not in columns:
+            cursor.execute("ALTER TABLE events ADD COLUMN max_applicants INTEGER DEFAULT NULL")
+
+        # Migration for location_data (parsed location, see models.locations)
+        if 'location_data' not in columns:
+            cursor.execute("ALTER TABLE events ADD COLUMN location_data TEXT DEFAULT NULL")
+
+        # Migration for slot_ts (UTC epoch of slot_datetime)
+        cursor.execute("PRAGMA table_info(time_slots)")
+        columns = [col[1] for col in cursor.fetchall()]
+        if 'slot_ts' not in columns:
+            cursor.execute("ALTER TABLE time_slots ADD COLUMN slot_ts INTEGER DEFAULT NULL")
+
+        # Indexes on migrated columns, created once the columns exist
+        cursor.execute("CREATE INDEX IF NOT EXISTS idx_time_slots_event_ts ON time_slots (event_id, slot_ts)")
+        conn.commit()
+        cursor.close()
+
+        _backfill_slot_timestamps(conn)
+        _backfill_tallies(conn)
+        _backfill_user_stats(conn)
+        _backfill_locations(conn)
 
 def create_user(github_id, username, email, avatar_url):
     """Create or update a user"""
-    conn = get_db_connection()
-    cursor = conn.cursor()
-    
-    # Check if user exists
-    cursor.execute("SELECT * FROM users WHERE github_id = ?", (github_id,))
-    existing_user = cursor.fetchone()
-    
-    if existing_user:
-        # Update existing user
-        cursor.execute("""
-            UPDATE users 
-            SET username = ?, email = ?, avatar_url = ?, updated_at = CURRENT_TIMESTAMP
-            WHERE github_id = ?
-        """, (username, email, avatar_url, github_id))
-        user_id = existing_user["id"]
-    else:
-        # Create new user
+    with db_connection() as conn:
+        cursor = conn.cursor()
+
+        # Single-statement upsert, returning the stored row
         cursor.execute("""
             INSERT INTO users (github_id, username, email, avatar_url)
             VALUES (?, ?, ?, ?)
+            ON CONFLICT (github_id) DO UPDATE
+            SET username = excluded.username, email = excluded.email,
+                avatar_url = excluded.avatar_url, updated_at = CURRENT_TIMESTAMP
+            RETURNING *
         """, (github_id, username, email, avatar_url))
-        user_id = cursor.lastrowid
-    
-    conn.commit()
-    
-    # Return user data
-    if user_id:
-        cursor.execute("SELECT * FROM users WHERE id = ?", (user_id,))
         user = cursor.fetchone()
+        conn.commit()
         cursor.close()
-        conn.close()
-        return dict(user) if user else None
-    else:
-        cursor.close()
-        conn.close()
-        return None
+
+    # Cached events carry their creator's username and avatar
+    if user:
+        get_event_cache().invalidate_matching(lambda event: event["created_by"] == user["id"])
+    return dict(user) if user else None
 
 def get_user_by_github_id(github_id):
     """Get user by GitHub ID"""
-    conn = get_db_connection()
-    cursor = conn.cursor()
-    cursor.execute("SELECT * FROM users WHERE github_id = ?", (github_id,))
-    user = cursor.fetchone()
-    cursor.close()
-    conn.close()
-    return dict(user) if user else None
+    with db_connection() as conn:
+        cursor = conn.cursor()
+        cursor.execute("SELECT * FROM users WHERE github_id = ?", (github_id,))
+        user = cursor.fetchone()
+        cursor.close()
+        return dict(user) if user else None
 
 def create_event(event_id, title, description, location, created_by, max_applicants=None):
     """Create a new event"""
-    conn = get_db_connection()
-    cursor = conn.cursor()
-    cursor.execute("""
-        INSERT INTO events (id, title, description, location, max_applicants, created_by)
-        VALUES (?, ?, ?, ?, ?, ?)
-    """, (event_id, title, description, location, max_applicants, created_by))
-    conn.commit()
-    cursor.close()
-    conn.close()
+    with db_connection() as conn:
+        cursor = conn.cursor()
+        cursor.execute("""
+            INSERT INTO events (id, title, description, location, location_data,
+                                max_applicants, created_by)
+            VALUES (?, ?, ?, ?, ?, ?, ?)
+        """, (event_id, title, description, location, location_json(location),
+              max_applicants, created_by))
+        _record_change(cursor, event_id, "create")
+        _adjust_user_stats(cursor, created_by, created=1)
+        conn.commit()
+        cursor.close()
+    get_user_stats_cache().invalidate(created_by)
     return get_event_by_id(event_id)
 
+def create_event_with_slots(event_id, title, description, location, created_by,
+                            slot_datetimes, max_applicants=None):
+    """Create an event and all of its time slots in a single transaction"""
+    with db_connection() as conn:
+        cursor = conn.cursor()
+        cursor.execute("""
+            INSERT INTO events (id, title, description, location, location_data,
+                                max_applicants, created_by)
+            VALUES (?, ?, ?, ?, ?, ?, ?)
+        """, (event_id, title, description, location, location_json(location),
+              max_applicants, created_by))
+        cursor.executemany("""
+            INSERT INTO time_slots (event_id, slot_datetime, slot_ts)
+            VALUES (?, ?, ?)
+        """, [
+            (event_id, slot_datetime, slot_timestamp(slot_datetime))
+            for slot_datetime in slot_datetimes
+        ])
+        _record_change(cursor, event_id, "create")
+        _adjust_user_stats(cursor, created_by, created=1)
+        conn.commit()
+        get_user_stats_cache().invalidate(created_by)
+
+        cursor.execute("""
+            SELECT e.*, u.username as creator_username, u.avatar_url as creator_avatar
+            FROM events e
+            JOIN users u ON e.created_by = u.id
+            WHERE e.id = ?
+        """, (event_id,))
+        event = cursor.fetchone()
+        cursor.close()
+        return _event_dict(event) if event else None
+
+def _event_dict(row):
+    """An events row as a dict, with location_data decoded"""
+    event = dict(row)
+    if event.get("location_data"):
+        event["location_data"] = json.loads(event["location_data"])
+    else:
+        # Rows written before location_data existed and not backfilled yet
+        event["location_data"] = parse_location(event.get("location"))
+    return event
+
 def get_event_by_id(event_id):
-    """Get event by ID"""
-    conn = get_db_connection()
-    cursor = conn.cursor()
-    cursor.execute("""
-        SELECT e.*, u.username as creator_username, u.avatar_url as creator_avatar
-        FROM events e
-        JOIN users u ON e.created_by = u.id
-        WHERE e.id = ?
-    """, (event_id,))
-    event = cursor.fetchone()
-    cursor.close()
-    conn.close()
+    """Get event by ID, served from the event cache when possible"""
+    event = get_event_cache().get_or_load(event_id, lambda: _load_event(event_id))
+    # Hand out a copy so callers can't modify the cached row
     return dict(event) if event else None
 
-def get_events_by_user(user_id, created_by=True):
-    """Get events created by or participated in by user"""
-    conn = get_db_connection()
-    cursor = conn.cursor()
-    
-    if created_by:
+def _load_event(event_id):
+    with db_connection() as conn:
+        cursor = conn.cursor()
         cursor.execute("""
-            SELECT e.*, u.username as creator_username
+            SELECT e.*, u.username as creator_username, u.avatar_url as creator_avatar
             FROM events e
             JOIN users u ON e.created_by = u.id
-            WHERE e.created_by = ?
-            ORDER BY e.created_at DESC
+            WHERE e.id = ?
+        """, (event_id,))
+        event = cursor.fetchone()
+        cursor.close()
+        return _event_dict(event) if event else None
+
+def get_events_by_user(user_id, created_by=True, limit=20, before=None):
+    """Get a page of events created by or participated in by user, newest first
+
+    Pages are keyed on (created_at, id): pass the pair from the last event
+    of the previous page as before to get the next one.
+    """
+    with db_connection() as conn:
+        cursor = conn.cursor()
+
+        if created_by and before is None:
+            cursor.execute("""
+                SELECT e.*, u.username as creator_username
+                FROM events e
+                JOIN users u ON e.created_by = u.id
+                WHERE e.created_by = ?
+                ORDER BY e.created_at DESC, e.id DESC
+                LIMIT ?
+            """, (user_id, limit))
+        elif created_by:
+            cursor.execute("""
+                SELECT e.*, u.username as creator_username
+                FROM events e
+                JOIN users u ON e.created_by = u.id
+                WHERE e.created_by = ? AND (e.created_at, e.id) < (?, ?)
+                ORDER BY e.created_at DESC, e.id DESC
+                LIMIT ?
+            """, (user_id, before[0], before[1], limit))
+        elif before is None:
+            # Walks idx_events_created_at_id newest first and probes
+            # idx_votes_user_event per event, stopping after limit rows
+            cursor.execute("""
+                SELECT e.*, u.username as creator_username
+                FROM events e
+                JOIN users u ON e.created_by = u.id
+                WHERE e.created_by != ?
+                  AND EXISTS (SELECT 1 FROM votes v WHERE v.user_id = ? AND v.event_id = e.id)
+                ORDER BY e.created_at DESC, e.id DESC
+                LIMIT ?
+            """, (user_id, user_id, limit))
+        else:
+            cursor.execute("""
+                SELECT e.*, u.username as creator_username
+                FROM events e
+                JOIN users u ON e.created_by = u.id
+                WHERE e.created_by != ?
+                  AND EXISTS (SELECT 1 FROM votes v WHERE v.user_id = ? AND v.event_id = e.id)
+                  AND (e.created_at, e.id) < (?, ?)
+                ORDER BY e.created_at DESC, e.id DESC
+                LIMIT ?
+            """, (user_id, user_id, before[0], before[1], limit))
+
+        events = cursor.fetchall()
+        cursor.close()
+        return [_event_dict(event) for event in events]
+
+def get_user_stats(user_id):
+    """Get a user's dashboard counters: created, finalized, pending, participated
+
+    Read from user_stats, which the write paths keep up to date, through
+    an in-process cache; participated leaves out the user's own events.
+    """
+    stats = get_user_stats_cache().get_or_load(user_id, lambda: _load_user_stats(user_id))
+    return dict(stats)
+
+def _load_user_stats(user_id):
+    with db_connection() as conn:
+        cursor = conn.cursor()
+        cursor.execute("""
+            SELECT created_count, finalized_count, participated_count
+            FROM user_stats
+            WHERE user_id = ?
         """, (user_id,))
-    else:
+        row = cursor.fetchone()
+        conn.commit()
+        cursor.close()
+
+    created = row["created_count"] if row else 0
+    finalized = row["finalized_count"] if row else 0
+    return {
+        "created": created,
+        "finalized": finalized,
+        "pending": created - finalized,
+        "participated": row["participated_count"] if row else 0,
+    }
+
+def _adjust_user_stats(cursor, user_id, created=0, finalized=0, participated=0):
+    """Add deltas to a user's counters inside the caller's transaction"""
+    cursor.execute("""
+        INSERT INTO user_stats (user_id, created_count, finalized_count, participated_count)
+        VALUES (?, ?, ?, ?)
+        ON CONFLICT (user_id) DO UPDATE
+        SET created_count = user_stats.created_count + excluded.created_count,
+            finalized_count = user_stats.finalized_count + excluded.finalized_count,
+            participated_count = user_stats.participated_count + excluded.participated_count
+    """, (user_id, created, finalized, participated))
+
+def _count_user_stats(cursor, user_id):
+    """Count a user's counters from the events and votes tables"""
+    cursor.execute("""
+        SELECT COUNT(*) AS created_count,
+               COALESCE(SUM(CASE WHEN is_finalized THEN 1 ELSE 0 END), 0) AS finalized_count
+        FROM events
+        WHERE created_by = ?
+    """, (user_id,))
+    counts = dict(cursor.fetchone())
+
+    cursor.execute("""
+        SELECT COUNT(DISTINCT v.event_id) AS participated_count
+        FROM votes v
+        JOIN events e ON e.id = v.event_id
+        WHERE v.user_id = ? AND e.created_by != ?
+    """, (user_id, user_id))
+    counts.update(cursor.fetchone())
+    return counts
+
+def _all_user_ids(cursor):
+    cursor.execute("SELECT id FROM users ORDER BY id")
+    return [row["id"] for row in cursor.fetchall()]
+
+def rebuild_user_stats(user_id=None):
+    """Recompute user_stats from events and votes (one user, or all)
+
+    Returns the number of users rebuilt.
+    """
+    with db_connection() as conn:
+        cursor = conn.cursor()
+        user_ids = [user_id] if user_id else _all_user_ids(cursor)
+        conn.commit()
+        for uid in user_ids:
+            _begin_write(cursor)
+            counts = _count_user_stats(cursor, uid)
+            cursor.execute("""
+                INSERT INTO user_stats (user_id, created_count, finalized_count, participated_count)
+                VALUES (?, ?, ?, ?)
+                ON CONFLICT (user_id) DO UPDATE
+                SET created_count = excluded.created_count,
+                    finalized_count = excluded.finalized_count,
+                    participated_count = excluded.participated_count
+            """, (uid, counts["created_count"], counts["finalized_count"],
+                  counts["participated_count"]))
+            conn.commit()
+        cursor.close()
+    get_user_stats_cache().clear()
+    return len(user_ids)
+
+def get_upcoming_events(user_id, start, end):
+    """Get finalized events the user created or voted on, scheduled in [start, end)
+
+    start and end are datetimes (naive values are UTC) or epoch seconds.
+    Each event carries its finalized slot as start_time.
+    """
+    if isinstance(start, datetime):
+        start = slot_timestamp(start)
+    if isinstance(end, datetime):
+        end = slot_timestamp(end)
+
+    with db_connection() as conn:
+        cursor = conn.cursor()
+        _begin_read(cursor)
+
+        # Events the user created, via idx_events_created_by_finalized
         cursor.execute("""
-            SELECT DISTINCT e.*, u.username as creator_username
+            SELECT e.*, ts.slot_datetime, ts.slot_ts
             FROM events e
-            JOIN users u ON e.created_by = u.id
-            JOIN votes v ON e.id = v.event_id
-            WHERE v.user_id = ? AND e.created_by != ?
-            ORDER BY e.created_at DESC
-        """, (user_id, user_id))
-    
-    events = cursor.fetchall()
-    cursor.close()
-    conn.close()
-    return [dict(event) for event in events]
+            JOIN time_slots ts ON ts.id = e.finalized_slot_id AND ts.event_id = e.id
+            WHERE e.created_by = ? AND e.is_finalized = TRUE
+              AND ts.slot_ts >= ? AND ts.slot_ts < ?
+        """, (user_id, start, end))
+        events = {event["id"]: _event_dict(event) for event in cursor.fetchall()}
+
+        # Events the user voted on, via idx_votes_user_event
+        cursor.execute("""
+            SELECT e.*, ts.slot_datetime, ts.slot_ts
+            FROM events e
+            JOIN time_slots ts ON ts.id = e.finalized_slot_id AND ts.event_id = e.id
+            WHERE e.id IN (SELECT v.event_id FROM votes v WHERE v.user_id = ?)
+              AND e.is_finalized = TRUE
+              AND ts.slot_ts >= ? AND ts.slot_ts < ?
+        """, (user_id, start, end))
+        for event in cursor.fetchall():
+            events.setdefault(event["id"], _event_dict(event))
+
+        conn.commit()
+        cursor.close()
+
+    upcoming = sorted(events.values(), key=lambda event: event["slot_ts"])
+    for event in upcoming:
+        event["start_time"] = datetime.fromtimestamp(event["slot_ts"], timezone.utc).replace(tzinfo=None)
+    return upcoming
 
 def add_time_slot(event_id, slot_datetime):
     """Add a time slot to an event"""
-    conn = get_db_connection()
-    cursor = conn.cursor()
-    cursor.execute("""
-        INSERT INTO time_slots (event_id, slot_datetime)
-        VALUES (?, ?)
-    """, (event_id, slot_datetime))
-    conn.commit()
-    cursor.close()
-    conn.close()
+    with db_connection() as conn:
+        cursor = conn.cursor()
+        cursor.execute("""
+            INSERT INTO time_slots (event_id, slot_datetime, slot_ts)
+            VALUES (?, ?, ?)
+            RETURNING id
+        """, (event_id, slot_datetime, slot_timestamp(slot_datetime)))
+        slot_id = cursor.fetchone()["id"]
+        _record_change(cursor, event_id, "slot", slot_id=slot_id,
+                       data={"slot_datetime": slot_datetime})
+        conn.commit()
+        cursor.close()
 
 def get_time_slots_by_event(event_id):
     """Get all time slots for an event"""
-    conn = get_db_connection()
-    cursor = conn.cursor()
-    cursor.execute("""
-        SELECT * FROM time_slots 
-        WHERE event_id = ? 
-        ORDER BY slot_datetime
-    """, (event_id,))
-    slots = cursor.fetchall()
-    cursor.close()
-    conn.close()
-    return [dict(slot) for slot in slots]
+    with db_connection() as conn:
+        cursor = conn.cursor()
+        cursor.execute("""
+            SELECT * FROM time_slots 
+            WHERE event_id = ? 
+            ORDER BY slot_ts
+        """, (event_id,))
+        slots = cursor.fetchall()
+        cursor.close()
+        return [dict(slot) for slot in slots]
 
 def vote_for_slot(event_id, slot_id, user_id, is_vote=True):
-    """Vote for or unvote a time slot"""
-    conn = get_db_connection()
-    cursor = conn.cursor()
-    
+    """Vote for or unvote a time slot
+
+    Returns {"changed": bool, "vote_count": int}: whether the vote state
+    actually changed (a repeated vote or unvote is a no-op) and the slot's
+    vote count afterwards. Raises LookupError if the event doesn't exist
+    and ValueError for a slot that isn't part of it.
+    """
+    with db_connection() as conn:
+        cursor = conn.cursor()
+        result = _apply_vote(cursor, event_id, slot_id, user_id, is_vote)
+        conn.commit()
+        cursor.close()
+    if result["changed"]:
+        get_user_stats_cache().invalidate(user_id)
+    return result
+
+def apply_vote_batch(votes):
+    """Apply many (event_id, slot_id, user_id, is_vote) votes in one transaction
+
+    Each vote runs in its own savepoint, so one failing vote doesn't undo
+    the others. Returns a list with, per vote, either the vote_for_slot
+    result dict or the exception it raised.
+    """
+    results = []
+    with db_connection() as conn:
+        cursor = conn.cursor()
+        _begin_write(cursor)
+        for event_id, slot_id, user_id, is_vote in votes:
+            cursor.execute("SAVEPOINT vote")
+            try:
+                results.append(_apply_vote(cursor, event_id, slot_id, user_id, is_vote))
+            except Exception as e:
+                cursor.execute("ROLLBACK TO SAVEPOINT vote")
+                results.append(e)
+            cursor.execute("RELEASE SAVEPOINT vote")
+        conn.commit()
+        cursor.close()
+
+    cache = get_user_stats_cache()
+    for (_, _, user_id, _), result in zip(votes, results):
+        if isinstance(result, dict) and result["changed"]:
+            cache.invalidate(user_id)
+    return results
+
+def _apply_vote(cursor, event_id, slot_id, user_id, is_vote):
+    """Apply one vote or unvote inside the caller's transaction
+
+    Raises LookupError if the event doesn't exist, and ValueError if the
+    slot doesn't exist or belongs to another event.
+    """
+    cursor.execute("SELECT event_id FROM time_slots WHERE id = ?", (slot_id,))
+    slot = cursor.fetchone()
+    if slot is None or slot["event_id"] != event_id:
+        # Only a rejected vote pays for telling the two cases apart
+        cursor.execute("SELECT 1 AS found FROM events WHERE id = ?", (event_id,))
+        if cursor.fetchone() is None:
+            raise LookupError(f"Event {event_id} not found")
+        raise ValueError(f"Time slot {slot_id} is not part of event {event_id}")
+
     if is_vote:
-        # Add vote (ignore if already exists)
-        try:
-            cursor.execute("""
-                INSERT INTO votes (event_id, time_slot_id, user_id)
-                VALUES (?, ?, ?)
-            """, (event_id, slot_id, user_id))
-        except sqlite3.IntegrityError:
-            # Vote already exists, ignore
-            pass
+        # Add vote; RETURNING yields a row only if it was actually inserted
+        cursor.execute("""
+            INSERT INTO votes (event_id, time_slot_id, user_id)
+            VALUES (?, ?, ?)
+            ON CONFLICT (event_id, time_slot_id, user_id) DO NOTHING
+            RETURNING id
+        """, (event_id, slot_id, user_id))
     else:
-        # Remove vote
+        # Remove vote; RETURNING yields a row only if one was deleted
         cursor.execute("""
             DELETE FROM votes 
             WHERE event_id = ? AND time_slot_id = ? AND user_id = ?
+            RETURNING id
         """, (event_id, slot_id, user_id))
-    
-    conn.commit()
-    affected_rows = cursor.rowcount
-    cursor.close()
-    conn.close()
-    
-    # Broadcast update via WebSocket
-    from handlers.websocket import VoteWebSocketHandler
-    VoteWebSocketHandler.broadcast_vote_update(event_id)
-    
-    return affected_rows > 0
+    changed = len(cursor.fetchall()) > 0
+
+    # Keep the materialized tallies in step, in the same transaction
+    if changed:
+        vote_count = _adjust_tallies(cursor, event_id, slot_id, user_id, 1 if is_vote else -1)
+        version = _record_change(cursor, event_id, "vote" if is_vote else "unvote",
+                                 slot_id=slot_id, user_id=user_id,
+                                 data={"vote_count": vote_count})
+    else:
+        cursor.execute("""
+            SELECT vote_count FROM slot_tallies
+            WHERE event_id = ? AND time_slot_id = ?
+        """, (event_id, slot_id))
+        row = cursor.fetchone()
+        vote_count = row["vote_count"] if row else 0
+        version = None
+
+    return {"changed": changed, "vote_count": vote_count, "version": version}
+
+def _adjust_tallies(cursor, event_id, slot_id, user_id, delta):
+    """Apply one vote (+1) or unvote (-1) to the tallies; returns the slot's new count"""
+    # Lock the event's tally row before counting the user's votes below, so
+    # concurrent votes by the same user see each other (matters on Postgres)
+    cursor.execute("""
+        INSERT INTO event_tallies (event_id, participant_count)
+        VALUES (?, 0)
+        ON CONFLICT (event_id) DO UPDATE
+        SET participant_count = event_tallies.participant_count
+    """, (event_id,))
+
+    cursor.execute("""
+        INSERT INTO slot_tallies (event_id, time_slot_id, vote_count)
+        VALUES (?, ?, ?)
+        ON CONFLICT (event_id, time_slot_id) DO UPDATE
+        SET vote_count = slot_tallies.vote_count + excluded.vote_count
+        RETURNING vote_count
+    """, (event_id, slot_id, delta))
+    vote_count = cursor.fetchone()["vote_count"]
+
+    # The user joins on their first vote and leaves with their last
+    cursor.execute("""
+        SELECT COUNT(*) AS vote_count FROM votes
+        WHERE user_id = ? AND event_id = ?
+    """, (user_id, event_id))
+    remaining = cursor.fetchone()["vote_count"]
+    if (delta > 0 and remaining == 1) or (delta < 0 and remaining == 0):
+        cursor.execute("""
+            UPDATE event_tallies
+            SET participant_count = participant_count + ?
+            WHERE event_id = ?
+        """, (delta, event_id))
+        # Voting on your own event doesn't count as participating in it
+        cursor.execute("SELECT created_by FROM events WHERE id = ?", (event_id,))
+        if cursor.fetchone()["created_by"] != user_id:
+            _adjust_user_stats(cursor, user_id, participated=delta)
+
+    return vote_count
+
+def _summarize_tallies(event_id, slot_rows, participant_count):
+    counts = {row["time_slot_id"]: row["vote_count"] for row in slot_rows if row["vote_count"]}
+    leading_slot_id = None
+    if counts:
+        # Ties go to the earliest-created slot
+        leading_slot_id = max(sorted(counts), key=lambda slot_id: counts[slot_id])
+    return {
+        "event_id": event_id,
+        "counts": counts,
+        "leading_slot_id": leading_slot_id,
+        "participant_count": participant_count,
+    }
+
+def _read_tallies(cursor, event_id):
+    cursor.execute("""
+        SELECT time_slot_id, vote_count FROM slot_tallies
+        WHERE event_id = ?
+    """, (event_id,))
+    slot_rows = cursor.fetchall()
+    cursor.execute("""
+        SELECT participant_count FROM event_tallies
+        WHERE event_id = ?
+    """, (event_id,))
+    event_row = cursor.fetchone()
+    return _summarize_tallies(event_id, slot_rows, event_row["participant_count"] if event_row else 0)
+
+def get_slot_tallies(event_id):
+    """Get per-slot vote counts, the leading slot and the participant total
+
+    Reads the materialized tallies, so the cost depends on the number of
+    slots rather than the number of votes.
+    """
+    with db_connection() as conn:
+        cursor = conn.cursor()
+        _begin_read(cursor)
+        tallies = _read_tallies(cursor, event_id)
+        conn.commit()
+        cursor.close()
+        return tallies
+
+def get_vote_snapshot(event_id):
+    """Get an event's votes, tallies and version from one consistent snapshot
+
+    What a live client resets its vote state to when it has fallen too
+    far behind to apply the missed vote changes one by one.
+    """
+    with db_connection() as conn:
+        cursor = conn.cursor()
+        _begin_read(cursor)
+        cursor.execute("""
+            SELECT v.time_slot_id, v.user_id, u.username, u.avatar_url
+            FROM votes v
+            JOIN users u ON v.user_id = u.id
+            WHERE v.event_id = ?
+            ORDER BY v.created_at
+        """, (event_id,))
+        voters_by_slot = {}
+        for vote in cursor.fetchall():
+            voters_by_slot.setdefault(vote["time_slot_id"], []).append({
+                "id": vote["user_id"],
+                "username": vote["username"],
+                "avatar_url": vote["avatar_url"],
+            })
+        tallies = _read_tallies(cursor, event_id)
+        version = _read_version(cursor, event_id)
+        conn.commit()
+        cursor.close()
+    return {"version": version, "voters_by_slot": voters_by_slot, "tallies": tallies}
+
+def _count_votes(cursor, event_id):
+    """Compute an event's tallies from the votes table"""
+    cursor.execute("""
+        SELECT time_slot_id, COUNT(*) AS vote_count
+        FROM votes
+        WHERE event_id = ?
+        GROUP BY time_slot_id
+    """, (event_id,))
+    slot_rows = cursor.fetchall()
+    cursor.execute("""
+        SELECT COUNT(DISTINCT user_id) AS participant_count
+        FROM votes
+        WHERE event_id = ?
+    """, (event_id,))
+    participant_count = cursor.fetchone()["participant_count"]
+    return _summarize_tallies(event_id, slot_rows, participant_count)
+
+def _all_event_ids(cursor):
+    cursor.execute("SELECT id FROM events ORDER BY id")
+    return [row["id"] for row in cursor.fetchall()]
+
+def rebuild_tallies(event_id=None):
+    """Recompute slot and event tallies from votes (one event, or all)
+
+    Returns the number of events rebuilt.
+    """
+    with db_connection() as conn:
+        cursor = conn.cursor()
+        event_ids = [event_id] if event_id else _all_event_ids(cursor)
+        conn.commit()
+        for eid in event_ids:
+            # Count and rewrite under the write lock, so a vote can't be
+            # committed in between and then be missing from the rebuild.
+            # On Postgres that lock is the event's tally row, which every
+            # vote takes before touching the tallies (see _adjust_tallies)
+            _begin_write(cursor)
+            cursor.execute("""
+                INSERT INTO event_tallies (event_id, participant_count)
+                VALUES (?, 0)
+                ON CONFLICT (event_id) DO UPDATE
+                SET participant_count = event_tallies.participant_count
+            """, (eid,))
+            tallies = _count_votes(cursor, eid)
+            cursor.execute("DELETE FROM slot_tallies WHERE event_id = ?", (eid,))
+            cursor.executemany("""
+                INSERT INTO slot_tallies (event_id, time_slot_id, vote_count)
+                VALUES (?, ?, ?)
+            """, [(eid, slot_id, count) for slot_id, count in tallies["counts"].items()])
+            cursor.execute("""
+                INSERT INTO event_tallies (event_id, participant_count)
+                VALUES (?, ?)
+                ON CONFLICT (event_id) DO UPDATE
+                SET participant_count = excluded.participant_count
+            """, (eid, tallies["participant_count"]))
+            _record_change(cursor, eid, "rebuild")
+            conn.commit()
+        cursor.close()
+        return len(event_ids)
+
+def check_tallies(event_id=None):
+    """Compare materialized tallies against the votes table
+
+    Returns a list of (event_id, expected, actual) for every event whose
+    tallies have drifted; an empty list means everything is consistent.
+    """
+    mismatches = []
+    with db_connection() as conn:
+        cursor = conn.cursor()
+        event_ids = [event_id] if event_id else _all_event_ids(cursor)
+        conn.commit()
+        for eid in event_ids:
+            _begin_read(cursor)
+            expected = _count_votes(cursor, eid)
+            actual = _read_tallies(cursor, eid)
+            conn.commit()
+            if expected != actual:
+                mismatches.append((eid, expected, actual))
+        cursor.close()
+    return mismatches
 
 def get_votes_by_event(event_id):
     """Get all votes for an event with user info"""
-    conn = get_db_connection()
-    cursor = conn.cursor()
+    with db_connection() as conn:
+        cursor = conn.cursor()
+        cursor.execute("""
+            SELECT v.*, u.username, u.avatar_url
+            FROM votes v
+            JOIN users u ON v.user_id = u.id
+            WHERE v.event_id = ?
+            ORDER BY v.created_at
+        """, (event_id,))
+        votes = cursor.fetchall()
+        cursor.close()
+        return [dict(vote) for vote in votes]
+
+def _record_change(cursor, event_id, kind, slot_id=None, user_id=None, data=None):
+    """Bump an event's version and log the change under it as seq
+
+    Runs in the caller's transaction, so the change log, the version and
+    the change itself commit together. Returns the new version.
+    """
     cursor.execute("""
-        SELECT v.*, u.username, u.avatar_url
-        FROM votes v
-        JOIN users u ON v.user_id = u.id
-        WHERE v.event_id = ?
-        ORDER BY v.created_at
+        INSERT INTO event_versions (event_id, version, updated_at)
+        VALUES (?, 1, CURRENT_TIMESTAMP)
+        ON CONFLICT (event_id) DO UPDATE
+        SET version = event_versions.version + 1, updated_at = CURRENT_TIMESTAMP
+        RETURNING version
     """, (event_id,))
-    votes = cursor.fetchall()
-    cursor.close()
-    conn.close()
-    return [dict(vote) for vote in votes]
+    version = cursor.fetchone()["version"]
+
+    cursor.execute("""
+        INSERT INTO event_changes (event_id, seq, kind, slot_id, user_id, data)
+        VALUES (?, ?, ?, ?, ?, ?)
+    """, (event_id, version, kind, slot_id, user_id,
+          json.dumps(data, default=str) if data is not None else None))
+
+    # Bounded retention: clients further behind than this reload the page
+    retention = int(os.environ.get('EVENT_CHANGES_RETENTION', 500))
+    cursor.execute("""
+        DELETE FROM event_changes WHERE event_id = ? AND seq <= ?
+    """, (event_id, version - retention))
+    return version
+
+def get_event_changes(event_id, since, limit=500):
+    """Get the changes to an event after version since
+
+    Returns {"version": current version, "changes": [...], "has_more": bool}
+    with at most limit changes in seq order; while has_more is true, ask
+    again with since set to the last change's seq. Returns
+    {"version": ..., "reset": True} instead if changes after since are no
+    longer in the log and the client has to reload the full state.
+    """
+    with db_connection() as conn:
+        cursor = conn.cursor()
+        _begin_read(cursor)
+        version = _read_version(cursor, event_id)
+
+        cursor.execute("""
+            SELECT MIN(seq) AS oldest FROM event_changes WHERE event_id = ?
+        """, (event_id,))
+        oldest = cursor.fetchone()["oldest"]
+        if since > version or (since < version and (oldest is None or oldest > since + 1)):
+            conn.commit()
+            cursor.close()
+            return {"version": version, "reset": True}
+
+        cursor.execute("""
+            SELECT c.seq, c.kind, c.slot_id, c.data, c.created_at,
+                   u.id AS user_id, u.username, u.avatar_url
+            FROM event_changes c
+            LEFT JOIN users u ON c.user_id = u.id
+            WHERE c.event_id = ? AND c.seq > ?
+            ORDER BY c.seq
+            LIMIT ?
+        """, (event_id, since, limit + 1))
+        rows = cursor.fetchall()
+        conn.commit()
+        cursor.close()
+
+    has_more = len(rows) > limit
+    rows = rows[:limit]
+
+    changes = []
+    for row in rows:
+        user = None
+        if row["user_id"] is not None:
+            user = {"id": row["user_id"], "username": row["username"],
+                    "avatar_url": row["avatar_url"]}
+        changes.append({
+            "seq": row["seq"],
+            "kind": row["kind"],
+            "slot_id": row["slot_id"],
+            "user": user,
+            "data": json.loads(row["data"]) if row["data"] else {},
+            "created_at": str(row["created_at"]),
+        })
+    return {"version": version, "changes": changes, "has_more": has_more}
+
+def _read_version(cursor, event_id):
+    cursor.execute("SELECT version FROM event_versions WHERE event_id = ?", (event_id,))
+    row = cursor.fetchone()
+    # Events from before versioning count as version 0 until first changed
+    return row["version"] if row else 0
+
+def get_event_version(event_id):
+    """Get an event's version and when it last changed
+
+    Returns {"version": 0, "updated_at": None} for events that haven't
+    changed since versioning was added (or don't exist).
+    """
+    with db_connection() as conn:
+        cursor = conn.cursor()
+        cursor.execute("""
+            SELECT version, updated_at FROM event_versions WHERE event_id = ?
+        """, (event_id,))
+        row = cursor.fetchone()
+        cursor.close()
+    if not row:
+        return {"version": 0, "updated_at": None}
+    return {"version": row["version"], "updated_at": row["updated_at"]}
+
+def get_event_with_version(event_id):
+    """Get an event and its version stamp (see get_event_version) together
+
+    Returns (None, None) if the event does not exist. One call, so a page
+    view makes a single executor round trip before its conditional check;
+    the event comes from the event cache when possible.
+    """
+    event = get_event_by_id(event_id)
+    if not event:
+        return None, None
+    return event, get_event_version(event_id)
+
+def get_user_votes(event_id, user_id):
+    """Get the ids of the slots a user has voted for in an event"""
+    with db_connection() as conn:
+        cursor = conn.cursor()
+        cursor.execute("""
+            SELECT time_slot_id FROM votes
+            WHERE user_id = ? AND event_id = ?
+        """, (user_id, event_id))
+        slot_ids = {row["time_slot_id"] for row in cursor.fetchall()}
+        cursor.close()
+    return slot_ids
+
+def get_event_bundle(event_id, viewer_id=None):
+    """Get everything the event page needs from one consistent snapshot
+
+    Returns None if the event does not exist, otherwise a dict with the
+    event, its time slots and comments, votes grouped by slot id, the
+    set of slot ids the viewer has voted for, the event's tallies and
+    its version.
+    """
+    with db_connection() as conn:
+        cursor = conn.cursor()
+
+        # A single read transaction, so a concurrent vote or comment can't
+        # land between the queries below
+        _begin_read(cursor)
+
+        cursor.execute("""
+            SELECT e.*, u.username as creator_username, u.avatar_url as creator_avatar
+            FROM events e
+            JOIN users u ON e.created_by = u.id
+            WHERE e.id = ?
+        """, (event_id,))
+        event = cursor.fetchone()
+        if not event:
+            conn.rollback()
+            cursor.close()
+            return None
+
+        cursor.execute("""
+            SELECT * FROM time_slots 
+            WHERE event_id = ? 
+            ORDER BY slot_ts
+        """, (event_id,))
+        time_slots = [dict(slot) for slot in cursor.fetchall()]
+
+        cursor.execute("""
+            SELECT v.*, u.username, u.avatar_url
+            FROM votes v
+            JOIN users u ON v.user_id = u.id
+            WHERE v.event_id = ?
+            ORDER BY v.created_at
+        """, (event_id,))
+        votes_by_slot = {}
+        user_votes = set()
+        for vote in cursor.fetchall():
+            slot_id = vote["time_slot_id"]
+            votes_by_slot.setdefault(slot_id, []).append(dict(vote))
+            if viewer_id is not None and vote["user_id"] == viewer_id:
+                user_votes.add(slot_id)
+
+        cursor.execute("""
+            SELECT c.*, u.username, u.avatar_url
+            FROM comments c
+            JOIN users u ON c.user_id = u.id
+            WHERE c.event_id = ?
+            ORDER BY c.created_at
+        """, (event_id,))
+        comments = [dict(comment) for comment in cursor.fetchall()]
+
+        tallies = _read_tallies(cursor, event_id)
+        version = _read_version(cursor, event_id)
+
+        conn.commit()
+        cursor.close()
+
+    return {
+        "event": _event_dict(event),
+        "time_slots": time_slots,
+        "votes_by_slot": votes_by_slot,
+        "user_votes": user_votes,
+        "comments": comments,
+        "tallies": tallies,
+        "version": version,
+    }
 
 def add_comment(event_id, user_id, comment_text):
     """Add a comment to an event"""
-    conn = get_db_connection()
-    cursor = conn.cursor()
-    cursor.execute("""
-        INSERT INTO comments (event_id, user_id, comment_text)
-        VALUES (?, ?, ?)
-    """, (event_id, user_id, comment_text))
-    conn.commit()
-    cursor.close()
-    conn.close()
+    with db_connection() as conn:
+        cursor = conn.cursor()
+        cursor.execute("""
+            INSERT INTO comments (event_id, user_id, comment_text)
+            VALUES (?, ?, ?)
+            RETURNING id, created_at
+        """, (event_id, user_id, comment_text))
+        comment = cursor.fetchone()
+        _record_change(cursor, event_id, "comment", user_id=user_id, data={
+            "comment_id": comment["id"],
+            "comment_text": comment_text,
+            "created_at": comment["created_at"],
+        })
+        conn.commit()
+        cursor.close()
 
 def get_comments_by_event(event_id):
     """Get all comments for an event"""
-    conn = get_db_connection()
-    cursor = conn.cursor()
-    cursor.execute("""
-        SELECT c.*, u.username, u.avatar_url
-        FROM comments c
-        JOIN users u ON c.user_id = u.id
-        WHERE c.event_id = ?
-        ORDER BY c.created_at
-    """, (event_id,))
-    comments = cursor.fetchall()
-    cursor.close()
-    conn.close()
-    return [dict(comment) for comment in comments]
+    with db_connection() as conn:
+        cursor = conn.cursor()
+        cursor.execute("""
+            SELECT c.*, u.username, u.avatar_url
+            FROM comments c
+            JOIN users u ON c.user_id = u.id
+            WHERE c.event_id = ?
+            ORDER BY c.created_at
+        """, (event_id,))
+        comments = cursor.fetchall()
+        cursor.close()
+        return [dict(comment) for comment in comments]
 
 def finalize_event(event_id, slot_id):
     """Finalize an event with selected time slot"""
-    conn = get_db_connection()
-    cursor = conn.cursor()
-    cursor.execute("""
-        UPDATE events 
-        SET finalized_slot_id = ?, is_finalized = 1
-        WHERE id = ?
-    """, (slot_id, event_id))
-    conn.commit()
-    cursor.close()
-    conn.close()
+    with db_connection() as conn:
+        cursor = conn.cursor()
+        # Only the first finalization counts towards the creator's stats;
+        # picking another slot later just moves finalized_slot_id
+        cursor.execute("""
+            UPDATE events
+            SET finalized_slot_id = ?, is_finalized = TRUE
+            WHERE id = ? AND is_finalized IS NOT TRUE
+            RETURNING created_by
+        """, (slot_id, event_id))
+        row = cursor.fetchone()
+        if row:
+            _adjust_user_stats(cursor, row["created_by"], finalized=1)
+        else:
+            cursor.execute("""
+                UPDATE events
+                SET finalized_slot_id = ?
+                WHERE id = ?
+            """, (slot_id, event_id))
+        _record_change(cursor, event_id, "finalize", slot_id=slot_id)
+        conn.commit()
+        cursor.close()
+    get_event_cache().invalidate(event_id)
+    if row:
+        get_user_stats_cache().invalidate(row["created_by"])
 
 def update_event(event_id, title, description, location, max_applicants):
     """Update an existing event"""
-    conn = get_db_connection()
-    cursor = conn.cursor()
-    cursor.execute("""
-        UPDATE events
-        SET title = ?, description = ?, location = ?, max_applicants = ?
-        WHERE id = ?
-    """, (title, description, location, max_applicants, event_id))
-    conn.commit()
-    cursor.close()
-    conn.close()
+    with db_connection() as conn:
+        cursor = conn.cursor()
+        cursor.execute("""
+            UPDATE events
+            SET title = ?, description = ?, location = ?, location_data = ?,
+                max_applicants = ?
+            WHERE id = ?
+        """, (title, description, location, location_json(location),
+              max_applicants, event_id))
+        _record_change(cursor, event_id, "edit", data={
+            "title": title,
+            "description": description,
+            "location": location,
+            "max_applicants": max_applicants,
+        })
+        conn.commit()
+        cursor.close()
+    get_event_cache().invalidate(event_id)
     return get_event_by_id(event_id)
@@ -0,0 +1,160 @@
+"""Group commit for vote writes
+
+Committing every vote in its own transaction makes the database's commit
+(an fsync on SQLite) the ceiling for vote throughput. The writer below
+collects the votes that arrive within a short window, applies them all in
+one transaction with models.db.apply_vote_batch and then hands each caller
+its own result:
+
+    future = get_writer().submit(event_id, slot_id, user_id, is_vote)
+    result = future.result()   # or: await asyncio.wrap_future(future)
+
+Enabled by setting DB_GROUP_COMMIT_WINDOW_MS above 0.
+"""
+import os
+import queue
+import threading
+import time
+from concurrent.futures import Future
+
+from tornado.log import app_log
+
+from models import db
+
+
+class GroupCommitWriter:
+    """Single writer thread that commits queued votes in batches
+
+    A batch is closed ``window`` seconds after its first vote arrived or
+    once it holds ``max_batch`` votes, whichever comes first.
+    """
+
+    def __init__(self, window=0.003, max_batch=64):
+        self.window = window
+        self.max_batch = max(1, int(max_batch))
+        self._queue = queue.Queue()
+        self._lock = threading.Lock()
+        self._closed = False
+        self._thread = threading.Thread(target=self._run, name="group-commit", daemon=True)
+        self._thread.start()
+
+        # Stats
+        self.batches = 0
+        self.votes = 0
+        self.failed = 0
+        self.batch_size_max = 0
+        self.commit_time = 0.0
+        self.commit_time_max = 0.0
+
+    def submit(self, event_id, slot_id, user_id, is_vote=True):
+        """Queue a vote; the returned Future resolves to vote_for_slot's result"""
+        if self._closed:
+            raise RuntimeError("Group commit writer is closed")
+        future = Future()
+        self._queue.put((future, (event_id, slot_id, user_id, is_vote)))
+        return future
+
+    def _run(self):
+        while True:
+            item = self._queue.get()
+            if item is None:
+                return
+            batch = [item]
+            stopping = False
+            deadline = time.perf_counter() + self.window
+            while len(batch) < self.max_batch:
+                remaining = deadline - time.perf_counter()
+                if remaining <= 0:
+                    break
+                try:
+                    item = self._queue.get(timeout=remaining)
+                except queue.Empty:
+                    break
+                if item is None:
+                    stopping = True
+                    break
+                batch.append(item)
+            self._commit(batch)
+            if stopping:
+                return
+
+    def _commit(self, batch):
+        futures = [future for future, _ in batch]
+        started = time.perf_counter()
+        try:
+            results = db.apply_vote_batch([vote for _, vote in batch])
+        except Exception as e:
+            # The whole transaction failed, every vote in it fails with it
+            app_log.exception("Group commit of %d votes failed", len(batch))
+            results = [e] * len(batch)
+        commit_time = time.perf_counter() - started
+
+        failed = 0
+        for future, result in zip(futures, results):
+            if isinstance(result, Exception):
+                failed += 1
+                future.set_exception(result)
+            else:
+                future.set_result(result)
+
+        with self._lock:
+            self.batches += 1
+            self.votes += len(batch)
+            self.failed += failed
+            self.batch_size_max = max(self.batch_size_max, len(batch))
+            self.commit_time += commit_time
+            self.commit_time_max = max(self.commit_time_max, commit_time)
+
+    def stats(self):
+        """Snapshot of batch size and commit latency counters"""
+        with self._lock:
+            batches = self.batches or 1
+            return {
+                "window": self.window,
+                "max_batch": self.max_batch,
+                "pending": self._queue.qsize(),
+                "batches": self.batches,
+                "votes": self.votes,
+                "failed": self.failed,
+                "batch_size_avg": self.votes / batches,
+                "batch_size_max": self.batch_size_max,
+                "commit_time_avg": self.commit_time / batches,
+                "commit_time_max": self.commit_time_max,
+            }
+
+    def close(self):
+        """Commit whatever is queued and stop the writer thread"""
+        self._closed = True
+        self._queue.put(None)
+        self._thread.join()
+
+
+_writer = None
+_writer_lock = threading.Lock()
+
+def get_writer():
+    """Get the process-wide writer, or None if group commit is disabled"""
+    global _writer
+    window_ms = float(os.environ.get('DB_GROUP_COMMIT_WINDOW_MS', 0))
+    if window_ms <= 0:
+        return None
+    if _writer is None:
+        with _writer_lock:
+            if _writer is None:
+                _writer = GroupCommitWriter(
+                    window=window_ms / 1000,
+                    max_batch=int(os.environ.get('DB_GROUP_COMMIT_MAX_BATCH', 64)),
+                )
+    return _writer
+
+def get_writer_stats():
+    writer = get_writer()
+    return writer.stats() if writer else None
+
+def close_writer():
+    """Flush and stop the writer (e.g. on shutdown or in tests)"""
+    global _writer
+    with _writer_lock:
+        if _writer is not None:
+            _writer.close()
+        _writer = None
@@ -0,0 +1,49 @@
+"""Parsing of free-form event locations into places and meeting links
+
+A location is a comma-separated list of parts, each either plain text
+("Room 4", "Building B") or text followed by a URL. Parsing happens once
+when an event is written; the result is stored as JSON in
+events.location_data and rendered by templates/event_location.html.
+"""
+import json
+
+MEETING_LABELS = [
+    ("zoom", "Zoom Meeting"),
+    ("meet.google.com", "Google Meet"),
+    ("teams.live.com", "Microsoft Teams Meet"),
+]
+
+def meeting_label(url):
+    """Name of the meeting service a link points to"""
+    for needle, label in MEETING_LABELS:
+        if needle in url:
+            return label
+    return "Meeting Link"
+
+def parse_location(location):
+    """Split a location into {"text": place, "links": [{"url", "label"}]}
+
+    Returns None for an empty location.
+    """
+    if not location or not location.strip():
+        return None
+
+    places = []
+    links = []
+    for part in location.split(','):
+        http_index = part.find('http')
+        if http_index == -1:
+            text = part
+        else:
+            url = part[http_index:].strip()
+            if url:
+                links.append({"url": url, "label": meeting_label(url)})
+            text = part[:http_index]
+        if text.strip():
+            places.append(text.strip())
+    return {"text": " ".join(places), "links": links}
+
+def location_json(location):
+    """parse_location() serialized for the location_data column"""
+    data = parse_location(location)
+    return json.dumps(data) if data is not None else None
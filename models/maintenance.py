@@ -0,0 +1,64 @@
+"""Database maintenance commands
+
+    python -m models.maintenance check-tallies [--event EVENT_ID]
+    python -m models.maintenance rebuild-tallies [--event EVENT_ID]
+    python -m models.maintenance rebuild-user-stats [--user USER_ID]
+    python -m models.maintenance reparse-locations [--event EVENT_ID]
+"""
+import argparse
+import sys
+
+from models import db
+
+
+def check_tallies(args):
+    mismatches = db.check_tallies(args.event)
+    for event_id, expected, actual in mismatches:
+        print(f"{event_id}: expected {expected}, found {actual}")
+    if mismatches:
+        print(f"{len(mismatches)} event(s) with inconsistent tallies; "
+              f"run rebuild-tallies to fix them")
+        return 1
+    print("Tallies are consistent")
+    return 0
+
+
+def rebuild_tallies(args):
+    rebuilt = db.rebuild_tallies(args.event)
+    print(f"Rebuilt tallies for {rebuilt} event(s)")
+    return 0
+
+
+def rebuild_user_stats(args):
+    rebuilt = db.rebuild_user_stats(args.user)
+    print(f"Rebuilt dashboard stats for {rebuilt} user(s)")
+    return 0
+
+
+def reparse_locations(args):
+    updated = db.reparse_locations([args.event] if args.event else None)
+    print(f"Reparsed locations of {updated} event(s)")
+    return 0
+
+
+COMMANDS = {
+    "check-tallies": check_tallies,
+    "rebuild-tallies": rebuild_tallies,
+    "rebuild-user-stats": rebuild_user_stats,
+    "reparse-locations": reparse_locations,
+}
+
+
+def main(argv=None):
+    parser = argparse.ArgumentParser(prog="python -m models.maintenance")
+    parser.add_argument("command", choices=COMMANDS)
+    parser.add_argument("--event", help="limit the command to one event id")
+    parser.add_argument("--user", type=int, help="limit the command to one user id")
+    args = parser.parse_args(argv)
+
+    db.init_db()
+    return COMMANDS[args.command](args)
+
+
+if __name__ == "__main__":
+    sys.exit(main())
@@ -0,0 +1,153 @@
+import queue
+import threading
+import time
+from contextlib import contextmanager
+
+
+class ConnectionPool:
+    """Fixed-size pool of long-lived database connections
+
+    Connections are created lazily by ``factory`` (which performs all the
+    one-time per-connection setup) up to ``size`` and are then handed out
+    and returned instead of being opened and closed for every query.
+    """
+
+    def __init__(self, factory, size=5, timeout=30.0):
+        self._factory = factory
+        self.size = max(1, int(size))
+        self.timeout = timeout
+        self._idle = queue.LifoQueue()
+        self._lock = threading.Lock()
+        self._opened = 0
+        self._closed = False
+
+        # Stats
+        self.checkouts = 0
+        self.waits = 0
+        self.wait_time = 0.0
+
+    def acquire(self):
+        """Check a connection out of the pool, opening one if allowed"""
+        if self._closed:
+            raise RuntimeError("Connection pool is closed")
+
+        try:
+            conn = self._idle.get_nowait()
+        except queue.Empty:
+            conn = self._open_or_wait()
+
+        with self._lock:
+            self.checkouts += 1
+        return conn
+
+    def _open_or_wait(self):
+        with self._lock:
+            can_open = self._opened < self.size
+            if can_open:
+                self._opened += 1
+
+        if can_open:
+            try:
+                return self._factory()
+            except Exception:
+                with self._lock:
+                    self._opened -= 1
+                raise
+
+        # Pool exhausted, wait for another caller to return a connection
+        started = time.perf_counter()
+        try:
+            conn = self._idle.get(timeout=self.timeout)
+        except queue.Empty:
+            raise RuntimeError(
+                f"Timed out after {self.timeout}s waiting for a database connection"
+            )
+        finally:
+            with self._lock:
+                self.waits += 1
+                self.wait_time += time.perf_counter() - started
+        return conn
+
+    def warm(self, count=None):
+        """Open up to count (default: size) connections ahead of first use
+
+        Returns the number of connections opened.
+        """
+        wanted = self.size if count is None else min(count, self.size)
+        opened = []
+        try:
+            while True:
+                with self._lock:
+                    if self._opened >= wanted:
+                        break
+                    self._opened += 1
+                try:
+                    opened.append(self._factory())
+                except Exception:
+                    with self._lock:
+                        self._opened -= 1
+                    raise
+        finally:
+            for conn in opened:
+                self._idle.put(conn)
+        return len(opened)
+
+    def release(self, conn):
+        """Return a connection to the pool, rolling back any open transaction"""
+        try:
+            if conn.in_transaction:
+                conn.rollback()
+        except Exception:
+            # Broken connection, drop it so a fresh one gets opened
+            self._discard(conn)
+            return
+
+        if self._closed:
+            self._discard(conn)
+        else:
+            self._idle.put(conn)
+
+    def _discard(self, conn):
+        with self._lock:
+            self._opened -= 1
+        try:
+            conn.close()
+        except Exception:
+            pass
+
+    @contextmanager
+    def connection(self):
+        """Borrow a connection for the duration of a with block"""
+        conn = self.acquire()
+        try:
+            yield conn
+        except Exception:
+            try:
+                conn.rollback()
+            except Exception:
+                pass
+            raise
+        finally:
+            self.release(conn)
+
+    def stats(self):
+        """Snapshot of pool usage counters"""
+        with self._lock:
+            return {
+                "size": self.size,
+                "open": self._opened,
+                "idle": self._idle.qsize(),
+                "checkouts": self.checkouts,
+                "waits": self.waits,
+                "wait_time": self.wait_time,
+            }
+
+    def close(self):
+        """Close every idle connection and refuse further checkouts"""
+        self._closed = True
+        while True:
+            try:
+                conn = self._idle.get_nowait()
+            except queue.Empty:
+                break
+            self._discard(conn)
@@ -0,0 +1,213 @@
+"""PostgreSQL storage backend for models.db
+
+Selected when DATABASE_URL is a postgres:// or postgresql:// URL. The
+wrappers below let the SQL in models/db.py (written with SQLite's ``?``
+placeholders) run unchanged on psycopg2, with rows returned as dicts.
+"""
+import functools
+import threading
+import time
+from contextlib import contextmanager
+
+import psycopg2
+import psycopg2.extensions
+import psycopg2.extras
+import psycopg2.pool
+
+
+@functools.lru_cache(maxsize=256)
+def translate_placeholders(sql):
+    """Convert qmark placeholders to psycopg2's format style"""
+    return sql.replace("%", "%%").replace("?", "%s")
+
+
+class PostgresCursor:
+    """psycopg2 cursor that accepts the qmark SQL used in models/db.py"""
+
+    def __init__(self, cursor):
+        self._cursor = cursor
+
+    def execute(self, sql, params=None):
+        if params:
+            self._cursor.execute(translate_placeholders(sql), params)
+        else:
+            self._cursor.execute(sql)
+        return self
+
+    def executemany(self, sql, seq_of_params):
+        self._cursor.executemany(translate_placeholders(sql), seq_of_params)
+        return self
+
+    def fetchone(self):
+        return self._cursor.fetchone()
+
+    def fetchall(self):
+        return self._cursor.fetchall()
+
+    def __iter__(self):
+        return iter(self._cursor)
+
+    @property
+    def rowcount(self):
+        return self._cursor.rowcount
+
+    def close(self):
+        self._cursor.close()
+
+
+class PostgresConnection:
+    """Connection wrapper matching the parts of sqlite3.Connection db.py uses"""
+
+    def __init__(self, conn):
+        self.raw = conn
+
+    def cursor(self):
+        return PostgresCursor(self.raw.cursor(cursor_factory=psycopg2.extras.RealDictCursor))
+
+    def execute(self, sql, params=None):
+        return self.cursor().execute(sql, params)
+
+    def executescript(self, script):
+        with self.raw.cursor() as cursor:
+            cursor.execute(script)
+        self.raw.commit()
+
+    @property
+    def in_transaction(self):
+        status = self.raw.info.transaction_status
+        return status != psycopg2.extensions.TRANSACTION_STATUS_IDLE
+
+    def commit(self):
+        self.raw.commit()
+
+    def rollback(self):
+        self.raw.rollback()
+
+    def close(self):
+        self.raw.close()
+
+
+class PostgresPool:
+    """Pool of psycopg2 connections with the same interface as ConnectionPool
+
+    ThreadedConnectionPool raises as soon as it is exhausted; a semaphore in
+    front of it makes callers wait for a free connection instead.
+    """
+
+    def __init__(self, dsn, size=5, timeout=30.0):
+        self.size = max(1, int(size))
+        self.timeout = timeout
+        self._pool = psycopg2.pool.ThreadedConnectionPool(1, self.size, dsn)
+        # psycopg2 closes returned connections once minconn are idle; keep
+        # up to size open instead, as ConnectionPool does (still opened lazily)
+        self._pool.minconn = self.size
+        self._slots = threading.BoundedSemaphore(self.size)
+        self._lock = threading.Lock()
+        self._closed = False
+
+        # Stats
+        self.checkouts = 0
+        self.waits = 0
+        self.wait_time = 0.0
+
+    def acquire(self):
+        """Check a connection out of the pool, waiting if all are in use"""
+        if self._closed:
+            raise RuntimeError("Connection pool is closed")
+
+        if not self._slots.acquire(blocking=False):
+            started = time.perf_counter()
+            acquired = self._slots.acquire(timeout=self.timeout)
+            with self._lock:
+                self.waits += 1
+                self.wait_time += time.perf_counter() - started
+            if not acquired:
+                raise RuntimeError(
+                    f"Timed out after {self.timeout}s waiting for a database connection"
+                )
+
+        try:
+            conn = PostgresConnection(self._pool.getconn())
+        except Exception:
+            self._slots.release()
+            raise
+
+        with self._lock:
+            self.checkouts += 1
+        return conn
+
+    def warm(self, count=None):
+        """Open up to count (default: size) connections ahead of first use
+
+        Returns the number of connections opened.
+        """
+        wanted = self.size if count is None else min(count, self.size)
+        before = self._open_count()
+        # Holding every connection taken so far makes the pool open a new
+        # one for each further getconn() instead of handing back an idle one
+        held = []
+        try:
+            while len(held) < wanted and self._slots.acquire(blocking=False):
+                try:
+                    held.append(self._pool.getconn())
+                except Exception:
+                    self._slots.release()
+                    raise
+        finally:
+            for conn in held:
+                self._pool.putconn(conn)
+                self._slots.release()
+        return self._open_count() - before
+
+    def _open_count(self):
+        with self._lock:
+            return len(self._pool._used) + len(self._pool._pool)
+
+    def release(self, conn):
+        """Return a connection to the pool, rolling back any open transaction"""
+        try:
+            broken = bool(conn.raw.closed)
+            if not broken and conn.in_transaction:
+                conn.rollback()
+        except Exception:
+            broken = True
+
+        try:
+            if self._closed:
+                conn.raw.close()
+            else:
+                self._pool.putconn(conn.raw, close=broken)
+        finally:
+            self._slots.release()
+
+    @contextmanager
+    def connection(self):
+        """Borrow a connection for the duration of a with block"""
+        conn = self.acquire()
+        try:
+            yield conn
+        except Exception:
+            try:
+                conn.rollback()
+            except Exception:
+                pass
+            raise
+        finally:
+            self.release(conn)
+
+    def stats(self):
+        """Snapshot of pool usage counters"""
+        with self._lock:
+            return {
+                "size": self.size,
+                "open": len(self._pool._used) + len(self._pool._pool),
+                "idle": len(self._pool._pool),
+                "checkouts": self.checkouts,
+                "waits": self.waits,
+                "wait_time": self.wait_time,
+            }
+
+    def close(self):
+        """Close every connection and refuse further checkouts"""
+        self._closed = True
+        self._pool.closeall()
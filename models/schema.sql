@@ -15,6 +15,7 @@ CREATE TABLE IF NOT EXISTS events (
     title TEXT NOT NULL,
     description TEXT,
     location TEXT,
+    location_data TEXT DEFAULT NULL,
     max_applicants INTEGER DEFAULT NULL,
     created_by INTEGER NOT NULL,
     is_finalized BOOLEAN DEFAULT 0,
@@ -28,6 +29,7 @@ CREATE TABLE IF NOT EXISTS time_slots (
     id INTEGER PRIMARY KEY AUTOINCREMENT,
     event_id TEXT NOT NULL,
     slot_datetime TEXT NOT NULL,
+    slot_ts INTEGER DEFAULT NULL,
     created_at TIMESTAMP DEFAULT CURRENT_TIMESTAMP,
     FOREIGN KEY (event_id) REFERENCES events (id) ON DELETE CASCADE
 );
@@ -56,10 +58,67 @@ CREATE TABLE IF NOT EXISTS comments (
     FOREIGN KEY (user_id) REFERENCES users (id) ON DELETE CASCADE
 );
 
+-- Vote counts per slot, maintained by vote_for_slot in the same transaction
+CREATE TABLE IF NOT EXISTS slot_tallies (
+    event_id TEXT NOT NULL,
+    time_slot_id INTEGER NOT NULL,
+    vote_count INTEGER NOT NULL DEFAULT 0,
+    PRIMARY KEY (event_id, time_slot_id),
+    FOREIGN KEY (event_id) REFERENCES events (id) ON DELETE CASCADE,
+    FOREIGN KEY (time_slot_id) REFERENCES time_slots (id) ON DELETE CASCADE
+) WITHOUT ROWID;
+
+-- Distinct voters per event, maintained alongside slot_tallies
+CREATE TABLE IF NOT EXISTS event_tallies (
+    event_id TEXT PRIMARY KEY,
+    participant_count INTEGER NOT NULL DEFAULT 0,
+    FOREIGN KEY (event_id) REFERENCES events (id) ON DELETE CASCADE
+);
+
+-- Bumped by every change to an event, its slots, votes or comments
+CREATE TABLE IF NOT EXISTS event_versions (
+    event_id TEXT PRIMARY KEY,
+    version INTEGER NOT NULL DEFAULT 0,
+    updated_at TIMESTAMP DEFAULT CURRENT_TIMESTAMP,
+    FOREIGN KEY (event_id) REFERENCES events (id) ON DELETE CASCADE
+) WITHOUT ROWID;
+
+-- Log of changes to each event, seq = the event version they produced.
+-- Only the most recent EVENT_CHANGES_RETENTION entries are kept.
+CREATE TABLE IF NOT EXISTS event_changes (
+    event_id TEXT NOT NULL,
+    seq INTEGER NOT NULL,
+    kind TEXT NOT NULL,
+    slot_id INTEGER,
+    user_id INTEGER,
+    data TEXT,
+    created_at TIMESTAMP DEFAULT CURRENT_TIMESTAMP,
+    PRIMARY KEY (event_id, seq),
+    FOREIGN KEY (event_id) REFERENCES events (id) ON DELETE CASCADE
+) WITHOUT ROWID;
+
+-- Dashboard counters per user, maintained by the event and vote write paths
+CREATE TABLE IF NOT EXISTS user_stats (
+    user_id INTEGER PRIMARY KEY,
+    created_count INTEGER NOT NULL DEFAULT 0,
+    finalized_count INTEGER NOT NULL DEFAULT 0,
+    participated_count INTEGER NOT NULL DEFAULT 0,
+    FOREIGN KEY (user_id) REFERENCES users (id) ON DELETE CASCADE
+) WITHOUT ROWID;
+
 -- Indexes for better performance
-CREATE INDEX IF NOT EXISTS idx_events_created_by ON events (created_by);
-CREATE INDEX IF NOT EXISTS idx_time_slots_event_id ON time_slots (event_id);
-CREATE INDEX IF NOT EXISTS idx_votes_event_id ON votes (event_id);
+CREATE INDEX IF NOT EXISTS idx_events_created_by_finalized ON events (created_by, is_finalized);
+CREATE INDEX IF NOT EXISTS idx_events_created_by_created_at_id ON events (created_by, created_at, id);
+CREATE INDEX IF NOT EXISTS idx_events_created_at_id ON events (created_at, id);
+CREATE INDEX IF NOT EXISTS idx_votes_event_created_at ON votes (event_id, created_at);
 CREATE INDEX IF NOT EXISTS idx_votes_time_slot_id ON votes (time_slot_id);
-CREATE INDEX IF NOT EXISTS idx_votes_user_id ON votes (user_id);
-CREATE INDEX IF NOT EXISTS idx_comments_event_id ON comments (event_id);
+CREATE INDEX IF NOT EXISTS idx_votes_user_event ON votes (user_id, event_id);
+CREATE INDEX IF NOT EXISTS idx_comments_event_created_at ON comments (event_id, created_at);
+
+-- Indexes superseded by the composite indexes above
+DROP INDEX IF EXISTS idx_events_created_by;
+DROP INDEX IF EXISTS idx_events_created_by_created_at;
+DROP INDEX IF EXISTS idx_time_slots_event_id;
+DROP INDEX IF EXISTS idx_votes_event_id;
+DROP INDEX IF EXISTS idx_votes_user_id;
+DROP INDEX IF EXISTS idx_comments_event_id;
@@ -0,0 +1,131 @@
+-- PostgreSQL translation of schema.sql
+
+-- Users table
+CREATE TABLE IF NOT EXISTS users (
+    id SERIAL PRIMARY KEY,
+    github_id BIGINT UNIQUE NOT NULL,
+    username TEXT NOT NULL,
+    email TEXT,
+    avatar_url TEXT,
+    created_at TIMESTAMP DEFAULT CURRENT_TIMESTAMP,
+    updated_at TIMESTAMP DEFAULT CURRENT_TIMESTAMP
+);
+
+-- Events table
+CREATE TABLE IF NOT EXISTS events (
+    id TEXT PRIMARY KEY,
+    title TEXT NOT NULL,
+    description TEXT,
+    location TEXT,
+    location_data TEXT DEFAULT NULL,
+    max_applicants INTEGER DEFAULT NULL,
+    created_by INTEGER NOT NULL REFERENCES users (id),
+    is_finalized BOOLEAN DEFAULT FALSE,
+    finalized_slot_id INTEGER,
+    created_at TIMESTAMP DEFAULT CURRENT_TIMESTAMP
+);
+
+-- Time slots table
+CREATE TABLE IF NOT EXISTS time_slots (
+    id SERIAL PRIMARY KEY,
+    event_id TEXT NOT NULL REFERENCES events (id) ON DELETE CASCADE,
+    slot_datetime TEXT NOT NULL,
+    slot_ts BIGINT DEFAULT NULL,
+    created_at TIMESTAMP DEFAULT CURRENT_TIMESTAMP
+);
+
+-- Votes table
+CREATE TABLE IF NOT EXISTS votes (
+    id SERIAL PRIMARY KEY,
+    event_id TEXT NOT NULL REFERENCES events (id) ON DELETE CASCADE,
+    time_slot_id INTEGER NOT NULL REFERENCES time_slots (id) ON DELETE CASCADE,
+    user_id INTEGER NOT NULL REFERENCES users (id) ON DELETE CASCADE,
+    created_at TIMESTAMP DEFAULT CURRENT_TIMESTAMP,
+    UNIQUE (event_id, time_slot_id, user_id)
+);
+
+-- Comments table
+CREATE TABLE IF NOT EXISTS comments (
+    id SERIAL PRIMARY KEY,
+    event_id TEXT NOT NULL REFERENCES events (id) ON DELETE CASCADE,
+    user_id INTEGER NOT NULL REFERENCES users (id) ON DELETE CASCADE,
+    comment_text TEXT NOT NULL,
+    created_at TIMESTAMP DEFAULT CURRENT_TIMESTAMP
+);
+
+-- Vote counts per slot, maintained by vote_for_slot in the same transaction
+CREATE TABLE IF NOT EXISTS slot_tallies (
+    event_id TEXT NOT NULL REFERENCES events (id) ON DELETE CASCADE,
+    time_slot_id INTEGER NOT NULL REFERENCES time_slots (id) ON DELETE CASCADE,
+    vote_count INTEGER NOT NULL DEFAULT 0,
+    PRIMARY KEY (event_id, time_slot_id)
+);
+
+-- Distinct voters per event, maintained alongside slot_tallies
+CREATE TABLE IF NOT EXISTS event_tallies (
+    event_id TEXT PRIMARY KEY REFERENCES events (id) ON DELETE CASCADE,
+    participant_count INTEGER NOT NULL DEFAULT 0
+);
+
+-- Bumped by every change to an event, its slots, votes or comments.
+-- updated_at is a TIMESTAMPTZ so Last-Modified is right on servers whose
+-- TimeZone isn't UTC.
+CREATE TABLE IF NOT EXISTS event_versions (
+    event_id TEXT PRIMARY KEY REFERENCES events (id) ON DELETE CASCADE,
+    version INTEGER NOT NULL DEFAULT 0,
+    updated_at TIMESTAMPTZ DEFAULT CURRENT_TIMESTAMP
+);
+
+-- Log of changes to each event, seq = the event version they produced.
+-- Only the most recent EVENT_CHANGES_RETENTION entries are kept.
+CREATE TABLE IF NOT EXISTS event_changes (
+    event_id TEXT NOT NULL REFERENCES events (id) ON DELETE CASCADE,
+    seq INTEGER NOT NULL,
+    kind TEXT NOT NULL,
+    slot_id INTEGER,
+    user_id INTEGER,
+    data TEXT,
+    created_at TIMESTAMP DEFAULT CURRENT_TIMESTAMP,
+    PRIMARY KEY (event_id, seq)
+);
+
+-- Dashboard counters per user, maintained by the event and vote write paths
+CREATE TABLE IF NOT EXISTS user_stats (
+    user_id INTEGER PRIMARY KEY REFERENCES users (id) ON DELETE CASCADE,
+    created_count INTEGER NOT NULL DEFAULT 0,
+    finalized_count INTEGER NOT NULL DEFAULT 0,
+    participated_count INTEGER NOT NULL DEFAULT 0
+);
+
+-- Migrations for databases created before a column existed
+ALTER TABLE events ADD COLUMN IF NOT EXISTS max_applicants INTEGER DEFAULT NULL;
+ALTER TABLE events ADD COLUMN IF NOT EXISTS location_data TEXT DEFAULT NULL;
+ALTER TABLE time_slots ADD COLUMN IF NOT EXISTS slot_ts BIGINT DEFAULT NULL;
+
+-- event_versions.updated_at used to be a TIMESTAMP holding the server's
+-- local time; the cast reads existing values in the session's TimeZone
+DO $$
+BEGIN
+    IF (SELECT data_type FROM information_schema.columns
+        WHERE table_name = 'event_versions' AND column_name = 'updated_at') = 'timestamp without time zone' THEN
+        ALTER TABLE event_versions ALTER COLUMN updated_at TYPE TIMESTAMPTZ;
+    END IF;
+END $$;
+
+-- Indexes for better performance
+CREATE INDEX IF NOT EXISTS idx_events_created_by_finalized ON events (created_by, is_finalized);
+CREATE INDEX IF NOT EXISTS idx_events_created_by_created_at_id ON events (created_by, created_at, id);
+CREATE INDEX IF NOT EXISTS idx_events_created_at_id ON events (created_at, id);
+CREATE INDEX IF NOT EXISTS idx_time_slots_event_ts ON time_slots (event_id, slot_ts);
+CREATE INDEX IF NOT EXISTS idx_votes_event_created_at ON votes (event_id, created_at);
+CREATE INDEX IF NOT EXISTS idx_votes_time_slot_id ON votes (time_slot_id);
+CREATE INDEX IF NOT EXISTS idx_votes_user_event ON votes (user_id, event_id);
+CREATE INDEX IF NOT EXISTS idx_comments_event_created_at ON comments (event_id, created_at);
+
+-- Indexes superseded by the composite indexes above
+DROP INDEX IF EXISTS idx_events_created_by;
+DROP INDEX IF EXISTS idx_events_created_by_created_at;
+DROP INDEX IF EXISTS idx_time_slots_event_id;
+DROP INDEX IF EXISTS idx_votes_event_id;
+DROP INDEX IF EXISTS idx_votes_user_id;
+DROP INDEX IF EXISTS idx_comments_event_id;
@@ -4,8 +4,25 @@ let socket = null;
 let reconnectAttempts = 0;
 const maxReconnectAttempts = 5;
 const reconnectDelay = 3000;
+// Event version this page reflects; vote_delta and vote_batch messages
+// carry the versions that follow it
+let lastSeq = 0;
+let wasDisconnected = false;
+let currentEventId = null;
+// While catching up, vote runs are held here and applied afterwards in order
+let syncing = false;
+let pendingDeltas = [];
+let gapTimer = null;
+// How long a gap may stay open (deltas can arrive out of order) before
+// fetching what's missing; randomized so viewers don't all fetch at once
+const gapWaitMin = 250;
+const gapWaitMax = 1250;
 
-function initWebSocket(eventId) {
+function initWebSocket(eventId, version) {
+    currentEventId = eventId;
+    if (version !== undefined) {
+        lastSeq = version;
+    }
     const wsProtocol = window.location.protocol === 'https:' ? 'wss:' : 'ws:';
     const wsUrl = `${wsProtocol}//${window.location.host}/ws/vote/${eventId}`;
     
@@ -16,6 +33,10 @@ function initWebSocket(eventId) {
             console.log('WebSocket connected');
             reconnectAttempts = 0;
             showConnectionStatus('connected');
+            if (wasDisconnected) {
+                wasDisconnected = false;
+                resync(false);
+            }
         };
         
         socket.onmessage = function(event) {
@@ -30,6 +51,7 @@ function initWebSocket(eventId) {
         socket.onclose = function(event) {
             console.log('WebSocket closed:', event.code, event.reason);
             showConnectionStatus('disconnected');
+            wasDisconnected = true;
             
             // Attempt to reconnect
             if (reconnectAttempts < maxReconnectAttempts) {
@@ -55,72 +77,261 @@ function initWebSocket(eventId) {
 }
 
 function handleWebSocketMessage(data) {
-    if (data.type === 'vote_update') {
-        updateVoteDisplay(data.votes_by_slot);
+    if (data.type === 'vote_delta') {
+        receiveVotes({
+            from: data.seq,
+            to: data.seq,
+            votes: [{slot_id: data.slot_id, op: data.op, user: data.user}],
+            counts: {[data.slot_id]: data.vote_count},
+        });
+    } else if (data.type === 'vote_batch') {
+        // A burst of votes: each voter's last change and the latest counts
+        receiveVotes({from: data.from_seq, to: data.to_seq, votes: data.votes, counts: data.counts});
+    } else if (data.type === 'vote_snapshot') {
+        applySnapshot(data);
+        lastSeq = data.version;
+        finishSync();
     }
 }
 
-function updateVoteDisplay(votesBySlot) {
-    // Update vote counts and voter avatars for each time slot
-    Object.keys(votesBySlot).forEach(slotId => {
-        const votes = votesBySlot[slotId];
-        
-        // Update vote count
+function receiveVotes(run) {
+    // run covers the versions from..to with nothing missing in between
+    if (syncing) {
+        pendingDeltas.push(run);
+        return;
+    }
+    if (run.to <= lastSeq) {
+        // Already applied while catching up
+        return;
+    }
+    if (run.from > lastSeq + 1) {
+        // Something is missing: votes still in flight, or a change that
+        // isn't pushed (comments, edits). Wait briefly, then fetch it.
+        pendingDeltas.push(run);
+        if (gapTimer === null) {
+            const wait = gapWaitMin + Math.random() * (gapWaitMax - gapWaitMin);
+            gapTimer = setTimeout(() => {
+                gapTimer = null;
+                resync(true);
+            }, wait);
+        }
+        return;
+    }
+    // Votes overlapping what was already applied are applied again
+    // harmlessly: a vote adds a voter once, counts are absolute
+    run.votes.forEach(vote => applyVote(String(vote.slot_id), vote.op, vote.user));
+    Object.keys(run.counts).forEach(slotId => setSlotCount(slotId, run.counts[slotId]));
+    refreshSummary();
+    lastSeq = run.to;
+
+    // The next held run may now be in sequence
+    if (pendingDeltas.length && gapTimer !== null) {
+        pendingDeltas.sort((a, b) => a.from - b.from);
+        if (pendingDeltas[0].from <= lastSeq + 1) {
+            clearTimeout(gapTimer);
+            gapTimer = null;
+            drainPending();
+        }
+    }
+}
+
+async function resync(live) {
+    // Fill the gap since lastSeq; the held deltas are applied once done
+    if (gapTimer !== null) {
+        clearTimeout(gapTimer);
+        gapTimer = null;
+    }
+    syncing = true;
+    if (await catchUp(currentEventId, live)) {
+        finishSync();
+    }
+    // Otherwise a snapshot was requested, and finishes the sync on arrival
+}
+
+function finishSync() {
+    syncing = false;
+    drainPending();
+}
+
+function drainPending() {
+    const runs = pendingDeltas.sort((a, b) => a.from - b.from);
+    pendingDeltas = [];
+    runs.forEach(receiveVotes);
+}
+
+function requestSnapshot() {
+    if (socket && socket.readyState === WebSocket.OPEN) {
+        socket.send(JSON.stringify({type: 'snapshot'}));
+        return true;
+    }
+    return false;
+}
+
+async function catchUp(eventId, live) {
+    // Fetch the changes since lastSeq and apply them in order, a page at
+    // a time until the server has no more. Returns false if a snapshot
+    // was requested instead.
+    //
+    // Live (connected all along), only votes matter: this page never
+    // showed other changes as they happened. After a reconnect, any
+    // other change reloads the page.
+    try {
+        let result;
+        do {
+            const response = await fetch(`/event/${eventId}/changes?since=${lastSeq}`);
+            if (!response.ok) {
+                throw new Error(`HTTP ${response.status}`);
+            }
+            result = await response.json();
+            if (result.reset) {
+                // Too far behind for the change log; start over
+                if (live && requestSnapshot()) {
+                    return false;
+                }
+                window.location.reload();
+                return false;
+            }
+            for (const change of result.changes) {
+                if (change.kind === 'rebuild' && live && requestSnapshot()) {
+                    return false;
+                }
+                if (!applyChange(change) && !live) {
+                    window.location.reload();
+                    return false;
+                }
+                lastSeq = change.seq;
+            }
+        } while (result.has_more && result.changes.length);
+        refreshSummary();
+        lastSeq = Math.max(lastSeq, result.version);
+    } catch (error) {
+        console.error('Error catching up on changes:', error);
+        if (live && requestSnapshot()) {
+            return false;
+        }
+    }
+    return true;
+}
+
+function applyChange(change) {
+    // Votes are applied in place; anything else changes the page layout
+    if (change.kind !== 'vote' && change.kind !== 'unvote') {
+        return false;
+    }
+    const slotId = String(change.slot_id);
+    applyVote(slotId, change.kind, change.user);
+    setSlotCount(slotId, change.data.vote_count);
+    return true;
+}
+
+function applyVote(slotId, op, user) {
+    const votersElement = document.getElementById(`voters-${slotId}`);
+    if (!votersElement || !user) {
+        return;
+    }
+    const voters = Array.from(votersElement.querySelectorAll('img'))
+        .map(img => ({username: img.alt, avatar_url: img.src}))
+        .filter(voter => voter.username !== user.username);
+    if (op === 'vote') {
+        voters.push({username: user.username, avatar_url: user.avatar_url});
+    }
+    updateSlotVoters(slotId, voters);
+}
+
+function setSlotCount(slotId, count) {
+    const countElement = document.getElementById(`count-${slotId}`);
+    if (countElement) {
+        countElement.textContent = `${count} vote${count !== 1 ? 's' : ''}`;
+    }
+}
+
+function refreshSummary() {
+    // Leading slot and participant count from what the page now shows
+    const counts = {};
+    const participants = new Set();
+    document.querySelectorAll('[data-slot-id]').forEach(slot => {
+        const slotId = slot.getAttribute('data-slot-id');
         const countElement = document.getElementById(`count-${slotId}`);
-        if (countElement) {
-            countElement.textContent = `${votes.length} vote${votes.length !== 1 ? 's' : ''}`;
+        const count = countElement ? parseInt(countElement.textContent, 10) || 0 : 0;
+        if (count) {
+            counts[slotId] = count;
         }
-        
-        // Update voter avatars
         const votersElement = document.getElementById(`voters-${slotId}`);
         if (votersElement) {
-            votersElement.innerHTML = '';
-            votes.forEach(vote => {
-                const img = document.createElement('img');
-                img.src = vote.avatar_url;
-                img.alt = vote.username;
-                img.title = vote.username;
-                img.className = 'w-6 h-6 rounded-full border-2 border-white';
-                votersElement.appendChild(img);
-            });
+            votersElement.querySelectorAll('img').forEach(img => participants.add(img.alt));
         }
-        
-        // Update vote button state for current user
-        const currentUser = getCurrentUser();
-        if (currentUser) {
-            const voteBtn = document.getElementById(`vote-btn-${slotId}`);
-            if (voteBtn) {
-                const userVoted = votes.some(vote => vote.username === currentUser.username);
-                updateVoteButtonState(voteBtn, userVoted);
-            }
+    });
+    // Ties go to the earliest-created slot, as on the server
+    let leadingSlotId = null;
+    Object.keys(counts).sort((a, b) => a - b).forEach(slotId => {
+        if (leadingSlotId === null || counts[slotId] > counts[leadingSlotId]) {
+            leadingSlotId = slotId;
         }
     });
-    
-    // Handle slots with no votes
+    updateVoteCounts(counts, leadingSlotId, participants.size);
+}
+
+function applySnapshot(snapshot) {
+    // Replace the page's whole vote state
+    updateVoteCounts(snapshot.counts, snapshot.leading_slot_id, snapshot.participant_count);
+    document.querySelectorAll('[data-slot-id]').forEach(slot => {
+        const slotId = slot.getAttribute('data-slot-id');
+        updateSlotVoters(slotId, snapshot.voters_by_slot[slotId] || []);
+    });
+}
+
+function updateVoteCounts(counts, leadingSlotId, participantCount) {
+    // Counts cover every slot; slots missing from the map have no votes
     const allSlots = document.querySelectorAll('[data-slot-id]');
     allSlots.forEach(slot => {
         const slotId = slot.getAttribute('data-slot-id');
-        if (!(slotId in votesBySlot)) {
-            const countElement = document.getElementById(`count-${slotId}`);
-            const votersElement = document.getElementById(`voters-${slotId}`);
-            
-            if (countElement) {
-                countElement.textContent = '0 votes';
-            }
-            if (votersElement) {
-                votersElement.innerHTML = '';
-            }
-            
-            // Update vote button for current user
-            const currentUser = getCurrentUser();
-            if (currentUser) {
-                const voteBtn = document.getElementById(`vote-btn-${slotId}`);
-                if (voteBtn) {
-                    updateVoteButtonState(voteBtn, false);
-                }
-            }
+        const count = counts[slotId] || 0;
+        
+        const countElement = document.getElementById(`count-${slotId}`);
+        if (countElement) {
+            countElement.textContent = `${count} vote${count !== 1 ? 's' : ''}`;
+        }
+        
+        const leadingElement = document.getElementById(`leading-${slotId}`);
+        if (leadingElement) {
+            leadingElement.classList.toggle('hidden', String(leadingSlotId) !== slotId);
+        }
+        
+        if (count === 0) {
+            updateSlotVoters(slotId, []);
         }
     });
+    
+    const participantElement = document.getElementById('participant-count');
+    if (participantElement) {
+        participantElement.textContent = participantCount;
+    }
+}
+
+function updateSlotVoters(slotId, votes) {
+    // Update voter avatars
+    const votersElement = document.getElementById(`voters-${slotId}`);
+    if (votersElement) {
+        votersElement.innerHTML = '';
+        votes.forEach(vote => {
+            const img = document.createElement('img');
+            img.src = vote.avatar_url;
+            img.alt = vote.username;
+            img.title = vote.username;
+            img.className = 'w-6 h-6 rounded-full border-2 border-white';
+            votersElement.appendChild(img);
+        });
+    }
+    
+    // Update vote button state for current user
+    const currentUser = getCurrentUser();
+    if (currentUser) {
+        const voteBtn = document.getElementById(`vote-btn-${slotId}`);
+        if (voteBtn) {
+            const userVoted = votes.some(vote => vote.username === currentUser.username);
+            updateVoteButtonState(voteBtn, userVoted);
+        }
+    }
 }
 
 function updateVoteButtonState(button, isVoted) {
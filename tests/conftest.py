@@ -0,0 +1,79 @@
+"""Fixtures running tests against each storage backend
+
+Tests using the ``database`` fixture run once on SQLite (a file in a
+temporary directory) and once on PostgreSQL. The PostgreSQL run needs
+DATABASE_URL to point at a server where the user may create databases;
+a throwaway database is created there for the session and dropped
+afterwards. Without it the PostgreSQL run is skipped.
+"""
+import os
+import uuid
+
+import pytest
+
+from handlers.page_cache import get_page_cache
+from handlers.session import get_session_cache
+from models import db
+
+SERVER_URL = os.environ.get("DATABASE_URL", "")
+
+
+def _with_database(url, name):
+    base, _, query = url.partition("?")
+    base = base.rsplit("/", 1)[0]
+    return f"{base}/{name}" + (f"?{query}" if query else "")
+
+
+@pytest.fixture(scope="session")
+def postgres_url():
+    """URL of a throwaway PostgreSQL database, or None without DATABASE_URL"""
+    if not SERVER_URL.startswith(("postgres://", "postgresql://")):
+        yield None
+        return
+
+    import psycopg2
+
+    name = f"eventstack_test_{uuid.uuid4().hex[:8]}"
+    admin = psycopg2.connect(SERVER_URL)
+    admin.autocommit = True
+    with admin.cursor() as cursor:
+        cursor.execute(f"CREATE DATABASE {name}")
+    try:
+        yield _with_database(SERVER_URL, name)
+    finally:
+        db.close_pool()
+        with admin.cursor() as cursor:
+            cursor.execute(f"DROP DATABASE IF EXISTS {name}")
+        admin.close()
+
+
+def _reset_postgres(url):
+    import psycopg2
+
+    conn = psycopg2.connect(url)
+    conn.autocommit = True
+    with conn.cursor() as cursor:
+        cursor.execute("DROP SCHEMA public CASCADE")
+        cursor.execute("CREATE SCHEMA public")
+    conn.close()
+
+
+@pytest.fixture(params=["sqlite", "postgres"])
+def database(request, tmp_path, monkeypatch, postgres_url):
+    """A freshly initialised database on each backend; yields the backend name"""
+    db.close_pool()
+    if request.param == "sqlite":
+        monkeypatch.delenv("DATABASE_URL", raising=False)
+        monkeypatch.setenv("DATABASE_PATH", str(tmp_path / "test.db"))
+    else:
+        if postgres_url is None:
+            pytest.skip("DATABASE_URL does not point at a PostgreSQL server")
+        _reset_postgres(postgres_url)
+        monkeypatch.setenv("DATABASE_URL", postgres_url)
+
+    db.init_db()
+    for cache in (db.get_event_cache(), db.get_user_stats_cache(),
+                  get_page_cache(), get_session_cache()):
+        cache.clear()
+    yield request.param
+    db.close_pool()
@@ -0,0 +1,98 @@
+"""LRUCache expiry, eviction and invalidation"""
+import time
+
+import pytest
+
+from models.cache import LRUCache
+
+
+class Clock:
+    def __init__(self):
+        self.now = 1000.0
+
+    def __call__(self):
+        return self.now
+
+
+@pytest.fixture
+def clock(monkeypatch):
+    clock = Clock()
+    monkeypatch.setattr(time, "monotonic", clock)
+    return clock
+
+
+def test_entries_expire_after_ttl(clock):
+    cache = LRUCache(ttl=10)
+    cache.put("a", 1)
+    cache.put("b", 2, ttl=5)
+
+    clock.now += 6
+    assert cache.get("a") == 1
+    assert cache.get("b") is None
+    clock.now += 5
+    assert cache.get("a") is None
+    assert cache.stats()["expirations"] == 2
+    assert cache.stats()["entries"] == 0
+
+
+def test_size_bound_evicts_least_recently_used(clock):
+    cache = LRUCache(max_bytes=30, sizeof=lambda value: 10)
+    for key in "abc":
+        cache.put(key, key.upper())
+    assert cache.get("a") == "A"  # now b is the least recently used
+
+    cache.put("d", "D")
+    assert cache.get("b") is None
+    assert [cache.get(key) for key in "acd"] == ["A", "C", "D"]
+    assert cache.stats()["evictions"] == 1
+    assert cache.stats()["bytes"] == 30
+
+
+def test_oversized_value_is_not_cached(clock):
+    cache = LRUCache(max_bytes=30, sizeof=len)
+    cache.put("big", "x" * 31)
+    assert cache.get("big") is None
+
+
+def test_invalidate_drops_entry_and_discards_fill_in_flight(clock):
+    cache = LRUCache()
+    cache.put("a", "old")
+    cache.invalidate("a")
+    assert cache.get("a") is None
+
+    def load_racing_a_write():
+        value = "read before the write"
+        cache.invalidate("a")  # the write finishes while this load runs
+        return value
+
+    # The stale value reaches its caller but is not stored
+    assert cache.get_or_load("a", load_racing_a_write) == "read before the write"
+    assert cache.get("a") is None
+    assert cache.get_or_load("a", lambda: "fresh") == "fresh"
+    assert cache.get("a") == "fresh"
+
+
+def test_clear_and_invalidate_matching_bump_the_generation(clock):
+    cache = LRUCache()
+    cache.put("a", {"event_id": "ev1"})
+    cache.put("b", {"event_id": "ev2"})
+
+    cache.invalidate_matching(lambda value: value["event_id"] == "ev1")
+    assert cache.get("a") is None
+    assert cache.get("b") == {"event_id": "ev2"}
+
+    def load_racing_clear():
+        cache.clear()
+        return "stale"
+
+    assert cache.get_or_load("c", load_racing_clear) == "stale"
+    assert cache.get("b") is None
+    assert cache.get("c") is None
+
+
+def test_none_is_not_cached(clock):
+    cache = LRUCache()
+    calls = []
+    assert cache.get_or_load("a", lambda: calls.append(1)) is None
+    assert cache.get_or_load("a", lambda: calls.append(1)) is None
+    assert len(calls) == 2
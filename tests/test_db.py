@@ -0,0 +1,180 @@
+"""models.db on every storage backend (see conftest.py)"""
+import os
+import threading
+from datetime import datetime, timedelta, timezone
+
+import pytest
+
+from handlers.page_cache import _as_utc
+from models import db
+
+
+def make_users(count):
+    return [db.create_user(100 + i, f"user{i}", None, f"https://avatars/{i}") for i in range(count)]
+
+
+def make_event(creator, event_id="ev1", slots=2):
+    db.create_event_with_slots(
+        event_id, "Planning", "desc", "Room 4, https://meet.google.com/abc", creator["id"],
+        [f"2030-01-{day + 1:02d}T10:00" for day in range(slots)],
+    )
+    return [slot["id"] for slot in db.get_time_slots_by_event(event_id)]
+
+
+def test_create_user_upserts(database):
+    user = db.create_user(1, "octocat", "o@example.com", "https://avatars/1")
+    again = db.create_user(1, "octocat2", "o@example.com", "https://avatars/2")
+    assert again["id"] == user["id"]
+    assert db.get_user_by_github_id(1)["username"] == "octocat2"
+
+
+def test_event_flow(database):
+    creator, voter = make_users(2)
+    s1, s2 = make_event(creator)
+
+    event = db.get_event_by_id("ev1")
+    assert event["title"] == "Planning"
+    assert event["location_data"] == {
+        "text": "Room 4",
+        "links": [{"url": "https://meet.google.com/abc", "label": "Google Meet"}],
+    }
+
+    assert db.vote_for_slot("ev1", s1, voter["id"])["changed"]
+    assert not db.vote_for_slot("ev1", s1, voter["id"])["changed"]  # duplicate
+    assert db.vote_for_slot("ev1", s2, voter["id"])["vote_count"] == 1
+    assert db.vote_for_slot("ev1", s2, voter["id"], is_vote=False)["vote_count"] == 0
+    assert db.get_user_votes("ev1", voter["id"]) == {s1}
+    tallies = db.get_slot_tallies("ev1")
+    assert tallies["counts"] == {s1: 1}
+    assert tallies["participant_count"] == 1
+
+    db.add_comment("ev1", voter["id"], "works for me")
+    db.finalize_event("ev1", s1)
+    db.update_event("ev1", "Planning v2", "desc", "Room 5", 10)
+
+    bundle = db.get_event_bundle("ev1", viewer_id=voter["id"])
+    assert bundle["event"]["title"] == "Planning v2"
+    assert bundle["event"]["finalized_slot_id"] == s1
+    assert [c["comment_text"] for c in bundle["comments"]] == ["works for me"]
+    assert bundle["user_votes"] == {s1}
+    assert [v["username"] for v in bundle["votes_by_slot"][s1]] == ["user1"]
+
+    kinds = [change["kind"] for change in db.get_event_changes("ev1", 0)["changes"]]
+    assert kinds == ["create", "vote", "vote", "unvote", "comment", "finalize", "edit"]
+    assert db.get_user_stats(creator["id"])["finalized"] == 1
+    assert db.get_user_stats(voter["id"])["participated"] == 1
+    assert db.check_tallies() == []
+
+
+def test_apply_vote_batch(database):
+    creator, *voters = make_users(4)
+    s1, s2 = make_event(creator)
+
+    results = db.apply_vote_batch([("ev1", s1, voter["id"], True) for voter in voters]
+                                  + [("ev1", s2, voters[0]["id"], True)])
+    assert [result["changed"] for result in results] == [True] * 4
+    assert db.get_slot_tallies("ev1")["counts"] == {s1: 3, s2: 1}
+    assert db.check_tallies() == []
+
+
+def test_vote_must_be_for_a_slot_of_the_event(database):
+    creator, voter = make_users(2)
+    (s1,) = make_event(creator, "ev1", slots=1)
+    (s2,) = make_event(creator, "ev2", slots=1)
+
+    with pytest.raises(ValueError):
+        db.vote_for_slot("ev1", s2, voter["id"])
+    with pytest.raises(LookupError):
+        db.vote_for_slot("missing", s1, voter["id"])
+    with pytest.raises(ValueError):
+        db.vote_for_slot("ev1", s2 + 100, voter["id"])
+
+    # In a batch only the bad vote fails
+    results = db.apply_vote_batch([("ev1", s2, voter["id"], True), ("ev1", s1, voter["id"], True)])
+    assert isinstance(results[0], ValueError)
+    assert results[1]["changed"]
+    assert db.get_slot_tallies("ev1")["counts"] == {s1: 1}
+    assert db.get_slot_tallies("ev2")["counts"] == {}
+    assert db.check_tallies() == []
+
+
+def test_participated_events_page_newest_first(database):
+    creator, voter = make_users(2)
+    for i in range(5):
+        (slot,) = make_event(creator, f"ev{i}", slots=1)
+        if i != 2:
+            db.vote_for_slot(f"ev{i}", slot, voter["id"])
+    (own,) = make_event(voter, "mine", slots=1)
+    db.vote_for_slot("mine", own, voter["id"])
+
+    first = db.get_events_by_user(voter["id"], created_by=False, limit=2)
+    last = first[-1]
+    rest = db.get_events_by_user(voter["id"], created_by=False, limit=10,
+                                 before=(last["created_at"], last["id"]))
+    assert [event["id"] for event in first + rest] == ["ev4", "ev3", "ev1", "ev0"]
+    assert first[0]["creator_username"] == "user0"
+
+
+def test_event_changes_page_until_no_more(database):
+    creator, *voters = make_users(4)
+    (slot,) = make_event(creator, slots=1)
+    for voter in voters:
+        db.vote_for_slot("ev1", slot, voter["id"])
+
+    first = db.get_event_changes("ev1", 0, limit=3)
+    assert first["has_more"]
+    assert [change["kind"] for change in first["changes"]] == ["create", "vote", "vote"]
+    rest = db.get_event_changes("ev1", first["changes"][-1]["seq"], limit=3)
+    assert not rest["has_more"]
+    assert [change["kind"] for change in rest["changes"]] == ["vote"]
+    assert rest["changes"][-1]["seq"] == rest["version"] == first["version"]
+
+    assert not db.get_event_changes("ev1", 0, limit=4)["has_more"]
+
+
+def test_event_version_time_is_utc_whatever_the_server_time_zone(database, monkeypatch):
+    if database == "postgres":
+        # A session TimeZone far from UTC, as on a server configured for local time
+        url = os.environ["DATABASE_URL"]
+        monkeypatch.setenv("DATABASE_URL", url + ("&" if "?" in url else "?")
+                           + "options=-c%20TimeZone%3DPacific/Kiritimati")
+        db.close_pool()
+    creator, = make_users(1)
+    make_event(creator)
+
+    updated_at = _as_utc(db.get_event_version("ev1")["updated_at"])
+    assert abs(updated_at - datetime.now(timezone.utc)) < timedelta(minutes=1)
+
+
+def test_rebuild_tallies_keeps_concurrent_votes(database):
+    creator, *voters = make_users(5)
+    slots = make_event(creator, slots=3)
+    done = threading.Event()
+    errors = []
+
+    def vote(voter):
+        try:
+            for i in range(40):
+                db.vote_for_slot("ev1", slots[i % 3], voter["id"], is_vote=(i // 3) % 2 == 0)
+        except Exception as e:
+            errors.append(e)
+
+    def rebuild():
+        try:
+            while not done.is_set():
+                db.rebuild_tallies("ev1")
+        except Exception as e:
+            errors.append(e)
+
+    rebuilder = threading.Thread(target=rebuild)
+    rebuilder.start()
+    threads = [threading.Thread(target=vote, args=(voter,)) for voter in voters]
+    for thread in threads:
+        thread.start()
+    for thread in threads:
+        thread.join()
+    done.set()
+    rebuilder.join()
+
+    assert errors == []
+    assert db.check_tallies() == []
@@ -0,0 +1,87 @@
+"""GroupCommitWriter on every storage backend (see conftest.py)"""
+import threading
+
+import pytest
+
+from models import db
+from models.group_commit import GroupCommitWriter
+from test_db import make_event, make_users
+
+
+@pytest.fixture
+def writer(database):
+    # A long window so every vote submitted by a test lands in one batch
+    writer = GroupCommitWriter(window=0.5, max_batch=64)
+    yield writer
+    writer.close()
+
+
+def submit_concurrently(writer, votes):
+    """Submit each vote from its own thread at once; returns the futures in order"""
+    futures = [None] * len(votes)
+    barrier = threading.Barrier(len(votes))
+
+    def submit(i):
+        barrier.wait()
+        futures[i] = writer.submit(*votes[i])
+
+    threads = [threading.Thread(target=submit, args=(i,)) for i in range(len(votes))]
+    for thread in threads:
+        thread.start()
+    for thread in threads:
+        thread.join()
+    return futures
+
+
+def test_batch_commits_good_votes_and_fails_only_the_bad_one(writer):
+    creator, *voters = make_users(4)
+    s1, s2 = make_event(creator, "ev1")
+    (other,) = make_event(creator, "ev2", slots=1)
+
+    futures = submit_concurrently(writer, [
+        ("ev1", s1, voters[0]["id"], True),
+        ("ev1", other, voters[1]["id"], True),  # slot of another event
+        ("ev1", s1, voters[1]["id"], True),
+        ("ev1", s2, voters[2]["id"], True),
+    ])
+
+    with pytest.raises(ValueError):
+        futures[1].result(timeout=5)
+    results = [futures[i].result(timeout=5) for i in (0, 2, 3)]
+    assert [result["changed"] for result in results] == [True, True, True]
+    # The two votes for s1 were applied in whichever order they arrived
+    assert sorted([results[0]["vote_count"], results[1]["vote_count"]]) == [1, 2]
+    assert results[2]["vote_count"] == 1
+
+    stats = writer.stats()
+    assert (stats["batches"], stats["votes"], stats["failed"]) == (1, 4, 1)
+    assert db.get_slot_tallies("ev1")["counts"] == {s1: 2, s2: 1}
+    assert db.get_slot_tallies("ev2")["counts"] == {}
+    assert db.check_tallies() == []
+
+
+def test_failed_transaction_fails_every_caller(writer, monkeypatch):
+    creator, voter = make_users(2)
+    (s1,) = make_event(creator, slots=1)
+
+    def broken(votes):
+        raise RuntimeError("database went away")
+
+    monkeypatch.setattr(db, "apply_vote_batch", broken)
+    futures = submit_concurrently(writer, [("ev1", s1, voter["id"], True)] * 3)
+    for future in futures:
+        with pytest.raises(RuntimeError, match="went away"):
+            future.result(timeout=5)
+    assert writer.stats()["failed"] == 3
+
+
+def test_close_commits_queued_votes(database):
+    creator, voter = make_users(2)
+    (s1,) = make_event(creator, slots=1)
+
+    writer = GroupCommitWriter(window=10)
+    future = writer.submit("ev1", s1, voter["id"])
+    writer.close()
+    assert future.result(timeout=0)["vote_count"] == 1
+    with pytest.raises(RuntimeError):
+        writer.submit("ev1", s1, voter["id"])
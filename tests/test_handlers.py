@@ -0,0 +1,371 @@
+"""HTTP handlers on every storage backend (see conftest.py)"""
+import asyncio
+import concurrent.futures
+import email.utils
+import json
+import re
+from datetime import timedelta
+
+import pytest
+
+import tornado.httpclient
+import tornado.httpserver
+import tornado.testing
+import tornado.web
+from tornado.util import _websocket_mask
+
+import main
+from handlers.fanout import Debouncer, FanOut
+from handlers.page_cache import _as_utc, get_page_cache
+from models import db
+from models.async_db import get_executor_stats
+
+
+def fetch(app, path, user=None, xsrf="token", **kwargs):
+    """Serve app on a free port for one request and return the response"""
+    headers = kwargs.pop("headers", {})
+    if user is not None:
+        cookie = tornado.web.create_signed_value(
+            app.settings["cookie_secret"], "user",
+            json.dumps({key: user[key] for key in ("id", "github_id", "username", "avatar_url")}),
+        ).decode()
+        headers["Cookie"] = f"user={cookie}; _xsrf={xsrf}"
+        headers["X-XSRFToken"] = xsrf
+
+    async def run():
+        sock, port = tornado.testing.bind_unused_port()
+        server = tornado.httpserver.HTTPServer(app)
+        server.add_sockets([sock])
+        try:
+            return await tornado.httpclient.AsyncHTTPClient().fetch(
+                f"http://127.0.0.1:{port}{path}", headers=headers,
+                raise_error=False, follow_redirects=False, **kwargs)
+        finally:
+            server.stop()
+
+    return asyncio.run(run())
+
+
+def vote(app, user, event_id, slot_id, action="vote"):
+    return fetch(app, "/vote", user=user, method="POST",
+                 body=f"event_id={event_id}&slot_id={slot_id}&action={action}")
+
+
+def setup_events():
+    creator = db.create_user(1, "creator", None, "https://avatars/1")
+    voter = db.create_user(2, "voter", None, "https://avatars/2")
+    for event_id in ("ev1", "ev2"):
+        db.create_event_with_slots(event_id, event_id, "", "", creator["id"], ["2030-01-01T10:00"])
+    slots = {event_id: db.get_time_slots_by_event(event_id)[0]["id"] for event_id in ("ev1", "ev2")}
+    return voter, slots
+
+
+def test_vote(database):
+    app = main.make_app()
+    voter, slots = setup_events()
+
+    before = get_executor_stats()["completed"]
+    response = vote(app, voter, "ev1", slots["ev1"])
+    assert response.code == 200
+    assert json.loads(response.body) == {"success": True, "changed": True, "vote_count": 1}
+    # The vote itself checks the event and slot; nothing is looked up first
+    assert get_executor_stats()["completed"] - before == 1
+
+
+def test_vote_for_unknown_event_is_404(database):
+    app = main.make_app()
+    voter, slots = setup_events()
+
+    assert vote(app, voter, "nope", slots["ev1"]).code == 404
+    assert db.check_tallies() == []
+
+
+def test_vote_for_slot_of_another_event_is_400(database):
+    app = main.make_app()
+    voter, slots = setup_events()
+
+    assert vote(app, voter, "ev1", slots["ev2"]).code == 400
+    assert vote(app, voter, "ev1", "x").code == 400
+    assert db.get_slot_tallies("ev1")["counts"] == {}
+    assert db.get_user_votes("ev1", voter["id"]) == set()
+
+
+def xsrf_tokens(html):
+    """Unmasked tokens of the _xsrf form fields in html, as hex"""
+    tokens = []
+    for value in re.findall(r'name="_xsrf" value="([^"]+)"', html):
+        _, mask, masked, _ = value.split("|")
+        tokens.append(_websocket_mask(bytes.fromhex(mask), bytes.fromhex(masked)).hex())
+    return tokens
+
+
+def test_cached_event_page_is_filled_in_per_viewer(database):
+    app = main.make_app()
+    voter, slots = setup_events()
+    other = db.create_user(3, "other", None, "https://avatars/3")
+    vote(app, voter, "ev1", slots["ev1"])
+
+    hits = get_page_cache().stats()["hits"]
+    pages = {}
+    for user, xsrf in ((voter, "a1" * 16), (other, "b2" * 16)):
+        response = fetch(app, "/event/ev1", user=user, xsrf=xsrf)
+        assert response.code == 200
+        pages[user["username"]] = (response.body.decode(), xsrf)
+    # Both members were served from the one cached rendering
+    assert get_page_cache().stats()["hits"] == hits + 1
+
+    for username, (html, xsrf) in pages.items():
+        assert "<!--viewer:" not in html
+        button = re.search(rf'id="vote-btn-{slots["ev1"]}">\s*<i class="fas fa-(\w+)', html).group(1)
+        assert button == ("check" if username == "voter" else "plus")
+        form = re.search(r'<form method="post" class="mb-6">.*?</form>', html, re.S).group(0)
+        assert f'alt="{username}"' in form
+        assert xsrf_tokens(html) and set(xsrf_tokens(html)) == {xsrf}
+    assert pages["voter"][0] != pages["other"][0]
+
+
+def test_event_view_makes_at_most_two_database_calls(database):
+    app = main.make_app()
+    voter, slots = setup_events()
+    vote(app, voter, "ev1", slots["ev1"])
+
+    def calls_for(**kwargs):
+        before = get_executor_stats()["completed"]
+        response = fetch(app, "/event/ev1", **kwargs)
+        assert response.code in (200, 304)
+        return get_executor_stats()["completed"] - before, response
+
+    # Page cache miss: the event with its version, then the bundle with the votes
+    calls, response = calls_for(user=voter)
+    assert calls == 2
+    # The vote buttons use the votes that came with the bundle
+    assert re.search(rf'id="vote-btn-{slots["ev1"]}">\s*<i class="fas fa-check', response.body.decode())
+    # Page cache hit: the event with its version, then the viewer's votes
+    assert calls_for(user=voter)[0] == 2
+    # Not modified, or anonymous from the page cache: one call
+    etag = response.headers["Etag"]
+    assert calls_for(user=voter, headers={"If-None-Match": etag})[0] == 1
+    calls_for()
+    assert calls_for()[0] == 1
+
+
+def backdate_event_version(event_id, seconds):
+    """Move the event's last change into the past, so Last-Modified has settled"""
+    with db.db_connection() as conn:
+        cursor = conn.cursor()
+        cursor.execute("SELECT updated_at FROM event_versions WHERE event_id = ?", (event_id,))
+        updated_at = _as_utc(cursor.fetchone()["updated_at"]) - timedelta(seconds=seconds)
+        cursor.execute("UPDATE event_versions SET updated_at = ? WHERE event_id = ?",
+                       (updated_at.isoformat(" "), event_id))
+        conn.commit()
+
+
+@pytest.mark.parametrize("path", ["/event/ev1", "/event/ev1.json"])
+def test_conditional_get_answers_304(database, path):
+    app = main.make_app()
+    voter, slots = setup_events()
+    backdate_event_version("ev1", 60)
+
+    response = fetch(app, path, user=voter)
+    assert response.code == 200
+    etag = response.headers["Etag"]
+    last_modified = response.headers["Last-Modified"]
+
+    response = fetch(app, path, user=voter, headers={"If-None-Match": etag})
+    assert (response.code, response.body) == (304, b"")
+    assert response.headers["Etag"] == etag
+    assert fetch(app, path, user=voter, headers={"If-None-Match": 'W/"0-other"'}).code == 200
+
+    assert fetch(app, path, user=voter, headers={"If-Modified-Since": last_modified}).code == 304
+    earlier = email.utils.format_datetime(
+        email.utils.parsedate_to_datetime(last_modified) - timedelta(seconds=1), usegmt=True)
+    assert fetch(app, path, user=voter, headers={"If-Modified-Since": earlier}).code == 200
+
+
+@pytest.mark.parametrize("path", ["/event/ev1", "/event/ev1.json"])
+def test_etag_changes_after_vote_and_edit(database, path):
+    app = main.make_app()
+    voter, slots = setup_events()
+
+    first = fetch(app, path, user=voter).headers["Etag"]
+    vote(app, voter, "ev1", slots["ev1"])
+    after_vote = fetch(app, path, user=voter)
+    assert after_vote.headers["Etag"] != first
+    assert fetch(app, path, user=voter, headers={"If-None-Match": first}).code == 200
+
+    db.update_event("ev1", "Renamed", "", "", None)
+    after_edit = fetch(app, path, user=voter)
+    assert after_edit.headers["Etag"] not in (first, after_vote.headers["Etag"])
+    assert b"Renamed" in after_edit.body
+
+
+def test_changes_since(database):
+    app = main.make_app()
+    voter, slots = setup_events()
+    vote(app, voter, "ev1", slots["ev1"])
+
+    result = json.loads(fetch(app, "/event/ev1/changes?since=1").body)
+    assert [change["kind"] for change in result["changes"]] == ["vote"]
+    assert result["version"] == result["changes"][-1]["seq"]
+    assert result["has_more"] is False
+    assert fetch(app, "/event/ev1/changes?since=-1").code == 400
+
+
+class StubConnection:
+    """A WebSocket connection whose writes complete only when told to"""
+
+    def __init__(self):
+        self.written = []
+        self.pending = []
+        self.closed_with = None
+
+    def write_message(self, frame):
+        self.written.append(json.loads(frame))
+        future = concurrent.futures.Future()
+        self.pending.append(future)
+        return future
+
+    def finish_writes(self):
+        while self.pending:
+            self.pending.pop(0).set_result(None)
+
+    def close(self, code=None, reason=None):
+        self.closed_with = code
+
+
+def test_fanout_full_queue_drops_oldest():
+    fanout = FanOut(max_frames=3, high_water=3, high_water_seconds=60)
+    slow, fast = StubConnection(), StubConnection()
+    fanout.add("ev1", slow)
+    fanout.add("ev1", fast)
+
+    for seq in range(1, 6):
+        assert fanout.broadcast("ev1", {"seq": seq}) == 2
+        fast.finish_writes()
+    # 1 is on the wire, 2 was dropped to make room for 5
+    assert [message["seq"] for message in slow.written] == [1]
+    slow.finish_writes()
+    slow.finish_writes()
+    assert [message["seq"] for message in slow.written] == [1, 3, 4, 5]
+    assert [message["seq"] for message in fast.written] == [1, 2, 3, 4, 5]
+
+    counters = fanout.stats()["events"]["ev1"]
+    assert counters["broadcasts"] == 5
+    assert counters["dropped"] == 1
+    assert counters["sent"] == 9
+    assert counters["queued"] == 0
+
+
+def test_fanout_keyed_frame_replaces_queued_one():
+    fanout = FanOut(max_frames=8, high_water=8)
+    connection = StubConnection()
+    fanout.add("ev1", connection)
+
+    fanout.send("ev1", connection, {"seq": 1})  # goes straight to the wire
+    fanout.send("ev1", connection, {"type": "vote_snapshot", "version": 1}, key="snapshot")
+    fanout.send("ev1", connection, {"seq": 2})
+    fanout.send("ev1", connection, {"type": "vote_snapshot", "version": 2}, key="snapshot")
+    while connection.pending:
+        connection.finish_writes()
+
+    # The newer snapshot took the older one's place in the queue
+    assert connection.written == [{"seq": 1}, {"type": "vote_snapshot", "version": 2}, {"seq": 2}]
+    assert fanout.stats()["events"]["ev1"]["coalesced"] == 1
+
+
+def test_fanout_disconnects_client_stuck_above_high_water():
+    fanout = FanOut(max_frames=4, high_water=2, high_water_seconds=0)
+    stuck = StubConnection()
+    fanout.add("ev1", stuck)
+
+    for seq in range(1, 5):
+        fanout.broadcast("ev1", {"seq": seq})
+    assert stuck.closed_with == 1013
+    assert fanout.stats()["events"]["ev1"]["disconnected"] == 1
+    assert fanout.stats()["events"]["ev1"]["queued"] == 0
+
+    # Nothing more is queued for it until it goes away
+    fanout.broadcast("ev1", {"seq": 5})
+    assert fanout.stats()["events"]["ev1"]["queued"] == 0
+
+
+def test_fanout_counts_per_event():
+    fanout = FanOut()
+    first, second = StubConnection(), StubConnection()
+    fanout.add("ev1", first)
+    fanout.add("ev2", second)
+
+    fanout.broadcast("ev1", {"seq": 1})
+    fanout.broadcast("ev1", {"seq": 2})
+    fanout.broadcast("ev2", {"seq": 1})
+    assert fanout.broadcast("ev3", {"seq": 1}) == 0
+
+    stats = fanout.stats()
+    assert (stats["events"]["ev1"]["broadcasts"], stats["events"]["ev1"]["queued"]) == (2, 1)
+    assert (stats["events"]["ev2"]["broadcasts"], stats["events"]["ev2"]["queued"]) == (1, 0)
+    assert stats["totals"]["broadcasts"] == 3
+
+    fanout.remove("ev1", first)
+    assert set(fanout.stats()["events"]) == {"ev2"}
+    assert fanout.stats()["totals"]["broadcasts"] == 3
+
+
+class DebouncerTest(tornado.testing.AsyncTestCase):
+    """Debouncer timing, on an IOLoop whose clock only moves when told to"""
+
+    def setUp(self):
+        super().setUp()
+        self.now = 1000.0
+        self.timers = []
+        self.io_loop.time = lambda: self.now
+        self.io_loop.call_at = lambda when, callback, *args: self.timers.append((when, callback, args))
+        self.flushed = []  # (seconds since the start, key, items)
+        self.debouncer = Debouncer(
+            lambda key, items: self.flushed.append((round(self.now - 1000.0, 6), key, items)),
+            window=0.05, max_delay=0.25)
+
+    def advance(self, seconds):
+        """Move the clock forward, running every timer that comes due"""
+        end = self.now + seconds
+        while True:
+            due = sorted((timer for timer in self.timers if timer[0] <= end), key=lambda timer: timer[0])
+            if not due:
+                break
+            timer = due[0]
+            self.timers.remove(timer)
+            self.now = max(self.now, timer[0])
+            timer[1](*timer[2])
+        self.now = end
+
+    def test_flushes_after_a_quiet_window(self):
+        self.debouncer.add("ev1", 1)
+        self.advance(0.03)
+        self.debouncer.add("ev1", 2)
+        self.advance(0.03)
+        # The second item restarted the window
+        self.assertEqual(self.flushed, [])
+        self.advance(0.02)
+        self.assertEqual(self.flushed, [(0.08, "ev1", [1, 2])])
+
+    def test_steady_stream_still_flushes_within_max_delay(self):
+        for i in range(30):
+            self.debouncer.add("ev1", i)
+            self.advance(0.02)
+        self.advance(0.05)
+
+        times = [at for at, _, _ in self.flushed]
+        self.assertEqual([item for _, _, items in self.flushed for item in items], list(range(30)))
+        self.assertAlmostEqual(times[0], 0.25)
+        # Each burst flushes max_delay after its own first item
+        self.assertGreater(len(times), 2)
+        for previous, current in zip(times, times[1:]):
+            self.assertLessEqual(current - previous, 0.25 + 0.02 + 1e-9)
+
+    def test_keys_are_debounced_separately(self):
+        self.debouncer.add("ev1", 1)
+        self.advance(0.04)
+        self.debouncer.add("ev2", 2)
+        self.advance(0.02)
+        self.assertEqual(self.flushed, [(0.05, "ev1", [1])])
+        self.advance(0.04)
+        self.assertEqual(self.flushed[1:], [(0.09, "ev2", [2])])
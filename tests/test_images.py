@@ -0,0 +1,20 @@
+"""Committed image variants match what the templates use"""
+import os
+
+from handlers.images import get_image_manifest, referenced_images
+
+ROOT = os.path.abspath(os.path.join(os.path.dirname(__file__), '..'))
+STATIC = os.path.join(ROOT, "static")
+
+
+def test_manifest_only_lists_pictures_in_templates():
+    manifest = get_image_manifest(STATIC)
+    assert manifest
+    assert set(manifest) <= referenced_images(os.path.join(ROOT, "templates"))
+
+
+def test_no_unlisted_variant_files():
+    manifest = get_image_manifest(STATIC)
+    listed = {os.path.basename(v["path"]) for entry in manifest.values() for v in entry["variants"]}
+    on_disk = set(os.listdir(os.path.join(STATIC, "images", "variants"))) - {"manifest.json"}
+    assert on_disk == listed
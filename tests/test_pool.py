@@ -0,0 +1,32 @@
+"""Connection pool behaviour shared by the SQLite and PostgreSQL pools"""
+import main
+from models import db
+
+
+def test_warm_opens_up_to_count(database, monkeypatch):
+    monkeypatch.setenv("DATABASE_POOL_SIZE", "4")
+    db.close_pool()
+    pool = db.get_pool()
+
+    # psycopg2's pool opens its first connection up front, SQLite's doesn't
+    already_open = pool.stats()["open"]
+    assert pool.warm(2) == 2 - already_open
+    assert pool.stats()["open"] == 2
+    assert pool.warm(2) == 0
+    assert pool.warm() == 2
+    assert pool.stats()["open"] == 4
+    assert pool.warm() == 0
+
+    with db.db_connection() as conn:
+        assert conn.cursor().execute("SELECT 1 AS one").fetchone()["one"] == 1
+
+
+def test_warm_up_opens_the_whole_pool(database, monkeypatch):
+    monkeypatch.setenv("DATABASE_POOL_SIZE", "3")
+    db.close_pool()
+
+    report = {name: detail for name, _, detail in main.warm_up(main.make_app())}
+
+    # The schema step has already opened one connection
+    assert report["connection pool"] == "2 opened"
+    assert db.get_pool().stats()["open"] == 3
@@ -0,0 +1,128 @@
+"""EXPLAIN QUERY PLAN regression suite
+
+Every SQL statement passed as a literal to execute()/executemany() in the
+modules below is planned against a freshly initialised SQLite database.
+A statement fails if any step of its plan is a SCAN, whether of a table
+or of a whole index, or sorts/deduplicates through a temporary B-tree;
+table access must be a SEARCH on an index or key. The one SCAN accepted
+is an index walked in the statement's ORDER BY order and cut off by its
+LIMIT, since that reads rows only until the page is full. Deliberate exceptions
+go in ALLOWED, keyed by "<function>:<first line of SQL>", with a reason;
+they are for one-off migrations and maintenance commands, never for
+statements on a request path.
+"""
+import ast
+import os
+import re
+
+import pytest
+
+from models import db
+
+ROOT = os.path.abspath(os.path.join(os.path.dirname(__file__), '..'))
+
+MODULES = [
+    "models/db.py",
+]
+
+ALLOWED = {
+    "_backfill_slot_timestamps:SELECT id, slot_datetime FROM time_slots WHERE slot_ts IS NULL":
+        "one-off migration run by init_db",
+    "_count_votes:SELECT COUNT(DISTINCT user_id) AS participant_count":
+        "only used by the rebuild-tallies/check-tallies maintenance commands",
+    "_backfill_locations:SELECT id, location FROM events":
+        "one-off migration run by init_db",
+    "_backfill_user_stats:SELECT 1 AS found FROM user_stats LIMIT 1":
+        "one-off migration check run by init_db; stops at the first row",
+    "_backfill_tallies:SELECT 1 AS found FROM event_tallies LIMIT 1":
+        "one-off migration check run by init_db; stops at the first row",
+    "_backfill_tallies:SELECT 1 AS found FROM votes LIMIT 1":
+        "one-off migration check run by init_db; stops at the first row",
+    "_backfill_user_stats:SELECT 1 AS found FROM events LIMIT 1":
+        "one-off migration check run by init_db; stops at the first row",
+    "_all_event_ids:SELECT id FROM events ORDER BY id":
+        "only used by the rebuild-tallies/check-tallies maintenance commands",
+    "_all_user_ids:SELECT id FROM users ORDER BY id":
+        "only used by the rebuild-user-stats maintenance command",
+}
+
+PLANNED = ("SELECT", "INSERT", "UPDATE", "DELETE", "WITH")
+SCAN = re.compile(r"^SCAN ")
+ORDERED_WALK = re.compile(r"^SCAN \w+ USING (COVERING )?INDEX \w+$")
+PAGED = re.compile(r"\bORDER BY\b.*\bLIMIT \?\s*$", re.S)
+
+
+def collect_statements():
+    statements = []
+    for module in MODULES:
+        path = os.path.join(ROOT, module)
+        with open(path) as f:
+            tree = ast.parse(f.read(), filename=path)
+        for func in ast.walk(tree):
+            if not isinstance(func, (ast.FunctionDef, ast.AsyncFunctionDef)):
+                continue
+            for node in ast.walk(func):
+                if not (isinstance(node, ast.Call)
+                        and isinstance(node.func, ast.Attribute)
+                        and node.func.attr in ("execute", "executemany")
+                        and node.args
+                        and isinstance(node.args[0], ast.Constant)
+                        and isinstance(node.args[0].value, str)):
+                    continue
+                sql = node.args[0].value.strip()
+                if sql.upper().startswith(PLANNED):
+                    key = f"{func.name}:{sql.splitlines()[0].strip()}"
+                    statements.append(pytest.param(key, sql, id=f"{func.name}:{node.lineno}"))
+    return statements
+
+
+@pytest.fixture(scope="module")
+def conn(tmp_path_factory, request):
+    mp = pytest.MonkeyPatch()
+    mp.delenv("DATABASE_URL", raising=False)
+    mp.setenv("DATABASE_PATH", str(tmp_path_factory.mktemp("plans") / "plans.db"))
+    db.close_pool()
+    db.init_db()
+    with db.db_connection() as conn:
+        yield conn
+    db.close_pool()
+    mp.undo()
+
+
+def test_statements_were_found():
+    assert len(collect_statements()) > 10
+
+
+def test_allowed_entries_match_statements():
+    keys = {param.values[0] for param in collect_statements()}
+    assert not set(ALLOWED) - keys, "ALLOWED lists statements that no longer exist"
+
+
+@pytest.mark.parametrize("key,sql", collect_statements())
+def test_query_plan(conn, key, sql):
+    params = [None] * sql.count("?")
+    plan = [row["detail"] for row in conn.execute("EXPLAIN QUERY PLAN " + sql, params)]
+
+    sorted_in_temp = any("USE TEMP B-TREE" in step for step in plan)
+    problems = [
+        step for step in plan
+        if (SCAN.match(step) and not (ORDERED_WALK.match(step) and PAGED.search(sql) and not sorted_in_temp))
+        or "USE TEMP B-TREE" in step
+    ]
+    if key in ALLOWED:
+        assert problems, f"{key} is in ALLOWED but its plan is clean; remove the entry"
+        return
+    assert not problems, f"{key}\nplan:\n  " + "\n  ".join(plan)
+
+
+def test_participated_events_page_in_index_order(conn):
+    statements = [sql for key, sql in (param.values for param in collect_statements())
+                  if key.startswith("get_events_by_user:") and "EXISTS" in sql]
+    assert len(statements) == 2
+    for sql in statements:
+        plan = [row["detail"] for row in conn.execute("EXPLAIN QUERY PLAN " + sql, [None] * sql.count("?"))]
+        # Events are read newest first straight off the index, so a page
+        # stops after LIMIT matches instead of sorting the user's history
+        assert not [step for step in plan if "USE TEMP B-TREE" in step], plan
+        assert re.match(r"(SCAN|SEARCH) e USING INDEX idx_events_created_at_id\b", plan[0]), plan
+        assert "SEARCH v USING COVERING INDEX idx_votes_user_event (user_id=? AND event_id=?)" in plan, plan
@@ -0,0 +1,60 @@
+"""Signed session cookie decoding and its cache"""
+import json
+import time
+
+import pytest
+import tornado.web
+
+from handlers import session
+
+SECRET = "test-secret"
+
+
+class FakeHandler:
+    """Just enough of a RequestHandler for decode_user_cookie"""
+
+    def __init__(self, cookie):
+        self.cookie = cookie
+
+    def get_cookie(self, name):
+        return self.cookie
+
+    def get_secure_cookie(self, name, value=None, max_age_days=31):
+        return tornado.web.decode_signed_value(SECRET, name, value or self.cookie, max_age_days=max_age_days)
+
+
+@pytest.fixture(autouse=True)
+def clear_cache():
+    session.get_session_cache().clear()
+    yield
+    session.get_session_cache().clear()
+
+
+def sign(user, signed_at):
+    return tornado.web.create_signed_value(SECRET, "user", json.dumps(user), clock=lambda: signed_at).decode()
+
+
+def test_hit_returns_cached_user():
+    handler = FakeHandler(sign({"id": 1}, time.time()))
+    assert session.decode_user_cookie(handler) == {"id": 1}
+    hits = session.get_session_cache().hits
+    assert session.decode_user_cookie(handler) == {"id": 1}
+    assert session.get_session_cache().hits == hits + 1
+
+
+def test_cached_session_expires_with_the_cookie(monkeypatch):
+    now = time.time()
+    handler = FakeHandler(sign({"id": 1}, now - session.MAX_AGE_DAYS * 86400 + 5))
+    assert session.decode_user_cookie(handler) == {"id": 1}
+
+    later = time.monotonic() + 10
+    monkeypatch.setattr(time, "monotonic", lambda: later)
+    monkeypatch.setattr(time, "time", lambda: now + 10)
+    assert session.decode_user_cookie(handler) is None
+
+
+def test_tampered_cookie_is_rejected():
+    cookie = sign({"id": 1}, time.time())
+    assert session.decode_user_cookie(FakeHandler(cookie)) == {"id": 1}
+    tampered = cookie[:-1] + ("1" if cookie[-1] == "0" else "0")
+    assert session.decode_user_cookie(FakeHandler(tampered)) is None
@@ -0,0 +1,78 @@
+"""Precompressed, content-hashed static files"""
+import gzip
+import mimetypes
+import os
+
+import pytest
+import tornado.web
+
+from handlers.static import PrecompressedStaticFileHandler, build_static
+from test_handlers import fetch
+
+SCRIPT = b"function hello() { return 'hello'; }\n" * 50
+
+
+@pytest.fixture
+def static_path(tmp_path):
+    (tmp_path / "js").mkdir()
+    (tmp_path / "js" / "app.js").write_bytes(SCRIPT)
+    (tmp_path / "logo.png").write_bytes(b"\x89PNG\r\n\x1a\n" + bytes(200))
+    build_static(str(tmp_path))
+    return str(tmp_path)
+
+
+@pytest.fixture
+def app(static_path):
+    return tornado.web.Application(
+        [], static_path=static_path, static_handler_class=PrecompressedStaticFileHandler)
+
+
+def test_gzip_variant_served_to_clients_that_accept_it(app, static_path):
+    response = fetch(app, "/static/js/app.js", decompress_response=False,
+                     headers={"Accept-Encoding": "gzip, deflate"})
+    assert response.code == 200
+    assert response.headers["Content-Encoding"] == "gzip"
+    assert response.headers["Content-Type"] == mimetypes.guess_type("app.js")[0]
+    assert "Accept-Encoding" in response.headers.get_list("Vary")
+    assert gzip.decompress(response.body) == SCRIPT
+    assert int(response.headers["Content-Length"]) == os.path.getsize(
+        os.path.join(static_path, "js", "app.js.gz"))
+
+
+@pytest.mark.parametrize("accept", [None, "identity", "gzip;q=0", "br"])
+def test_plain_file_served_otherwise(app, accept):
+    headers = {"Accept-Encoding": accept} if accept else {}
+    response = fetch(app, "/static/js/app.js", decompress_response=False, headers=headers)
+    assert response.code == 200
+    assert "Content-Encoding" not in response.headers
+    assert "Accept-Encoding" in response.headers.get_list("Vary")
+    assert response.body == SCRIPT
+
+
+def test_stale_gzip_variant_is_ignored(app, static_path):
+    source = os.path.join(static_path, "js", "app.js")
+    os.utime(source + ".gz", (0, 0))
+    response = fetch(app, "/static/js/app.js", decompress_response=False,
+                     headers={"Accept-Encoding": "gzip"})
+    assert "Content-Encoding" not in response.headers
+    assert response.body == SCRIPT
+
+
+def test_binary_files_are_not_varied(app):
+    response = fetch(app, "/static/logo.png", headers={"Accept-Encoding": "gzip"})
+    assert response.code == 200
+    assert "Content-Encoding" not in response.headers
+    assert "Vary" not in response.headers
+
+
+def test_immutable_only_for_the_current_hash(app, static_path):
+    version = PrecompressedStaticFileHandler.get_version({"static_path": static_path}, "js/app.js")
+
+    current = fetch(app, f"/static/js/app.js?v={version}")
+    assert current.headers["Cache-Control"] == (
+        f"public, max-age={PrecompressedStaticFileHandler.CACHE_MAX_AGE}, immutable")
+
+    for path in ("/static/js/app.js?v=0123456789abcdef", "/static/js/app.js"):
+        response = fetch(app, path)
+        assert response.code == 200
+        assert "immutable" not in response.headers.get("Cache-Control", "")
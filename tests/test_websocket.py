@@ -0,0 +1,65 @@
+"""Merging of vote deltas into WebSocket messages"""
+import pytest
+
+from handlers.websocket import vote_messages
+
+
+def delta(seq, slot_id, user_id, op="vote", vote_count=1):
+    return {
+        "type": "vote_delta",
+        "seq": seq,
+        "slot_id": slot_id,
+        "op": op,
+        "user": {"id": user_id, "username": f"user{user_id}", "avatar_url": None},
+        "vote_count": vote_count,
+    }
+
+
+def vote(slot_id, user_id, op="vote"):
+    return {"slot_id": slot_id, "op": op,
+            "user": {"id": user_id, "username": f"user{user_id}", "avatar_url": None}}
+
+
+CASES = {
+    "single delta is sent as is": (
+        [delta(7, 1, 10)],
+        [delta(7, 1, 10)],
+    ),
+    "contiguous run becomes one batch": (
+        [delta(3, 1, 10, vote_count=1), delta(4, 2, 11, vote_count=1), delta(5, 1, 12, vote_count=2)],
+        [{"type": "vote_batch", "from_seq": 3, "to_seq": 5,
+          "votes": [vote(1, 10), vote(2, 11), vote(1, 12)],
+          "counts": {"1": 2, "2": 1}}],
+    ),
+    "out of order arrival is merged by seq": (
+        [delta(5, 1, 12, vote_count=2), delta(4, 1, 11, vote_count=1)],
+        [{"type": "vote_batch", "from_seq": 4, "to_seq": 5,
+          "votes": [vote(1, 11), vote(1, 12)],
+          "counts": {"1": 2}}],
+    ),
+    "gap splits into two messages": (
+        [delta(3, 1, 10, vote_count=1), delta(4, 1, 11, vote_count=2), delta(6, 2, 12)],
+        [{"type": "vote_batch", "from_seq": 3, "to_seq": 4,
+          "votes": [vote(1, 10), vote(1, 11)],
+          "counts": {"1": 2}},
+         delta(6, 2, 12)],
+    ),
+    "vote then unvote by the same user keeps the last change": (
+        [delta(3, 1, 10, vote_count=1), delta(4, 2, 11, vote_count=1),
+         delta(5, 1, 10, op="unvote", vote_count=0)],
+        [{"type": "vote_batch", "from_seq": 3, "to_seq": 5,
+          "votes": [vote(2, 11), vote(1, 10, op="unvote")],
+          "counts": {"1": 0, "2": 1}}],
+    ),
+    "same user on different slots keeps both": (
+        [delta(3, 1, 10, vote_count=1), delta(4, 2, 10, vote_count=1)],
+        [{"type": "vote_batch", "from_seq": 3, "to_seq": 4,
+          "votes": [vote(1, 10), vote(2, 10)],
+          "counts": {"1": 1, "2": 1}}],
+    ),
+}
+
+
+@pytest.mark.parametrize("deltas,expected", CASES.values(), ids=CASES.keys())
+def test_vote_messages(deltas, expected):
+    assert vote_messages(deltas) == expected